@@ -2,8 +2,9 @@
 Django Admin configuration for Telemedicine Platform
 """
 from django.contrib import admin
+from . import search
 from .models import (
-    PatientProfile, DoctorProfile, Hospital, Bed,
+    PatientProfile, DoctorProfile, Hospital, Facility, Bed,
     Appointment, Consultation, MedicalRecord, Prescription,
     ChatMessage, Notification, MobileClinic
 )
@@ -13,6 +14,27 @@ admin.site.site_header = "TeleMed Administration"
 admin.site.site_title = "TeleMed Admin Portal"
 admin.site.index_title = "Welcome to TeleMed Admin Panel"
 
+
+class FullTextSearchMixin:
+    """
+    Ranked full-text search for the admin changelist
+    
+    search_fields only holds cheap identifier lookups; free text is matched
+    through the search index for `search_kind` instead of LIKE scans. Every
+    match is kept (as a subquery) so the changelist paginates all of them.
+    """
+    search_kind = None
+    
+    def get_search_results(self, request, queryset, search_term):
+        queryset_by_id, may_have_duplicates = super().get_search_results(
+            request, queryset, search_term
+        )
+        if not search_term:
+            return queryset_by_id, may_have_duplicates
+        matches = search.matching(self.search_kind, search_term, queryset=queryset)
+        return queryset_by_id | matches, may_have_duplicates
+
+
 @admin.register(PatientProfile)
 class PatientProfileAdmin(admin.ModelAdmin):
     list_display = ['full_name', 'phone', 'blood_group', 'created_at']
@@ -21,26 +43,44 @@ class PatientProfileAdmin(admin.ModelAdmin):
 
 
 @admin.register(DoctorProfile)
-class DoctorProfileAdmin(admin.ModelAdmin):
+class DoctorProfileAdmin(FullTextSearchMixin, admin.ModelAdmin):
     list_display = ['full_name', 'specialization', 'hospital', 'is_verified', 'is_available']
-    search_fields = ['full_name', 'license_number', 'user__email']
+    search_fields = ['=license_number', '=user__email']
+    search_kind = 'doctor'
     list_filter = ['specialization', 'is_verified', 'is_available', 'hospital']
     list_editable = ['is_verified', 'is_available']
 
 
 @admin.register(Hospital)
-class HospitalAdmin(admin.ModelAdmin):
+class HospitalAdmin(FullTextSearchMixin, admin.ModelAdmin):
     list_display = ['name', 'phone', 'is_active', 'available_beds_count', 'total_beds_count']
-    search_fields = ['name', 'address', 'email']
-    list_filter = ['is_active']
+    search_fields = ['=email']
+    search_kind = 'hospital'
+    list_filter = ['is_active', 'facilities']
+    filter_horizontal = ['facilities']
+
+
+@admin.register(Facility)
+class FacilityAdmin(admin.ModelAdmin):
+    list_display = ['name', 'slug']
+    search_fields = ['name']
+    prepopulated_fields = {'slug': ['name']}
 
 
 @admin.register(Bed)
 class BedAdmin(admin.ModelAdmin):
-    list_display = ['hospital', 'bed_number', 'ward_type', 'is_available', 'daily_rate']
+    list_display = ['hospital', 'bed_number', 'ward_type', 'is_available', 'held_until', 'daily_rate']
     search_fields = ['hospital__name', 'bed_number']
     list_filter = ['hospital', 'ward_type', 'is_available']
     list_editable = ['is_available']
+    readonly_fields = ['held_until', 'hold_token', 'held_by']
+    
+    def save_model(self, request, obj, form, change):
+        # Write only the edited columns so a hold placed meanwhile isn't overwritten
+        if change:
+            obj.save(update_fields=[*form.changed_data, 'updated_at'])
+        else:
+            obj.save()
 
 
 @admin.register(Appointment)
@@ -58,9 +98,10 @@ class ConsultationAdmin(admin.ModelAdmin):
 
 
 @admin.register(MedicalRecord)
-class MedicalRecordAdmin(admin.ModelAdmin):
+class MedicalRecordAdmin(FullTextSearchMixin, admin.ModelAdmin):
     list_display = ['record_id', 'patient', 'doctor', 'diagnosis', 'visit_date']
-    search_fields = ['record_id', 'patient__full_name', 'diagnosis']
+    search_fields = ['=record_id', 'patient__full_name']
+    search_kind = 'record'
     list_filter = ['visit_date']
     date_hierarchy = 'visit_date'
 
@@ -0,0 +1,192 @@
+"""
+Doctor daily agendas and consultation queues
+
+A doctor's agenda for a day is the ordered list of open appointments
+(the consultation in progress first, then by scheduled time and booking
+order, so walk-in and mobile clinic patients booked on the day slot in
+behind earlier bookings). Agendas are built at day start by the
+build_daily_agendas command, kept in the cache and rebuilt after every
+booking, status change or consultation start, so reading the queue never
+touches the appointments table. That needs a cache shared by every worker:
+with a per-process LocMemCache the rebuild would only reach one worker and
+the others would serve a stale queue, so agendas are then built on every
+read instead.
+
+Wait times are estimated when the agenda is read: each patient starts at
+their scheduled time or when the patient ahead is expected to finish,
+whichever is later, using the doctor's average consultation length.
+"""
+import datetime
+
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.utils import timezone
+
+from .models import Appointment, DoctorStats
+
+
+OPEN_STATUSES = ('pending', 'confirmed', 'in_progress')
+
+# Consultation length assumed until a doctor has timed consultations
+DEFAULT_CONSULTATION_MINUTES = 15
+
+# Agendas outlive their day slightly so late-evening reads stay cached
+AGENDA_CACHE_TIMEOUT = 60 * 60 * 26
+
+ENTRY_FIELDS = (
+    'id', 'booking_id', 'patient_id', 'patient_name', 'appointment_type',
+    'type_display', 'scheduled_time', 'status', 'symptoms', 'started_at',
+)
+
+
+def cache_is_shared():
+    """Whether cached agendas are seen (and refreshed) by every worker"""
+    return not isinstance(caches['default'], LocMemCache)
+
+
+def agenda_key(doctor_id, date):
+    return f'agenda:{doctor_id}:{date.isoformat()}'
+
+
+def appointment_key(appointment_id):
+    # Points a queued appointment at its agenda for patient lookups
+    return f'agenda:appointment:{appointment_id}'
+
+
+def build(doctor_id, date):
+    """
+    Build a doctor's agenda for one day and store it in the cache
+
+    Args:
+        doctor_id: Doctor whose appointments to queue
+        date: Day of the agenda
+
+    Returns:
+        Agenda dict with the queue entries and the consultation length used
+        for wait estimates
+    """
+    type_labels = dict(Appointment.TYPE_CHOICES)
+    rows = Appointment.objects.filter(
+        doctor_id=doctor_id, scheduled_date=date, status__in=OPEN_STATUSES,
+    ).order_by('scheduled_time', 'created_at', 'id').values_list(
+        'id', 'booking_id', 'patient_id', 'patient__full_name', 'appointment_type',
+        'scheduled_time', 'status', 'symptoms', 'consultation__started_at',
+    )
+    queue = []
+    for pk, booking_id, patient_id, name, kind, time, status, symptoms, started_at in rows:
+        queue.append({
+            'id': pk, 'booking_id': booking_id, 'patient_id': patient_id,
+            'patient_name': name, 'appointment_type': kind,
+            'type_display': type_labels.get(kind, kind), 'scheduled_time': time,
+            'status': status, 'symptoms': symptoms, 'started_at': started_at,
+        })
+    # Whoever is with the doctor goes first, whatever their slot was
+    queue.sort(key=lambda entry: entry['status'] != 'in_progress')
+
+    stats = DoctorStats.objects.filter(doctor_id=doctor_id).first()
+    minutes = stats.average_consultation_minutes if stats else None
+
+    agenda = {
+        'doctor_id': doctor_id,
+        'date': date,
+        'built_at': timezone.now(),
+        'consultation_minutes': minutes or DEFAULT_CONSULTATION_MINUTES,
+        'queue': queue,
+    }
+    if cache_is_shared():
+        pointers = {appointment_key(entry['id']): (doctor_id, date) for entry in queue}
+        pointers[agenda_key(doctor_id, date)] = agenda
+        cache.set_many(pointers, AGENDA_CACHE_TIMEOUT)
+    return agenda
+
+
+def get(doctor_id, date=None):
+    """A doctor's agenda for a day (default today), built on a cache miss"""
+    date = date or timezone.localdate()
+    if not cache_is_shared():
+        return build(doctor_id, date)
+    agenda = cache.get(agenda_key(doctor_id, date))
+    if agenda is None:
+        agenda = build(doctor_id, date)
+    return agenda
+
+
+def refresh(doctor_id, date):
+    """Rebuild a cached agenda after its appointments changed"""
+    if doctor_id is None or date is None or not cache_is_shared():
+        return
+    if date == timezone.localdate():
+        build(doctor_id, date)
+    else:
+        # Other days are rebuilt when (and if) they are next read
+        cache.delete(agenda_key(doctor_id, date))
+
+
+def with_wait_times(agenda, now=None):
+    """
+    Queue entries annotated with position and expected start
+
+    Args:
+        agenda: Agenda dict from get()
+        now: Current time (default timezone.now())
+
+    Returns:
+        List of entry dicts with position (0 for the consultation in
+        progress), expected_start and wait_minutes added
+    """
+    now = now or timezone.now()
+    length = datetime.timedelta(minutes=agenda['consultation_minutes'])
+    tz = timezone.get_current_timezone()
+    cursor = now
+    position = 0
+    entries = []
+    for entry in agenda['queue']:
+        entry = dict(entry)
+        if entry['status'] == 'in_progress':
+            started = entry['started_at'] or now
+            start = min(started, now)
+            cursor = max(cursor, started + length)
+            entry['position'] = 0
+        else:
+            scheduled = timezone.make_aware(
+                datetime.datetime.combine(agenda['date'], entry['scheduled_time']), tz
+            )
+            start = max(cursor, scheduled)
+            cursor = start + length
+            position += 1
+            entry['position'] = position
+        entry['expected_start'] = start
+        entry['wait_minutes'] = max(0, round((start - now).total_seconds() / 60))
+        entries.append(entry)
+    return entries
+
+
+def next_patient(entries):
+    """First patient still waiting to be seen, or None"""
+    return next((entry for entry in entries if entry['position'] > 0), None)
+
+
+def locate(appointment_id):
+    """
+    Find an appointment in today's cached queues
+
+    Returns:
+        (agenda, entries) with wait times, or (None, None) when the
+        appointment isn't queued today
+    """
+    pointer = cache.get(appointment_key(appointment_id))
+    if pointer is None:
+        # Pointers are written with the agenda; look the doctor up once
+        pointer = Appointment.objects.filter(
+            pk=appointment_id, status__in=OPEN_STATUSES,
+        ).values_list('doctor_id', 'scheduled_date').first()
+        if pointer is None:
+            return None, None
+    doctor_id, date = pointer
+    if date != timezone.localdate():
+        return None, None
+    agenda = get(doctor_id, date)
+    entries = with_wait_times(agenda)
+    if not any(entry['id'] == appointment_id for entry in entries):
+        return None, None
+    return agenda, entries
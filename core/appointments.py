@@ -0,0 +1,152 @@
+"""
+Appointment status transitions
+
+Every status change goes through transition() or bulk_transition(), which
+check the move against TRANSITIONS, write only the changed columns and
+apply the side effects (consultation timestamps, patient notifications)
+in the same transaction. Listeners of the appointments_transitioned signal
+run only after that transaction commits.
+"""
+from django.db import transaction
+from django.utils import timezone
+
+from . import agenda
+from .models import Appointment, Consultation, DoctorStats, Notification
+from .signals import appointments_transitioned
+
+
+# Allowed moves; completed and cancelled are final
+TRANSITIONS = {
+    'pending': {'confirmed', 'in_progress', 'cancelled'},
+    'confirmed': {'in_progress', 'completed', 'cancelled'},
+    'in_progress': {'completed', 'cancelled'},
+    'completed': set(),
+    'cancelled': set(),
+}
+
+# Targets without per-appointment side effects, so they can be set in bulk
+BULK_TARGETS = {'confirmed', 'cancelled'}
+
+
+class InvalidTransition(ValueError):
+    pass
+
+
+def can_transition(current, target):
+    return target in TRANSITIONS.get(current, ())
+
+
+def _patient_notification(user_id, booking_id, status):
+    return Notification(
+        user_id=user_id,
+        notification_type='appointment',
+        title='Appointment Update',
+        message=f'Your appointment ({booking_id}) has been {status}.',
+        link='/patient/appointments/',
+    )
+
+
+def _send_after_commit(appointment_ids, doctor_ids, target):
+    transaction.on_commit(lambda: appointments_transitioned.send(
+        sender=Appointment,
+        appointment_ids=appointment_ids,
+        doctor_ids=sorted(set(doctor_ids)),
+        status=target,
+    ))
+
+
+def transition(appointment, target, notify=False):
+    """
+    Move one appointment to a new status
+
+    Args:
+        appointment: Appointment instance, as loaded by the caller
+        target: New status
+        notify: Send the patient an 'Appointment Update' notification
+
+    Returns:
+        The updated appointment. Raises InvalidTransition if the move isn't
+        allowed or the appointment changed since it was loaded.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        current = Appointment.objects.select_for_update().values_list(
+            'status', flat=True
+        ).get(pk=appointment.pk)
+        if current != appointment.status:
+            raise InvalidTransition('Appointment was updated meanwhile')
+        if not can_transition(current, target):
+            raise InvalidTransition(f'Cannot move a {current} appointment to {target}')
+
+        appointment.status = target
+        appointment.save(update_fields=['status', 'updated_at'])
+
+        if target == 'in_progress':
+            consultation, created = Consultation.objects.get_or_create(
+                appointment=appointment, defaults={'started_at': now}
+            )
+            if not created and consultation.started_at is None:
+                consultation.started_at = now
+                consultation.save(update_fields=['started_at'])
+        elif target == 'completed':
+            consultation = Consultation.objects.filter(appointment=appointment).first()
+            if consultation is not None and consultation.ended_at is None:
+                consultation.ended_at = now
+                consultation.save(update_fields=['ended_at'])
+
+        if notify:
+            _patient_notification(
+                appointment.patient.user_id, appointment.booking_id, target
+            ).save()
+        _send_after_commit([appointment.pk], [appointment.doctor_id], target)
+    return appointment
+
+
+def bulk_transition(queryset, target, notify=True):
+    """
+    Move every appointment in a queryset that is allowed to reach target
+
+    Runs a fixed number of queries however many appointments match: one
+    locking read, one UPDATE, one bulk notification insert, plus one stats
+    update and one agenda rebuild per doctor and day involved. Appointments
+    that can't make the move (e.g. already completed) are left alone.
+
+    Returns:
+        Number of appointments moved
+    """
+    if target not in BULK_TARGETS:
+        raise InvalidTransition(f'{target} cannot be set in bulk')
+    sources = [status for status, targets in TRANSITIONS.items() if target in targets]
+
+    with transaction.atomic():
+        rows = list(
+            queryset.filter(status__in=sources).order_by()
+            .select_for_update(of=('self',))
+            .values_list(
+                'id', 'doctor_id', 'status', 'booking_id', 'patient__user_id', 'scheduled_date'
+            )
+        )
+        if not rows:
+            return 0
+        ids = [row[0] for row in rows]
+        Appointment.objects.filter(pk__in=ids).update(status=target, updated_at=timezone.now())
+
+        # update() skips the signals that keep DoctorStats current; only
+        # pending counts change since completed is never a bulk source
+        left_pending = {}
+        for _, doctor_id, status, *_ in rows:
+            if status == 'pending':
+                left_pending[doctor_id] = left_pending.get(doctor_id, 0) + 1
+        for doctor_id, count in left_pending.items():
+            DoctorStats.adjust(doctor_id, pending_count=-count)
+        # ...and the ones that rebuild the doctors' daily agendas
+        days = {(row[1], row[5]) for row in rows}
+        transaction.on_commit(lambda: [agenda.refresh(*day) for day in days])
+
+        if notify:
+            Notification.objects.bulk_create([
+                _patient_notification(user_id, booking_id, target)
+                for _, _, _, booking_id, user_id, _ in rows
+            ])
+        _send_after_commit(ids, [row[1] for row in rows], target)
+    return len(ids)
@@ -0,0 +1,220 @@
+"""
+Bed availability snapshots for dashboards and dispatchers
+
+A snapshot lists every active hospital with per-ward available/total bed
+counts, computed in one GROUP BY query. Every Bed (and Hospital) save
+appends a BedChange row whose id is the new version, so pollers can ask
+for ?since=<version> and receive only the hospitals that changed.
+
+Dispatchers reserve beds with claim_bed(), which holds the first free bed
+of a ward for a limited time. Holds are taken with SELECT ... FOR UPDATE
+SKIP LOCKED where the database supports it and with a compare-and-swap
+UPDATE on SQLite, so two claimers can never get the same bed.
+
+Readers never write: a hold past its held_until counts as free straight
+away, and the hospitals it belongs to are sent with every delta until
+expire_holds() (the expire_bed_holds command) clears it and logs the
+change.
+"""
+import uuid
+from datetime import timedelta
+
+from django.db import connection, transaction
+from django.db.models import Count, Min, Q
+from django.utils import timezone
+
+from .models import Bed, BedChange, Hospital
+
+
+WARD_FIELDS = ('available', 'total', 'held')
+
+# Minutes a claimed bed stays reserved before it is released automatically
+DEFAULT_HOLD_MINUTES = 30
+MAX_HOLD_MINUTES = 240
+
+# Candidate beds tried per compare-and-swap round (SQLite)
+CAS_BATCH = 10
+
+_NO_HOLD = {'held_until': None, 'hold_token': None, 'held_by': None}
+
+
+def snapshot(hospital_ids=None):
+    """
+    Current bed availability
+
+    Args:
+        hospital_ids: Optional ids to restrict the snapshot to
+
+    Returns:
+        List of hospital dicts ordered by id; wards map ward_type to
+        [available, total, held]. Held beds are not counted as available.
+    """
+    hospitals = Hospital.objects.filter(is_active=True)
+    if hospital_ids is not None:
+        hospitals = hospitals.filter(pk__in=hospital_ids)
+
+    data = {
+        pk: {'id': pk, 'name': name, 'available': 0, 'total': 0, 'held': 0, 'wards': {}}
+        for pk, name in hospitals.order_by('id').values_list('id', 'name')
+    }
+    if not data:
+        return []
+
+    now = timezone.now()
+    wards = Bed.objects.filter(hospital__in=hospitals).values(
+        'hospital_id', 'ward_type'
+    ).annotate(
+        total=Count('id'),
+        available=Count('id', filter=Bed.free_filter(now=now)),
+        held=Count('id', filter=Q(is_available=True, held_until__gt=now)),
+    ).order_by()
+    for ward in wards:
+        hospital = data[ward['hospital_id']]
+        hospital['wards'][ward['ward_type']] = [ward['available'], ward['total'], ward['held']]
+        for field in WARD_FIELDS:
+            hospital[field] += ward[field]
+    return list(data.values())
+
+
+def lapsed_hold_hospitals():
+    """Ids of hospitals with holds past their expiry that are not cleared yet"""
+    return set(
+        Bed.objects.filter(held_until__lte=timezone.now())
+        .values_list('hospital_id', flat=True).distinct().order_by()
+    )
+
+
+def changes_since(since, version, lapsed=()):
+    """
+    Hospitals changed after version `since`, up to `version`
+
+    Args:
+        since: Version the poller last saw
+        version: Current version (BedChange.latest_version())
+        lapsed: Hospitals with lapsed, uncleared holds; their counts moved
+            without a logged change, so they are always included
+
+    Returns:
+        (hospitals, removed_ids), or None when the change log no longer
+        reaches back that far and the caller needs a full snapshot
+    """
+    if since > version:
+        # Poller is ahead of us (database restored or reset)
+        return None
+    changed = set(lapsed)
+    if since < version:
+        oldest = BedChange.objects.aggregate(oldest=Min('pk'))['oldest']
+        if oldest is None or since < oldest - 1:
+            return None
+        changed.update(
+            BedChange.objects.filter(pk__gt=since, pk__lte=version)
+            .values_list('hospital_id', flat=True).distinct()
+        )
+    if not changed:
+        return [], []
+    hospitals = snapshot(changed)
+    # Deleted or deactivated hospitals drop out of the snapshot
+    removed = sorted(changed - {h['id'] for h in hospitals})
+    return hospitals, removed
+
+
+# ==================== HOLDS ====================
+
+def _free_beds(hospital_id, ward_type, now):
+    return Bed.objects.filter(
+        Bed.free_filter(now=now), hospital_id=hospital_id, ward_type=ward_type,
+    ).order_by('id')
+
+
+def claim_bed(hospital_id, ward_type, user=None, minutes=DEFAULT_HOLD_MINUTES):
+    """
+    Hold the first free bed of a ward type at a hospital
+
+    Args:
+        hospital_id: Hospital to claim a bed in
+        ward_type: One of Bed.WARD_TYPES
+        user: Dispatcher placing the hold
+        minutes: How long the hold lasts unless confirmed or released
+
+    Returns:
+        The held Bed (hold_token identifies the hold), or None when every
+        bed in the ward is occupied or held
+    """
+    now = timezone.now()
+    hold = {
+        'held_until': now + timedelta(minutes=minutes),
+        'hold_token': uuid.uuid4(),
+        'held_by': user,
+        'updated_at': now,
+    }
+    free = _free_beds(hospital_id, ward_type, now)
+    if connection.features.has_select_for_update_skip_locked:
+        bed_id = _claim_skip_locked(free, hold)
+    else:
+        bed_id = _claim_compare_and_swap(free, hold)
+    if bed_id is None:
+        return None
+    # update() bypasses the post_save signal that feeds the change log
+    BedChange.record(hospital_id)
+    return Bed.objects.get(pk=bed_id)
+
+
+def _claim_skip_locked(free, hold):
+    # Concurrent claimers skip rows another transaction is claiming
+    with transaction.atomic():
+        bed_id = free.select_for_update(skip_locked=True).values_list('id', flat=True).first()
+        if bed_id is not None:
+            Bed.objects.filter(pk=bed_id).update(**hold)
+        return bed_id
+
+
+def _claim_compare_and_swap(free, hold):
+    # No row locks on SQLite: only update a bed whose hold is unchanged
+    # since we read it; losers move on to the next candidate
+    while True:
+        candidates = list(free.values_list('id', 'held_until')[:CAS_BATCH])
+        if not candidates:
+            return None
+        for bed_id, held_until in candidates:
+            unchanged = Bed.objects.filter(pk=bed_id, is_available=True)
+            if held_until is None:
+                unchanged = unchanged.filter(held_until__isnull=True)
+            else:
+                unchanged = unchanged.filter(held_until=held_until)
+            if unchanged.update(**hold):
+                return bed_id
+
+
+def _end_hold(token, **changes):
+    now = timezone.now()
+    live = Bed.objects.filter(hold_token=token, held_until__gt=now)
+    hospital_id = live.values_list('hospital_id', flat=True).first()
+    if hospital_id is None or not live.update(updated_at=now, **_NO_HOLD, **changes):
+        return False
+    BedChange.record(hospital_id)
+    return True
+
+
+def confirm_hold(token):
+    """Admit the patient: the held bed becomes occupied. False if the hold lapsed."""
+    return _end_hold(token, is_available=False)
+
+
+def release_hold(token):
+    """Give a held bed back before its hold expires"""
+    return _end_hold(token)
+
+
+def expire_holds():
+    """
+    Clear lapsed holds and log the change, so pollers' versions move on
+
+    Snapshots already count lapsed holds as free; run this periodically
+    (manage.py expire_bed_holds) so deltas stop re-sending those hospitals.
+    """
+    now = timezone.now()
+    expired = Bed.objects.filter(held_until__lte=now)
+    hospital_ids = set(expired.values_list('hospital_id', flat=True))
+    if hospital_ids and expired.update(**_NO_HOLD):
+        BedChange.record(*hospital_ids)
+    return len(hospital_ids)
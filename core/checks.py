@@ -0,0 +1,133 @@
+"""
+Deployment checks for performance settings
+
+Run with `python manage.py check --deploy` next to Django's own security
+checks. Each warning names a setting still at its development default that
+costs speed (or correctness across workers) in production.
+"""
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+
+LOCMEM_CACHE = 'django.core.cache.backends.locmem.LocMemCache'
+COMPRESSION_MIDDLEWARE = ('core.middleware.CompressionMiddleware', 'django.middleware.gzip.GZipMiddleware')
+MAX_PROFILE_SAMPLE_RATE = 1 / 50
+FONT_BUNDLE_PARTS = (('webfonts', 'web fonts (Google Fonts)'), ('icons', 'icons (cdnjs)'))
+
+
+def _template_loaders():
+    loaders = []
+    for engine in settings.TEMPLATES:
+        for loader in engine.get('OPTIONS', {}).get('loaders', []):
+            loaders.append(loader[0] if isinstance(loader, (list, tuple)) else loader)
+    return loaders
+
+
+@register(Tags.caches, deploy=True)
+def check_caches(app_configs, **kwargs):
+    warnings = []
+    local = [alias for alias, config in settings.CACHES.items() if config['BACKEND'] == LOCMEM_CACHE]
+    if local:
+        warnings.append(Warning(
+            f"Cache(s) {', '.join(local)} are per-process LocMemCache.",
+            hint='Rate limits and cached pages are not shared between workers, and '
+                 'agendas are rebuilt on every read. '
+                 'Set CACHE_BACKEND=file (one machine) or CACHE_BACKEND=redis.',
+            id='core.W001',
+        ))
+    if settings.SESSION_ENGINE == 'django.contrib.sessions.backends.db':
+        warnings.append(Warning(
+            'Sessions are read from and written to the database on every request.',
+            hint='Set CACHE_BACKEND=file or redis; sessions then default to the '
+                 'cached_db or cache engine.',
+            id='core.W002',
+        ))
+    return warnings
+
+
+@register(Tags.database, deploy=True)
+def check_database(app_configs, **kwargs):
+    warnings = []
+    database = settings.DATABASES['default']
+    if not database.get('CONN_MAX_AGE'):
+        warnings.append(Warning(
+            'Database connections are closed after every request.',
+            hint='Set DB_CONN_MAX_AGE (e.g. 60) to reuse connections.',
+            id='core.W003',
+        ))
+    if database['ENGINE'] == 'django.db.backends.sqlite3':
+        warnings.append(Warning(
+            'SQLite allows one writer at a time; bookings and chat will queue under load.',
+            hint='Use PostgreSQL (DB_ENGINE=django.db.backends.postgresql) for more than a handful of users.',
+            id='core.W004',
+        ))
+    return warnings
+
+
+@register(Tags.templates, deploy=True)
+def check_templates(app_configs, **kwargs):
+    warnings = []
+    if 'django.template.loaders.cached.Loader' not in _template_loaders():
+        warnings.append(Warning(
+            'Templates are re-read and re-parsed on every render.',
+            hint='Leave TEMPLATE_CACHE on.',
+            id='core.W005',
+        ))
+    if not getattr(settings, 'TEMPLATE_WARMUP', False):
+        warnings.append(Warning(
+            'Workers compile templates on first use instead of at startup.',
+            hint='Set TEMPLATE_WARMUP=true.',
+            id='core.W006',
+        ))
+    return warnings
+
+
+@register(Tags.staticfiles, deploy=True)
+def check_font_bundle(app_configs, **kwargs):
+    from .templatetags.telemed_assets import load_font_bundle
+
+    bundle = load_font_bundle()
+    missing = [label for part, label in FONT_BUNDLE_PARTS if not bundle.get(part)]
+    if not missing:
+        return []
+    return [Warning(
+        f"Pages load {' and '.join(missing)} from third-party servers.",
+        hint='Run python manage.py build_font_bundle and commit static/fonts/.',
+        id='core.W012',
+    )]
+
+
+@register(deploy=True)
+def check_responses(app_configs, **kwargs):
+    warnings = []
+    if settings.DEBUG:
+        warnings.append(Warning(
+            'DEBUG is on: every SQL query is kept in memory and error pages are rendered in full.',
+            hint='Set DJANGO_ENV=production or DJANGO_DEBUG=false.',
+            id='core.W007',
+        ))
+    if not any(middleware in settings.MIDDLEWARE for middleware in COMPRESSION_MIDDLEWARE):
+        warnings.append(Warning(
+            'HTML and JSON responses are sent uncompressed.',
+            hint='Set COMPRESSION=true, unless the web server in front compresses responses.',
+            id='core.W008',
+        ))
+    if 'Manifest' not in settings.STORAGES['staticfiles']['BACKEND']:
+        warnings.append(Warning(
+            'Static files are not fingerprinted, so browsers cannot cache them for long.',
+            hint='Leave STATICFILES_BACKEND at core.storage.CompressedManifestStaticFilesStorage.',
+            id='core.W009',
+        ))
+    if settings.EMAIL_BACKEND == 'django.core.mail.backends.console.EmailBackend':
+        warnings.append(Warning(
+            'Emails are printed to the console instead of being sent.',
+            hint='Set EMAIL_BACKEND and the EMAIL_HOST_* variables.',
+            id='core.W010',
+        ))
+    sample_every = getattr(settings, 'PROFILE_SAMPLE_EVERY', 0)
+    if sample_every and 1 / sample_every > MAX_PROFILE_SAMPLE_RATE:
+        warnings.append(Warning(
+            f'One in {sample_every} requests runs under the profiler.',
+            hint=f'Profile at most one in {int(1 / MAX_PROFILE_SAMPLE_RATE)} requests, or set PROFILE_SAMPLE_EVERY=0.',
+            id='core.W011',
+        ))
+    return warnings
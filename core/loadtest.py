@@ -0,0 +1,213 @@
+"""
+HTTP load generator for a clinic day
+
+Virtual patients and doctors log in to a running server (runserver or any
+WSGI server) and repeat a weighted mix of actions: browsing hospitals,
+booking appointments, chatting in consultations, checking the doctor
+dashboard and writing prescriptions. Every request's latency is recorded per
+endpoint. This module only uses the standard library and never touches the
+database, so its workers can run in separate processes; the load_test
+command seeds the accounts and summarizes the results.
+"""
+import datetime
+import http.cookiejar
+import json
+import math
+import random
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+
+# Action name -> role that performs it
+ACTIONS = {
+    'find_hospitals': 'patient',
+    'book_appointment': 'patient',
+    'send_message': 'patient',
+    'doctor_dashboard': 'doctor',
+    'create_prescription': 'doctor',
+}
+DEFAULT_MIX = {
+    'find_hospitals': 40,
+    'book_appointment': 10,
+    'send_message': 30,
+    'doctor_dashboard': 15,
+    'create_prescription': 5,
+}
+REQUEST_TIMEOUT = 30
+PERCENTILES = (50, 95, 99)
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    # Time each request on its own; a redirect is a response, not a failure
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+
+
+class Client:
+    """One virtual user's HTTP session (cookies and CSRF token)"""
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+        self.cookies = http.cookiejar.CookieJar()
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(self.cookies), _NoRedirect,
+        )
+
+    def csrf_token(self):
+        for cookie in self.cookies:
+            if cookie.name == 'csrftoken':
+                return cookie.value
+        return ''
+
+    def request(self, path, data=None, json_body=None):
+        """Send one request; return (status, body)"""
+        headers = {}
+        body = None
+        if json_body is not None:
+            body = json.dumps(json_body).encode()
+            headers = {'Content-Type': 'application/json', 'X-CSRFToken': self.csrf_token()}
+        elif data is not None:
+            body = urllib.parse.urlencode({**data, 'csrfmiddlewaretoken': self.csrf_token()}).encode()
+        request = urllib.request.Request(self.base_url + path, data=body, headers=headers)
+        try:
+            with self.opener.open(request, timeout=REQUEST_TIMEOUT) as response:
+                return response.status, response.read()
+        except urllib.error.HTTPError as exc:
+            return exc.code, exc.read()
+
+
+class VirtualUser:
+    """Runs one user's share of the action mix and records latencies"""
+
+    def __init__(self, base_url, account, mix, samples):
+        self.client = Client(base_url)
+        self.account = account
+        self.samples = samples
+        self.actions = [name for name in mix if ACTIONS[name] == account['role']]
+        self.weights = [mix[name] for name in self.actions]
+
+    def timed(self, endpoint, path, expect=None, **kwargs):
+        # Form posts redirect on success and re-render (200) when rejected
+        start = time.perf_counter()
+        try:
+            status, body = self.client.request(path, **kwargs)
+        except OSError:
+            status, body = 0, b''
+        ok = status == expect if expect else 0 < status < 400
+        self.samples.append((endpoint, time.perf_counter() - start, ok))
+        return status, body
+
+    def run(self, deadline, think_time):
+        # The login form sets the CSRF cookie every later POST needs
+        self.timed('login (form)', '/login/')
+        status, _ = self.timed('login', '/login/', expect=302, data={
+            'username': self.account['username'], 'password': self.account['password'],
+        })
+        if status != 302 or not self.actions:
+            return
+        while time.monotonic() < deadline:
+            action = random.choices(self.actions, self.weights)[0]
+            getattr(self, action)()
+            if think_time:
+                time.sleep(random.uniform(0, 2 * think_time))
+
+    def find_hospitals(self):
+        self.timed('find_hospitals', '/find-hospitals/')
+
+    def book_appointment(self):
+        self.timed('book_appointment (form)', '/patient/book-appointment/')
+        day = datetime.date.today() + datetime.timedelta(days=random.randint(1, 14))
+        self.timed('book_appointment', '/patient/book-appointment/', expect=302, data={
+            'doctor': random.choice(self.account['doctor_ids']),
+            'appointment_type': 'video',
+            'scheduled_date': day.isoformat(),
+            'scheduled_time': f'{random.randint(9, 16):02d}:{random.choice((0, 15, 30, 45)):02d}',
+            'symptoms': 'Load test booking',
+        })
+
+    def send_message(self):
+        self.timed('api/send-message', '/api/send-message/', json_body={
+            'consultation_id': random.choice(self.account['consultation_ids']),
+            'message': 'Load test message',
+        })
+
+    def doctor_dashboard(self):
+        self.timed('doctor_dashboard', '/doctor/dashboard/')
+
+    def create_prescription(self):
+        path = f"/doctor/appointment/{random.choice(self.account['appointment_ids'])}/prescription/"
+        self.timed('create_prescription (form)', path)
+        self.timed('create_prescription', path, expect=302, data={
+            'medications': 'Paracetamol 500mg - twice daily',
+            'instructions': 'Load test prescription',
+        })
+
+
+def run_worker(job):
+    """
+    Run one process's virtual users until the deadline
+
+    Args:
+        job: Dict with base_url, accounts, mix, duration and think_time
+
+    Returns:
+        List of (endpoint, seconds, ok) samples
+    """
+    samples = []
+    lock = threading.Lock()
+    deadline = time.monotonic() + job['duration']
+
+    def run(account):
+        local = []
+        VirtualUser(job['base_url'], account, job['mix'], local).run(deadline, job['think_time'])
+        with lock:
+            samples.extend(local)
+
+    with ThreadPoolExecutor(max_workers=max(1, len(job['accounts']))) as pool:
+        list(pool.map(run, job['accounts']))
+    return samples
+
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile of an ascending list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(p / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def summarize(samples, elapsed):
+    """
+    Per-endpoint latency and throughput
+
+    Args:
+        samples: (endpoint, seconds, ok) tuples from every worker
+        elapsed: Wall-clock length of the run in seconds
+
+    Returns:
+        List of dicts (endpoint, requests, errors, rps, p50, p95, p99, max
+        in milliseconds), busiest endpoint first, with a final 'all' row
+    """
+    by_endpoint = {}
+    for endpoint, seconds, ok in samples:
+        by_endpoint.setdefault(endpoint, []).append((seconds, ok))
+    by_endpoint['all'] = [(seconds, ok) for _, seconds, ok in samples]
+
+    rows = []
+    for endpoint, results in by_endpoint.items():
+        latencies = sorted(seconds * 1000 for seconds, _ in results)
+        row = {
+            'endpoint': endpoint,
+            'requests': len(results),
+            'errors': sum(1 for _, ok in results if not ok),
+            'rps': len(results) / elapsed if elapsed else 0.0,
+            'max': latencies[-1] if latencies else 0.0,
+        }
+        row.update({f'p{p}': percentile(latencies, p) for p in PERCENTILES})
+        rows.append(row)
+    rows.sort(key=lambda row: (row['endpoint'] == 'all', -row['requests']))
+    return rows
@@ -0,0 +1,45 @@
+"""
+Build every doctor's consultation queue for the day ahead of time
+Run: python manage.py build_daily_agendas [--date YYYY-MM-DD]
+
+Schedule it shortly after midnight so the first dashboard loads and
+patient queue checks of the day are served from the cache.
+"""
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from core import agenda
+from core.models import Appointment
+
+
+class Command(BaseCommand):
+    help = "Precompute and cache each doctor's daily agenda"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', help='Day to build (default: today)')
+
+    def handle(self, *args, **options):
+        try:
+            date = datetime.date.fromisoformat(options['date']) if options['date'] else timezone.localdate()
+        except ValueError:
+            raise CommandError('--date must be YYYY-MM-DD')
+        if not agenda.cache_is_shared():
+            self.stdout.write(self.style.WARNING(
+                'The default cache is per-process (LocMemCache), so agendas are '
+                'built on every read and there is nothing to prebuild.'
+            ))
+            return
+
+        doctor_ids = Appointment.objects.filter(
+            scheduled_date=date, status__in=agenda.OPEN_STATUSES,
+        ).values_list('doctor_id', flat=True).distinct().order_by()
+
+        built = queued = 0
+        for doctor_id in doctor_ids:
+            queued += len(agenda.build(doctor_id, date)['queue'])
+            built += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'Built {built} agenda(s) for {date:%d %b %Y} with {queued} queued appointment(s).'
+        ))
@@ -0,0 +1,416 @@
+"""
+Build a self-hosted, subsetted icon and web font bundle
+Run: python manage.py build_font_bundle --fontawesome-dir PATH [--webfont-dir PATH]
+
+Scans templates/ and static/js/ for the Font Awesome icons and the characters
+actually used, subsets the fonts to those glyphs and writes woff2 files, a
+stylesheet and bundle.json into static/fonts/ (collectstatic fingerprints
+them). base.html picks the bundle up through the {% font_bundle %} tag.
+
+Font sources are the fontawesomefree, fontpkg-inter and fontpkg-outfit
+packages from requirements.txt, so no network access is needed. Variable web
+fonts are cut down to the weights GOOGLE_FONTS_URL asks for. Commit the
+result: pages then make no third-party font requests at all.
+"""
+import hashlib
+import html
+import io
+import json
+import re
+import importlib
+import urllib.request
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.templatetags.telemed_assets import BUNDLE_MANIFEST, GOOGLE_FONTS_URL
+
+
+# Classes that style icons rather than name them
+FA_STYLE_CLASSES = {'fa', 'fas', 'far', 'fab', 'fa-solid', 'fa-regular', 'fa-brands', 'fa-classic'}
+FA_FONTS = {
+    'solid': ('fa-solid-900', 'Font Awesome 6 Free', 900),
+    'regular': ('fa-regular-400', 'Font Awesome 6 Free', 400),
+    'brands': ('fa-brands-400', 'Font Awesome 6 Brands', 400),
+}
+FA_BASE_CSS = (
+    '.fa,.fa-brands,.fa-regular,.fa-solid,.fab,.far,.fas{-moz-osx-font-smoothing:grayscale;'
+    '-webkit-font-smoothing:antialiased;display:var(--fa-display,inline-block);font-style:normal;'
+    'font-variant:normal;line-height:1;text-rendering:auto}'
+    '.fa,.fa-solid,.fas{font-family:"Font Awesome 6 Free";font-weight:900}'
+    '.fa-regular,.far{font-family:"Font Awesome 6 Free";font-weight:400}'
+    '.fa-brands,.fab{font-family:"Font Awesome 6 Brands";font-weight:400}'
+)
+
+FA_CLASS_RE = re.compile(r'\bfa-([a-z0-9]+(?:-[a-z0-9]+)*)')
+# class="fas fa-{% if ... %}check-circle{% elif ... %}info-circle{% endif %}"
+FA_TEMPLATE_EXPR_RE = re.compile(r'fa-\{%(.*?)["\']', re.S)
+TEMPLATE_BRANCH_RE = re.compile(r'%\}([a-z0-9-]+)\{%')
+JS_STRING_RE = re.compile(r'''['"]([a-z0-9]+(?:-[a-z0-9]+)*)['"]''')
+FA_ICON_RULE_RE = re.compile(r'([^{}]+)\{content:"\\([0-9a-f]+)";?\}')
+FA_SELECTOR_RE = re.compile(r'^\.fa-([a-z0-9-]+):{1,2}before$')
+DJANGO_TAG_RE = re.compile(r'\{%.*?%\}|\{\{.*?\}\}|\{#.*?#\}', re.S)
+HTML_TAG_RE = re.compile(r'<[^>]*>', re.S)
+GOOGLE_FONT_FACE_RE = re.compile(r'@font-face\s*\{[^}]*\}', re.S)
+GOOGLE_FAMILY_RE = re.compile(r'family=([^:&]+):wght@([\d;]+)')
+# Packages shipping the Inter and Outfit font files (SIL OFL 1.1)
+WEBFONT_PACKAGES = ('fontpkg_inter', 'fontpkg_outfit')
+FONT_EXTENSIONS = ('.ttf', '.otf', '.woff', '.woff2')
+
+# Always keep printable ASCII and common typography in text fonts
+BASE_CHARACTERS = set(range(0x20, 0x7F)) | {0xA0, 0x2013, 0x2014, 0x2018, 0x2019, 0x201C, 0x201D, 0x2022, 0x2026}
+
+
+class Command(BaseCommand):
+    help = 'Subset Font Awesome and web fonts to the glyphs used by the templates'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--fontawesome-dir',
+            help='Font Awesome Free distribution (containing css/all.css and webfonts/). '
+                 'Defaults to the fontawesomefree package when installed.',
+        )
+        parser.add_argument(
+            '--webfont-dir',
+            help='Directory of Inter/Outfit font files (ttf, otf, woff, woff2). '
+                 'Defaults to the fontpkg-inter and fontpkg-outfit packages, '
+                 'then to downloading from Google Fonts.',
+        )
+        parser.add_argument(
+            '--output-dir',
+            help='Where to write the bundle (default: static/fonts)',
+        )
+        parser.add_argument(
+            '--include', action='append', default=[],
+            help='Extra icon name to keep, e.g. --include spinner (may be repeated)',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            from fontTools import subset  # noqa: F401
+        except ImportError:
+            raise CommandError('fonttools is required: pip install fonttools brotli')
+
+        base_dir = Path(settings.BASE_DIR)
+        self.template_dirs = [base_dir / 'templates']
+        self.script_dirs = [Path(d) / 'js' for d in settings.STATICFILES_DIRS]
+        self.output_dir = Path(options['output_dir'] or Path(settings.STATICFILES_DIRS[0]) / 'fonts')
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        self.written = []
+
+        css_parts = []
+        manifest = {'icons': False, 'webfonts': False, 'preload': []}
+
+        fa_dir = self.find_fontawesome_dir(options['fontawesome_dir'])
+        if fa_dir:
+            css_parts.append(self.build_icons(fa_dir, set(options['include']), manifest))
+        else:
+            self.stderr.write('Font Awesome sources not found; icons stay on the CDN.')
+
+        webfont_css = self.build_webfonts(options['webfont_dir'], manifest)
+        if webfont_css:
+            css_parts.append(webfont_css)
+        else:
+            self.stderr.write('No web fonts bundled; Inter/Outfit stay on Google Fonts.')
+
+        if not css_parts:
+            raise CommandError('Nothing to bundle.')
+
+        css = '\n'.join(css_parts).encode('utf-8')
+        manifest['css'] = self.write_file('bundle.css', css)
+        (self.output_dir / BUNDLE_MANIFEST).write_text(json.dumps(manifest, indent=2) + '\n')
+        self.remove_stale_files()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {manifest['css']} ({len(css)} bytes) and {sum(name.endswith('.woff2') for name in self.written)} font files."
+        ))
+
+    # ==================== SCANNING ====================
+
+    def iter_files(self, dirs, pattern):
+        for directory in dirs:
+            if directory.is_dir():
+                yield from sorted(directory.rglob(pattern))
+
+    def scan_icon_names(self, known_icons):
+        """Return (icon names, style classes) referenced by templates and scripts"""
+        names, styles = set(), set()
+        for path in self.iter_files(self.template_dirs, '*.html'):
+            text = path.read_text(encoding='utf-8')
+            names.update(FA_CLASS_RE.findall(text))
+            for expr in FA_TEMPLATE_EXPR_RE.findall(text):
+                names.update(TEMPLATE_BRANCH_RE.findall('%}' + expr))
+            styles.update(re.findall(r'\b(fa[srb]|fa-(?:solid|regular|brands))\b', text))
+        for path in self.iter_files(self.script_dirs, '*.js'):
+            text = path.read_text(encoding='utf-8')
+            names.update(FA_CLASS_RE.findall(text))
+            # Icon names built at runtime: `fa-${getAlertIcon(type)}`. One
+            # character strings are selectors ('a'), not the letter icons
+            names.update(n for n in JS_STRING_RE.findall(text) if n in known_icons and len(n) > 1)
+            styles.update(re.findall(r'\b(fa[srb]|fa-(?:solid|regular|brands))\b', text))
+        return names, styles
+
+    def scan_characters(self):
+        chars = set(BASE_CHARACTERS)
+        for path in self.iter_files(self.template_dirs, '*.html'):
+            text = DJANGO_TAG_RE.sub(' ', path.read_text(encoding='utf-8'))
+            text = html.unescape(HTML_TAG_RE.sub(' ', text))
+            chars.update(ord(c) for c in text if ord(c) > 0x7E)
+        for path in self.iter_files(self.script_dirs, '*.js'):
+            chars.update(ord(c) for c in path.read_text(encoding='utf-8') if ord(c) > 0x7E)
+        return chars
+
+    # ==================== ICONS ====================
+
+    def find_fontawesome_dir(self, option):
+        if option:
+            path = Path(option)
+            if not (path / 'css').is_dir():
+                raise CommandError(f'{path} has no css/ directory')
+            return path
+        try:
+            import fontawesomefree
+        except ImportError:
+            return None
+        return Path(fontawesomefree.__file__).parent / 'static' / 'fontawesomefree'
+
+    def build_icons(self, fa_dir, extra, manifest):
+        css_path = fa_dir / 'css' / 'all.css'
+        if not css_path.exists():
+            css_path = fa_dir / 'css' / 'all.min.css'
+        source_css = re.sub(r'\s+', '', css_path.read_text(encoding='utf-8'))
+        source_css = re.sub(r'/\*.*?\*/', '', source_css)
+
+        codepoints = {}
+        for selectors, codepoint in FA_ICON_RULE_RE.findall(source_css):
+            for selector in selectors.split(','):
+                match = FA_SELECTOR_RE.match(selector)
+                if match:
+                    codepoints[match.group(1)] = int(codepoint, 16)
+
+        names, styles = self.scan_icon_names(codepoints)
+        names = (names | extra) - {s[3:] for s in FA_STYLE_CLASSES if s.startswith('fa-')}
+        used = {name: codepoints[name] for name in sorted(names) if name in codepoints}
+        unknown = sorted(n for n in names - set(used) if not re.match(r'^\d*x[sl]?$|^(fw|lg|sm|xs|spin|pulse)$', n))
+        if unknown:
+            self.stderr.write(f"Ignoring unknown icon classes: {', '.join(unknown)}")
+
+        families = {'solid'}
+        if styles & {'far', 'fa-regular'}:
+            families.add('regular')
+        if styles & {'fab', 'fa-brands'}:
+            families.add('brands')
+
+        css = [FA_BASE_CSS]
+        wanted = set(used.values())
+        for family in sorted(families):
+            filename, font_family, weight = FA_FONTS[family]
+            source = self.find_font_file(fa_dir / 'webfonts', filename)
+            if source is None:
+                raise CommandError(f'{filename} not found in {fa_dir / "webfonts"}')
+            data, covered = self.subset_font(source, wanted)
+            if not covered:
+                continue
+            url = self.write_file(f'{filename}.woff2', data)
+            manifest['preload'].append(url)
+            css.append(
+                f'@font-face{{font-family:"{font_family}";font-style:normal;font-weight:{weight};'
+                f'font-display:block;src:url({Path(url).name}) format("woff2")}}'
+            )
+
+        by_codepoint = {}
+        for name, codepoint in used.items():
+            by_codepoint.setdefault(codepoint, []).append(name)
+        for codepoint, aliases in sorted(by_codepoint.items()):
+            selectors = ','.join(f'.fa-{name}:before' for name in aliases)
+            css.append(f'{selectors}{{content:"\\{codepoint:x}"}}')
+
+        self.stdout.write(f'Icons: {len(used)} of {len(codepoints)} kept.')
+        manifest['icons'] = True
+        manifest['icon_names'] = sorted(used)
+        header = '/* Font Awesome Free 6 subset - https://fontawesome.com/license/free ' \
+                 '(Icons: CC BY 4.0, Fonts: SIL OFL 1.1, Code: MIT License) */'
+        return header + '\n' + ''.join(css)
+
+    def find_font_file(self, directory, stem):
+        for ext in ('.woff2', '.ttf', '.woff'):
+            path = directory / f'{stem}{ext}'
+            if path.exists():
+                return path
+        return None
+
+    # ==================== WEB FONTS ====================
+
+    def build_webfonts(self, webfont_dir, manifest):
+        chars = self.scan_characters()
+        weights = webfont_weights()
+        if webfont_dir:
+            sources = self.read_font_files([Path(webfont_dir)])
+        else:
+            dirs = self.find_webfont_dirs()
+            sources = self.read_font_files(dirs) or self.download_google_fonts()
+            for directory in dirs:
+                # The SIL Open Font License asks for the license to travel with the fonts
+                license_path = directory.parent / 'LICENSE'
+                if license_path.exists():
+                    family = directory.parent.name.split('_', 1)[-1]
+                    self.write_file(f'LICENSE-{family}.txt', license_path.read_bytes())
+
+        css = []
+        for data, face in sources:
+            family, weight, style = face or self.describe_font(data)
+            if family not in weights or style != 'normal':
+                continue
+            # Variable fonts keep only the weight range the site uses
+            axis_limits = None if face else webfont_axis_limits(data, weights[family])
+            if axis_limits:
+                weight = '%d %d' % axis_limits['wght']
+            subset_data, covered = self.subset_font(io.BytesIO(data), chars, axis_limits)
+            if not covered:
+                continue
+            stem = re.sub(r'[^a-z0-9]+', '-', f'{family}-{weight}-{style}'.lower()).strip('-')
+            url = self.write_file(f'{stem}.woff2', subset_data)
+            css.append(
+                f'@font-face{{font-family:"{family}";font-style:{style};font-weight:{weight};'
+                f'font-display:swap;src:url({Path(url).name}) format("woff2");'
+                f'unicode-range:{unicode_range(covered)}}}'
+            )
+        manifest['webfonts'] = bool(css)
+        return ''.join(css)
+
+    def find_webfont_dirs(self):
+        dirs = []
+        for name in WEBFONT_PACKAGES:
+            try:
+                package = importlib.import_module(name)
+            except ImportError:
+                continue
+            dirs.append(Path(package.__file__).parent / 'files')
+        return dirs
+
+    def read_font_files(self, dirs):
+        return [
+            (path.read_bytes(), None)
+            for directory in dirs if directory.is_dir()
+            for path in sorted(directory.iterdir()) if path.suffix.lower() in FONT_EXTENSIONS
+        ]
+
+    def download_google_fonts(self):
+        request = urllib.request.Request(GOOGLE_FONTS_URL, headers={
+            # A modern user agent makes Google serve woff2
+            'User-Agent': 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0 Safari/537.36',
+        })
+        try:
+            with urllib.request.urlopen(request, timeout=15) as response:
+                css = response.read().decode('utf-8')
+            sources = []
+            for block in GOOGLE_FONT_FACE_RE.findall(css):
+                url = re.search(r'url\((https://[^)]+)\)', block).group(1)
+                face = (
+                    re.search(r"font-family:\s*'([^']+)'", block).group(1),
+                    re.search(r'font-weight:\s*([\d ]+);', block).group(1).strip(),
+                    re.search(r'font-style:\s*(\w+)', block).group(1),
+                )
+                with urllib.request.urlopen(url, timeout=15) as response:
+                    sources.append((response.read(), face))
+            return sources
+        except (OSError, AttributeError) as exc:
+            self.stderr.write(f'Could not download Google Fonts: {exc}')
+            return []
+
+    def describe_font(self, data):
+        from fontTools.ttLib import TTFont
+
+        font = TTFont(io.BytesIO(data))
+        names = font['name']
+        family = (names.getDebugName(16) or names.getDebugName(1)).strip()
+        style = 'italic' if font['OS/2'].fsSelection & 1 else 'normal'
+        weight = str(font['OS/2'].usWeightClass)
+        if 'fvar' in font:
+            for axis in font['fvar'].axes:
+                if axis.axisTag == 'wght':
+                    weight = f'{int(axis.minValue)} {int(axis.maxValue)}'
+        return family, weight, style
+
+    # ==================== OUTPUT ====================
+
+    def subset_font(self, source, codepoints, axis_limits=None):
+        """Subset a font file to codepoints; return (woff2 bytes, covered codepoints)"""
+        from fontTools import subset
+        from fontTools.ttLib import TTFont
+        from fontTools.varLib import instancer
+
+        font = TTFont(source, recalcTimestamp=False)
+        covered = set(font.getBestCmap()) & set(codepoints)
+        if not covered:
+            return None, covered
+        opts = subset.Options()
+        opts.flavor = 'woff2'
+        opts.layout_features = ['*']
+        opts.name_IDs = ['*']
+        opts.notdef_outline = True
+        subsetter = subset.Subsetter(opts)
+        subsetter.populate(unicodes=covered)
+        subsetter.subset(font)
+        if axis_limits:
+            font = instancer.instantiateVariableFont(font, axis_limits)
+        buffer = io.BytesIO()
+        font.flavor = 'woff2'
+        font.save(buffer)
+        return buffer.getvalue(), covered
+
+    def write_file(self, name, data):
+        """Write data to the output directory; return its static path"""
+        path = self.output_dir / name
+        path.write_bytes(data)
+        self.written.append(path.name)
+        static_root = Path(settings.STATICFILES_DIRS[0])
+        try:
+            return path.relative_to(static_root).as_posix()
+        except ValueError:
+            return path.name
+
+    def remove_stale_files(self):
+        keep = set(self.written) | {BUNDLE_MANIFEST}
+        for path in self.output_dir.iterdir():
+            if path.is_file() and path.name not in keep and path.suffix in ('.css', '.woff2'):
+                path.unlink()
+
+
+def webfont_weights():
+    """{family: (lightest, boldest)} requested by GOOGLE_FONTS_URL"""
+    weights = {}
+    for family, values in GOOGLE_FAMILY_RE.findall(GOOGLE_FONTS_URL):
+        values = [int(value) for value in values.split(';')]
+        weights[family.replace('+', ' ')] = (min(values), max(values))
+    return weights
+
+
+def webfont_axis_limits(data, weights):
+    """Instancer limits keeping weights of a variable font and pinning other axes"""
+    from fontTools.ttLib import TTFont
+
+    font = TTFont(io.BytesIO(data), lazy=True)
+    if 'fvar' not in font:
+        return None
+    limits = {}
+    for axis in font['fvar'].axes:
+        if axis.axisTag == 'wght':
+            limits['wght'] = (max(weights[0], axis.minValue), min(weights[1], axis.maxValue))
+        else:
+            limits[axis.axisTag] = None
+    return limits if 'wght' in limits else None
+
+
+def unicode_range(codepoints):
+    """Compress codepoints into a CSS unicode-range value"""
+    ranges = []
+    for cp in sorted(codepoints):
+        if ranges and cp == ranges[-1][1] + 1:
+            ranges[-1][1] = cp
+        else:
+            ranges.append([cp, cp])
+    return ','.join(
+        f'U+{a:X}' if a == b else f'U+{a:X}-{b:X}' for a, b in ranges
+    )
@@ -0,0 +1,21 @@
+"""
+Release bed holds that were neither confirmed nor released in time
+Run: python manage.py expire_bed_holds
+
+Schedule it every minute. Lapsed holds already count as free in snapshots,
+but until they are cleared /api/beds/ deltas keep re-sending their
+hospitals and the full snapshot can't be cached for long.
+"""
+from django.core.management.base import BaseCommand
+
+from core import beds
+
+
+class Command(BaseCommand):
+    help = 'Clear lapsed bed holds and log the change for /api/beds/ pollers'
+
+    def handle(self, *args, **options):
+        hospitals = beds.expire_holds()
+        self.stdout.write(self.style.SUCCESS(
+            f'Released lapsed holds at {hospitals} hospital(s).'
+        ))
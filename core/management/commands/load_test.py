@@ -0,0 +1,179 @@
+"""
+Simulate a clinic day against a running server and report latencies
+Run: python manage.py load_test [--url http://127.0.0.1:8000] [--workers 4] [--users 40] [--duration 60]
+
+Start the server first (manage.py runserver, or gunicorn/uWSGI on
+localhost) using the same database as this command. Throwaway patient and
+doctor accounts are created with appointments and consultations for today.
+Their virtual users then run the --mix of actions from --workers processes
+for --duration seconds. The accounts and everything they created are
+deleted afterwards unless --keep is given. Prescription QR images written
+during the run stay in MEDIA_ROOT/qr_codes/.
+"""
+import datetime
+import os
+import secrets
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.utils import timezone
+
+from core import loadtest, search
+from core.models import (
+    Appointment, Consultation, DirectoryVersion, DoctorProfile, DoctorStats, PatientProfile,
+)
+from core.signals import DIRECTORY_ALL
+
+
+class Command(BaseCommand):
+    help = 'Run a multi-process patient/doctor workload against a server and report p50/p95/p99'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000', help='Server to load')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Load generator processes')
+        parser.add_argument('--users', type=int, default=40, help='Virtual users in total')
+        parser.add_argument('--doctors', type=int, help='How many of the users are doctors (default: one in five)')
+        parser.add_argument('--duration', type=float, default=60, help='Seconds to run')
+        parser.add_argument('--think', type=float, default=1.0, help='Mean pause between actions, in seconds')
+        parser.add_argument(
+            '--mix', default=','.join(f'{name}={weight}' for name, weight in loadtest.DEFAULT_MIX.items()),
+            help='Comma-separated action=weight pairs (actions: %s)' % ', '.join(loadtest.ACTIONS),
+        )
+        parser.add_argument('--keep', action='store_true', help='Keep the test accounts and their data')
+
+    def handle(self, *args, **options):
+        mix = self.parse_mix(options['mix'])
+        users = options['users']
+        doctors = options['doctors'] if options['doctors'] is not None else max(1, users // 5)
+        if not 1 <= doctors <= users - doctors:
+            raise CommandError('--doctors must be at least 1 and no more than the number of patients')
+        if options['workers'] < 1 or options['duration'] <= 0:
+            raise CommandError('--workers and --duration must be positive')
+
+        prefix = f'loadtest-{secrets.token_hex(3)}-'
+        password = secrets.token_urlsafe(12)
+        try:
+            accounts = self.seed(prefix, password, users - doctors, doctors)
+            workers = min(options['workers'], len(accounts))
+            jobs = [{
+                'base_url': options['url'],
+                'accounts': accounts[n::workers],
+                'mix': mix,
+                'duration': options['duration'],
+                'think_time': options['think'],
+            } for n in range(workers)]
+
+            self.stdout.write(
+                f'{users - doctors} patients and {doctors} doctors on {workers} process(es) '
+                f'for {options["duration"]:g}s against {options["url"]}...'
+            )
+            # Workers only speak HTTP; don't hand them this process's connection
+            connections.close_all()
+            started = time.perf_counter()
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                samples = [sample for result in pool.map(loadtest.run_worker, jobs) for sample in result]
+            elapsed = time.perf_counter() - started
+        finally:
+            if not options['keep']:
+                User.objects.filter(username__startswith=prefix).delete()
+
+        self.report(loadtest.summarize(samples, elapsed))
+        if options['keep']:
+            self.stdout.write(f'Test accounts kept: {prefix}* (password {password})')
+
+    def parse_mix(self, value):
+        mix = {}
+        for pair in value.split(','):
+            name, _, weight = pair.partition('=')
+            name = name.strip()
+            if name not in loadtest.ACTIONS:
+                raise CommandError(f'Unknown action {name!r} in --mix')
+            try:
+                mix[name] = float(weight)
+            except ValueError:
+                raise CommandError(f'--mix weight for {name} must be a number')
+        return {name: weight for name, weight in mix.items() if weight > 0}
+
+    def seed(self, prefix, password, patient_count, doctor_count):
+        """Create the test accounts and return one dict per virtual user"""
+        encoded = make_password(password)
+        User.objects.bulk_create(
+            [User(username=f'{prefix}doctor-{n}', password=encoded) for n in range(doctor_count)]
+            + [User(username=f'{prefix}patient-{n}', password=encoded) for n in range(patient_count)]
+        )
+        user_ids = dict(User.objects.filter(username__startswith=prefix).values_list('username', 'id'))
+
+        DoctorProfile.objects.bulk_create([
+            DoctorProfile(
+                user_id=user_ids[f'{prefix}doctor-{n}'], full_name=f'Load Test Doctor {n}',
+                specialization='general', qualification='MBBS', license_number=f'{prefix}{n}',
+                phone='0000000000', is_verified=True, is_available=True,
+            )
+            for n in range(doctor_count)
+        ])
+        PatientProfile.objects.bulk_create([
+            PatientProfile(
+                user_id=user_ids[f'{prefix}patient-{n}'], full_name=f'Load Test Patient {n}',
+                phone='0000000000', address='Load test',
+            )
+            for n in range(patient_count)
+        ])
+        doctors = list(
+            DoctorProfile.objects.filter(user__username__startswith=prefix).select_related('user').order_by('id')
+        )
+        patients = list(
+            PatientProfile.objects.filter(user__username__startswith=prefix).select_related('user').order_by('id')
+        )
+
+        # bulk_create skips post_save, so do what the DoctorProfile handlers
+        # would. The stats rows must exist before the appointments below,
+        # or their counters are skipped and each doctor's first dashboard
+        # load rebuilds them inside a measured request.
+        DoctorStats.objects.bulk_create([DoctorStats(doctor=doctor) for doctor in doctors])
+        DirectoryVersion.bump(DIRECTORY_ALL, *{doctor.specialization for doctor in doctors})
+        for doctor in doctors:
+            search.index_instance(doctor)
+
+        # Each patient is in today's queue of one doctor, with a consultation
+        # to chat in; created one by one so the usual signals run
+        today = timezone.localdate()
+        consultation_ids, appointment_ids = {}, {doctor.id: [] for doctor in doctors}
+        for n, patient in enumerate(patients):
+            doctor = doctors[n % len(doctors)]
+            appointment = Appointment.objects.create(
+                patient=patient, doctor=doctor, status='confirmed', scheduled_date=today,
+                scheduled_time=datetime.time(9 + (n // 4) % 8, (n % 4) * 15),
+                symptoms='Load test',
+            )
+            consultation_ids[patient.id] = Consultation.objects.create(appointment=appointment).id
+            appointment_ids[doctor.id].append(appointment.id)
+
+        doctor_ids = [doctor.id for doctor in doctors]
+        return [
+            {
+                'role': 'doctor', 'username': doctor.user.username, 'password': password,
+                'appointment_ids': appointment_ids[doctor.id],
+            }
+            for doctor in doctors
+        ] + [
+            {
+                'role': 'patient', 'username': patient.user.username, 'password': password,
+                'doctor_ids': doctor_ids, 'consultation_ids': [consultation_ids[patient.id]],
+            }
+            for patient in patients
+        ]
+
+    def report(self, rows):
+        header = f'{"endpoint":<28} {"requests":>8} {"errors":>6} {"req/s":>7} {"p50":>8} {"p95":>8} {"p99":>8} {"max":>8}'
+        self.stdout.write(header)
+        self.stdout.write('-' * len(header))
+        for row in rows:
+            line = (
+                f'{row["endpoint"]:<28} {row["requests"]:>8} {row["errors"]:>6} {row["rps"]:>7.1f} '
+                f'{row["p50"]:>6.0f}ms {row["p95"]:>6.0f}ms {row["p99"]:>6.0f}ms {row["max"]:>6.0f}ms'
+            )
+            self.stdout.write(self.style.ERROR(line) if row['errors'] else line)
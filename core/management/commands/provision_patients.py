@@ -0,0 +1,88 @@
+"""
+Create patient accounts in bulk from a CSV file
+Run: python manage.py provision_patients patients.csv [--workers 4] [--credentials out.csv] [--dry-run]
+
+The CSV needs a header row with username, email, full_name, phone and
+address columns; password, date_of_birth (YYYY-MM-DD), blood_group and
+emergency_contact are optional. Rows without a password get a generated
+one, written to the --credentials file so it can be handed to the patient;
+passwords supplied in the CSV are not copied there. The credentials file
+must not exist yet and is created (readable by its owner only) before any
+account is. Nothing is created if any row is invalid.
+"""
+import csv
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core import provisioning
+
+
+class Command(BaseCommand):
+    help = 'Create User and PatientProfile rows from a CSV, hashing passwords in parallel'
+
+    def add_arguments(self, parser):
+        parser.add_argument('csv_file', help='Patient list (UTF-8 CSV with a header row)')
+        parser.add_argument('--workers', type=int, help='Password hashing processes (default: one per CPU)')
+        parser.add_argument('--credentials', help='Write username,password for every generated password here (new file)')
+        parser.add_argument('--dry-run', action='store_true', help='Only validate the file')
+
+    def handle(self, *args, **options):
+        if options['workers'] is not None and options['workers'] < 1:
+            raise CommandError('--workers must be positive')
+        try:
+            with open(options['csv_file'], newline='', encoding='utf-8-sig') as f:
+                rows = list(csv.DictReader(f))
+        except OSError as exc:
+            raise CommandError(f'Cannot read {options["csv_file"]}: {exc}')
+
+        blank_passwords = sum(1 for row in rows if not (row.get('password') or '').strip())
+        if blank_passwords and not options['credentials'] and not options['dry_run']:
+            raise CommandError(
+                f'{blank_passwords} row(s) have no password; pass --credentials to save the generated ones'
+            )
+
+        accounts, errors = provisioning.validate_rows(rows)
+        for number, message in errors:
+            # Header is line 1, so data row N is on line N + 1
+            self.stderr.write(f'  line {number + 1}: {message}')
+        if errors:
+            raise CommandError(f'{len(errors)} of {len(rows)} row(s) are invalid; nothing was created')
+        if options['dry_run']:
+            self.stdout.write(self.style.SUCCESS(f'{len(accounts)} row(s) are valid.'))
+            return
+
+        # Create the file first: accounts whose generated password could not
+        # be saved would be unusable
+        credentials = self.open_credentials(options['credentials']) if options['credentials'] else None
+        try:
+            started = time.perf_counter()
+            created = provisioning.provision_patients(accounts, options['workers'])
+            elapsed = time.perf_counter() - started
+        except BaseException:
+            if credentials:
+                credentials.close()
+                os.unlink(options['credentials'])
+            raise
+
+        if credentials:
+            with credentials:
+                writer = csv.writer(credentials)
+                writer.writerow(['username', 'password'])
+                writer.writerows(
+                    (account['username'], account['password']) for account in accounts if account['generated']
+                )
+        self.stdout.write(self.style.SUCCESS(
+            f'Created {created} patient account(s) in {elapsed:.1f}s '
+            f'({created / elapsed if elapsed else created:.0f}/s).'
+        ))
+
+    def open_credentials(self, path):
+        try:
+            fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        except FileExistsError:
+            raise CommandError(f'{path} already exists; choose a new credentials file')
+        except OSError as exc:
+            raise CommandError(f'Cannot create {path}: {exc}')
+        return os.fdopen(fd, 'w', newline='', encoding='utf-8')
@@ -0,0 +1,25 @@
+"""
+Rebuild the full-text search index from the database
+Run: python manage.py rebuild_search_index [--kind doctor|hospital|record]
+"""
+from django.core.management.base import BaseCommand
+
+from core import search
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text search index for doctors, hospitals and medical records'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--kind', action='append', choices=sorted(search.KIND_MODELS),
+            help='Only rebuild this kind (may be repeated)',
+        )
+
+    def handle(self, *args, **options):
+        if not search.uses_fts5():
+            self.stdout.write('This database searches the tables directly; nothing to rebuild.')
+            return
+        search.create_index()
+        count = search.rebuild_index(options['kind'])
+        self.stdout.write(self.style.SUCCESS(f'Indexed {count} objects.'))
@@ -0,0 +1,53 @@
+"""
+Recompute materialized doctor dashboard counters and fix any drift
+Run: python manage.py reconcile_doctor_stats [--doctor ID] [--dry-run]
+"""
+from django.core.management.base import BaseCommand
+
+from core.models import DoctorProfile, DoctorStats
+
+
+class Command(BaseCommand):
+    help = 'Recompute DoctorStats from appointments and consultations, correcting drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--doctor', type=int, action='append',
+            help='Only reconcile this doctor profile id (may be repeated)',
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true', help='Report drift without writing',
+        )
+
+    def handle(self, *args, **options):
+        doctor_ids = options['doctor'] or DoctorProfile.objects.values_list('id', flat=True)
+        existing = {
+            stats.doctor_id: stats
+            for stats in DoctorStats.objects.filter(doctor_id__in=doctor_ids)
+        }
+
+        checked = corrected = created = 0
+        for doctor_id in doctor_ids:
+            checked += 1
+            expected = DoctorStats.compute(doctor_id)
+            stats = existing.get(doctor_id)
+            if stats is None:
+                created += 1
+            else:
+                drift = {
+                    field: (getattr(stats, field), value)
+                    for field, value in expected.items()
+                    if getattr(stats, field) != value
+                }
+                if not drift:
+                    continue
+                details = ', '.join(f'{field} {old} -> {new}' for field, (old, new) in drift.items())
+                self.stdout.write(f'Doctor {doctor_id}: {details}')
+                corrected += 1
+            if not options['dry_run']:
+                DoctorStats.objects.update_or_create(doctor_id=doctor_id, defaults=expected)
+
+        verb = 'to correct' if options['dry_run'] else 'corrected'
+        self.stdout.write(self.style.SUCCESS(
+            f'Checked {checked} doctors: {corrected} {verb}, {created} without stats yet.'
+        ))
@@ -0,0 +1,61 @@
+"""
+Move existing uploads into content-addressed storage and build thumbnails
+Run: python manage.py store_attachments [--dry-run]
+
+Files uploaded before the attachment storage was introduced keep their
+original names. This re-stores each one under its SHA-256 (merging
+duplicates), points the row at the new name and writes missing WebP
+thumbnails. Original files are left in place; delete them once the new
+names have been checked.
+"""
+from django.core.management.base import BaseCommand
+
+from core.models import DoctorProfile, Hospital, MedicalRecord, PatientProfile
+from core.storage import content_digest
+from core.utils import thumbnails
+
+FIELDS = [
+    (MedicalRecord, 'attachments'),
+    (PatientProfile, 'profile_image'),
+    (DoctorProfile, 'profile_image'),
+    (Hospital, 'image'),
+]
+
+
+class Command(BaseCommand):
+    help = 'Re-store uploads under their content hash and generate thumbnails'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Only report what would change')
+
+    def handle(self, *args, **options):
+        moved = thumbnailed = missing = 0
+        for model, field_name in FIELDS:
+            storage = model._meta.get_field(field_name).storage
+            rows = model.objects.exclude(**{field_name: ''}).exclude(**{f'{field_name}__isnull': True})
+            for pk, name in rows.values_list('pk', field_name).iterator():
+                if not storage.exists(name):
+                    missing += 1
+                    self.stderr.write(f'  {model.__name__} {pk}: {name} is missing')
+                    continue
+
+                if content_digest(name) is None:
+                    moved += 1
+                    if options['dry_run']:
+                        continue
+                    with storage.open(name) as f:
+                        new_name = storage.save(name, f)
+                    model.objects.filter(pk=pk).update(**{field_name: new_name})
+                    name = new_name
+
+                digest = content_digest(name)
+                if options['dry_run'] or digest is None or not thumbnails.is_image(name):
+                    continue
+                thumbnail = thumbnails.thumbnail_name(name, digest)
+                if not storage.exists(thumbnail):
+                    thumbnailed += thumbnails.generate(storage.path(name), storage.path(thumbnail))
+
+        verb = 'would be moved' if options['dry_run'] else 'moved'
+        self.stdout.write(self.style.SUCCESS(
+            f'{moved} file(s) {verb}, {thumbnailed} thumbnail(s) written, {missing} missing.'
+        ))
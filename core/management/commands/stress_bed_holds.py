@@ -0,0 +1,79 @@
+"""
+Check that concurrent bed claims never hand out the same bed twice
+Run: python manage.py stress_bed_holds [--claimers 48] [--beds 10]
+
+Creates a throwaway hospital, lets every claimer call claim_bed() at the
+same moment from its own thread and database connection, verifies the
+result and deletes the hospital again.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from core import beds
+from core.models import Bed, Hospital
+
+
+class Command(BaseCommand):
+    help = 'Claim beds from many threads at once and check no bed is held twice'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--claimers', type=int, default=48, help='Concurrent claimers')
+        parser.add_argument('--beds', type=int, default=10, help='Free beds in the test ward')
+
+    def handle(self, *args, **options):
+        claimers, bed_count = options['claimers'], options['beds']
+        if claimers < 1 or bed_count < 1:
+            raise CommandError('--claimers and --beds must be positive')
+
+        hospital = Hospital.objects.create(
+            name='Bed hold stress test', address='-', phone='-',
+            email='stress@example.com', is_active=False,
+        )
+        try:
+            Bed.objects.bulk_create([
+                Bed(hospital=hospital, bed_number=str(n), ward_type='icu')
+                for n in range(bed_count)
+            ])
+            claimed, errors = self.run_claimers(hospital.id, claimers)
+        finally:
+            hospital.delete()
+
+        expected = min(claimers, bed_count)
+        self.stdout.write(
+            f'{claimers} claimers, {bed_count} beds: {len(claimed)} holds, '
+            f'{len(set(claimed))} distinct beds, {len(errors)} errors'
+        )
+        for error in errors[:5]:
+            self.stderr.write(f'  {error!r}')
+        if len(set(claimed)) != len(claimed):
+            raise CommandError('The same bed was held more than once')
+        if len(claimed) != expected or errors:
+            raise CommandError(f'Expected {expected} holds')
+        self.stdout.write(self.style.SUCCESS('No bed was held twice.'))
+
+    def run_claimers(self, hospital_id, claimers):
+        start = threading.Barrier(claimers)
+
+        def claim(_):
+            try:
+                start.wait()
+                bed = beds.claim_bed(hospital_id, 'icu', minutes=1)
+                return bed.id if bed else None
+            finally:
+                connection.close()
+
+        claimed, errors = [], []
+        with ThreadPoolExecutor(max_workers=claimers) as pool:
+            futures = [pool.submit(claim, n) for n in range(claimers)]
+            for future in futures:
+                try:
+                    bed_id = future.result()
+                except Exception as exc:
+                    errors.append(exc)
+                else:
+                    if bed_id is not None:
+                        claimed.append(bed_id)
+        return claimed, errors
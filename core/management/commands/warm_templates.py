@@ -0,0 +1,102 @@
+"""
+Compile every project template, optionally benchmarking the cached loader
+Run: python manage.py warm_templates [--benchmark] [--iterations 50]
+
+Without options this checks that every template in templates/ compiles
+(exit status 1 if one doesn't), which makes a quick deploy check. Web
+workers warm themselves at startup when TEMPLATE_WARMUP is on; see
+telemedicine/wsgi.py.
+
+--benchmark renders each template with an empty request context, once
+through loaders that re-read and re-parse the file every time and once
+through the cached loader, and prints the average time per render.
+Templates that need their view's context to render are timed on loading
+alone (marked *).
+"""
+import time
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand, CommandError
+from django.template import Engine, RequestContext
+from django.test import RequestFactory
+
+from core.utils import templates
+
+UNCACHED_LOADERS = [
+    'django.template.loaders.filesystem.Loader',
+    'django.template.loaders.app_directories.Loader',
+]
+
+
+class Command(BaseCommand):
+    help = 'Compile all templates into the cached loader and optionally benchmark rendering'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--benchmark', action='store_true', help='Time uncached vs cached renders')
+        parser.add_argument('--iterations', type=int, default=50, help='Renders per template when benchmarking')
+
+    def handle(self, *args, **options):
+        engine = templates.django_engine()
+        started = time.perf_counter()
+        loaded, errors = templates.warm_templates(engine)
+        elapsed = (time.perf_counter() - started) * 1000
+        for name, exc in errors:
+            self.stderr.write(f'  {name}: {exc}')
+        if errors:
+            raise CommandError(f'{len(errors)} template(s) failed to compile')
+        self.stdout.write(self.style.SUCCESS(f'Compiled {loaded} template(s) in {elapsed:.0f}ms.'))
+
+        if options['benchmark']:
+            if options['iterations'] < 1:
+                raise CommandError('--iterations must be positive')
+            self.benchmark(engine, options['iterations'])
+
+    def benchmark(self, engine, iterations):
+        uncached = Engine(
+            dirs=engine.dirs, app_dirs=False, loaders=UNCACHED_LOADERS,
+            context_processors=engine.context_processors, debug=engine.debug,
+            libraries=engine.libraries,
+        )
+        request = RequestFactory().get('/')
+        request.user = AnonymousUser()
+        request.role = request.profile_id = None
+
+        header = f'{"template":<36} {"uncached":>10} {"cached":>10} {"speedup":>8}'
+        self.stdout.write(header)
+        self.stdout.write('-' * len(header))
+        total_uncached = total_cached = 0.0
+        for name in templates.template_names(engine):
+            renders = self.renders(engine, name, request)
+            cold = self.time_per_call(lambda: self.load_and_render(uncached, name, request, renders), iterations)
+            warm = self.time_per_call(lambda: self.load_and_render(engine, name, request, renders), iterations)
+            total_uncached += cold
+            total_cached += warm
+            marker = '' if renders else '*'
+            self.stdout.write(
+                f'{name + marker:<36} {cold:>8.2f}ms {warm:>8.2f}ms {cold / warm if warm else 0:>7.1f}x'
+            )
+        self.stdout.write('-' * len(header))
+        self.stdout.write(
+            f'{"total":<36} {total_uncached:>8.2f}ms {total_cached:>8.2f}ms '
+            f'{total_uncached / total_cached if total_cached else 0:>7.1f}x'
+        )
+        self.stdout.write('* loading only: the template needs its view context to render')
+
+    def renders(self, engine, name, request):
+        """Whether the template renders with an empty request context"""
+        try:
+            self.load_and_render(engine, name, request, True)
+        except Exception:
+            return False
+        return True
+
+    def load_and_render(self, engine, name, request, render):
+        template = engine.get_template(name)
+        if render:
+            template.render(RequestContext(request))
+
+    def time_per_call(self, fn, iterations):
+        started = time.perf_counter()
+        for _ in range(iterations):
+            fn()
+        return (time.perf_counter() - started) * 1000 / iterations
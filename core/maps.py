@@ -0,0 +1,161 @@
+"""
+Viewport marker batches for the hospital and mobile clinic maps
+
+Markers are fetched for a bounding box and zoom level instead of being
+embedded in the page. Below CLUSTER_MAX_ZOOM nearby points are grouped on a
+fixed latitude/longitude grid in the database (GROUP BY cell), so the
+response size depends on the viewport, not on the number of facilities.
+Rows are array-encoded: field names are sent once per response.
+"""
+import math
+
+from django.db.models import Avg, Count, F, Min, Q, Value
+from django.db.models.functions import Floor
+from django.utils import timezone
+
+from .models import Hospital, MobileClinic
+
+
+# At this zoom and closer every point is sent individually
+CLUSTER_MAX_ZOOM = 12
+MAX_ZOOM = 21
+
+# Grid cells per 256px map tile width (i.e. one cell per 64px)
+CLUSTER_CELLS_PER_TILE = 4
+
+# Upper bound on individual markers in one response
+MAX_MARKERS = 500
+
+# Decimal places kept for coordinates (~1m)
+COORD_PRECISION = 5
+
+MARKER_FIELDS = {
+    'hospital': ('id', 'lat', 'lng', 'name'),
+    'clinic': ('id', 'lat', 'lng', 'name', 'date'),
+}
+CLUSTER_FIELDS = ('lat', 'lng', 'count')
+
+
+def marker_queryset(kind):
+    """Active, mappable objects of one kind"""
+    if kind == 'hospital':
+        queryset = Hospital.objects.filter(is_active=True)
+    elif kind == 'clinic':
+        queryset = MobileClinic.objects.filter(
+            is_active=True, scheduled_date__gte=timezone.now().date()
+        )
+    else:
+        raise ValueError('Unknown marker kind')
+    # 0,0 is the model default for "location not set"
+    return queryset.exclude(latitude=0.0, longitude=0.0)
+
+
+def cell_size(zoom):
+    """Width in degrees of one clustering cell at a zoom level"""
+    return 360.0 / (2 ** zoom * CLUSTER_CELLS_PER_TILE)
+
+
+def parse_viewport(params):
+    """
+    Validate viewport query parameters
+
+    Args:
+        params: QueryDict with bbox=west,south,east,north and zoom
+
+    Returns:
+        (bbox, zoom) with the bbox snapped outwards to the cluster grid,
+        so nearby viewports share cache entries. Raises ValueError.
+    """
+    west, south, east, north = (float(v) for v in params['bbox'].split(','))
+    zoom = int(params.get('zoom', CLUSTER_MAX_ZOOM))
+    if not 0 <= zoom <= MAX_ZOOM:
+        raise ValueError('Zoom out of range')
+    if not (-90 <= south <= north <= 90 and -180 <= west <= 180 and -180 <= east <= 180):
+        raise ValueError('Invalid bounding box')
+
+    size = cell_size(min(zoom, CLUSTER_MAX_ZOOM))
+    bbox = (
+        _snap(west, size, math.floor), max(-90.0, _snap(south, size, math.floor)),
+        _snap(east, size, math.ceil), min(90.0, _snap(north, size, math.ceil)),
+    )
+    return bbox, zoom
+
+
+def _snap(value, size, rounding):
+    return round(max(-180.0, min(180.0, rounding(value / size) * size)), 6)
+
+
+def _within(queryset, bbox):
+    west, south, east, north = bbox
+    queryset = queryset.filter(latitude__gte=south, latitude__lte=north)
+    if west <= east:
+        return queryset.filter(longitude__gte=west, longitude__lte=east)
+    # Viewport crosses the antimeridian
+    return queryset.filter(Q(longitude__gte=west) | Q(longitude__lte=east))
+
+
+def _round(value):
+    return round(value, COORD_PRECISION)
+
+
+def _marker_rows(kind, queryset):
+    if kind == 'hospital':
+        rows = queryset.values_list('id', 'latitude', 'longitude', 'name')
+        return [[pk, _round(lat), _round(lng), name] for pk, lat, lng, name in rows]
+    rows = queryset.values_list('id', 'latitude', 'longitude', 'name', 'scheduled_date')
+    return [
+        [pk, _round(lat), _round(lng), name, day.isoformat()]
+        for pk, lat, lng, name, day in rows
+    ]
+
+
+def markers_in_viewport(kind, bbox, zoom, queryset=None):
+    """
+    Build the marker batch for one viewport
+
+    Args:
+        kind: 'hospital' or 'clinic'
+        bbox: (west, south, east, north) in degrees
+        zoom: Map zoom level
+        queryset: Optional pre-filtered queryset of the kind's model
+
+    Returns:
+        Dict with array-encoded 'markers' and 'clusters' plus their field names
+    """
+    if queryset is None:
+        queryset = marker_queryset(kind)
+    # order_by() drops Meta.ordering so it doesn't leak into GROUP BY
+    queryset = _within(queryset, bbox).order_by()
+
+    singles = queryset
+    clusters = []
+    if zoom < CLUSTER_MAX_ZOOM:
+        size = cell_size(zoom)
+        cells = queryset.annotate(
+            cell_x=Floor(F('longitude') / Value(size)),
+            cell_y=Floor(F('latitude') / Value(size)),
+        ).values('cell_x', 'cell_y').annotate(
+            count=Count('id'),
+            lat=Avg('latitude'),
+            lng=Avg('longitude'),
+            first_id=Min('id'),
+        )
+        single_ids = []
+        for cell in cells:
+            if cell['count'] == 1:
+                single_ids.append(cell['first_id'])
+            else:
+                clusters.append([_round(cell['lat']), _round(cell['lng']), cell['count']])
+        singles = queryset.filter(id__in=single_ids[:MAX_MARKERS + 1])
+
+    rows = _marker_rows(kind, singles.order_by('id')[:MAX_MARKERS + 1])
+    return {
+        'kind': kind,
+        'zoom': zoom,
+        'bbox': list(bbox),
+        'fields': MARKER_FIELDS[kind],
+        'markers': rows[:MAX_MARKERS],
+        'cluster_fields': CLUSTER_FIELDS,
+        'clusters': clusters,
+        'truncated': len(rows) > MAX_MARKERS,
+    }
@@ -0,0 +1,307 @@
+"""
+Middleware for Telemedicine Platform
+"""
+import contextlib
+import math
+import os
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.cache.backends.redis import RedisCache
+from django.http import Http404, JsonResponse
+from django.utils.cache import patch_vary_headers
+from django.utils.functional import SimpleLazyObject
+
+from .models import DoctorProfile, PatientProfile
+from .utils import compression, profiler
+
+try:
+    import fcntl
+except ImportError:  # Windows: the file cache is then only locked per process
+    fcntl = None
+
+
+# Token bucket in its GCRA form: the key holds the bucket's "theoretical
+# arrival time" (when it would be full again). Redis' own clock is used, so
+# web hosts with skewed clocks still share one bucket. Returns
+# {allowed, seconds_to_wait}; numbers go back as strings to keep fractions.
+TOKEN_BUCKET_LUA = """
+redis.replicate_commands()
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local interval, capacity = tonumber(ARGV[1]), tonumber(ARGV[2])
+local tat = math.max(tonumber(redis.call('GET', KEYS[1])) or now, now)
+local next_tat = tat + interval
+if next_tat - now > capacity then
+    return {0, tostring(next_tat - capacity - now)}
+end
+redis.call('SET', KEYS[1], tostring(next_tat), 'PX', math.ceil((next_tat - now) * 1000))
+return {1, '0'}
+"""
+
+
+class RateLimitMiddleware:
+    """
+    Token bucket rate limiting for the public JSON APIs
+
+    Buckets are keyed by user id (or client IP for anonymous users) and URL
+    name, and stored in the cache named by RATE_LIMIT_CACHE. Limits are
+    configured per URL name in RATE_LIMITS as (requests_per_second, burst):
+    a bucket holds `burst` tokens and refills at `requests_per_second`, so
+    a client can burst briefly but never exceed the rate over time.
+
+    Each bucket is a single timestamp (GCRA), updated atomically: by a Lua
+    script on Redis, under a lock file shared by the workers of one machine
+    on the file cache, and under a process lock on the per-process locmem
+    cache.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.limits = getattr(settings, 'RATE_LIMITS', {})
+        self.cache_alias = getattr(settings, 'RATE_LIMIT_CACHE', 'default')
+        self.trust_forwarded = getattr(settings, 'RATE_LIMIT_TRUST_FORWARDED', False)
+        self.lock = threading.Lock()
+
+    def __call__(self, request):
+        return self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        url_name = request.resolver_match.url_name if request.resolver_match else None
+        if url_name not in self.limits:
+            return None
+
+        rate, burst = self.limits[url_name]
+        key = f'ratelimit:{url_name}:{self.get_client_key(request)}'
+        allowed, retry_after = self.consume(key, rate, burst)
+        if allowed:
+            return None
+
+        response = JsonResponse(
+            {'error': 'Too many requests. Please slow down.'}, status=429
+        )
+        response['Retry-After'] = str(max(1, int(retry_after + 0.999)))
+        return response
+
+    def get_client_key(self, request):
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_authenticated:
+            return f'user:{user.pk}'
+        ip = request.META.get('REMOTE_ADDR', '')
+        if self.trust_forwarded:
+            forwarded = request.META.get('HTTP_X_FORWARDED_FOR', '')
+            if forwarded:
+                ip = forwarded.split(',')[0].strip()
+        return f'ip:{ip}'
+
+    def consume(self, key, rate, burst):
+        """Take one token from a bucket; return (allowed, seconds_until_a_token_is_free)"""
+        cache = caches[self.cache_alias]
+        interval = 1 / rate
+        # Time for an empty bucket to refill; one token is spent per request
+        capacity = burst * interval
+        if isinstance(cache, RedisCache):
+            return self.consume_redis(cache, key, interval, capacity)
+
+        with self.locked(cache):
+            # Wall-clock time, so every worker agrees on the bucket's state
+            now = time.time()
+            tat = max(cache.get(key, now), now)
+            next_tat = tat + interval
+            if next_tat - now > capacity:
+                return False, next_tat - capacity - now
+            cache.set(key, next_tat, timeout=math.ceil(next_tat - now))
+        return True, 0
+
+    def consume_redis(self, cache, key, interval, capacity):
+        key = cache.make_and_validate_key(key)
+        client = cache._cache.get_client(key, write=True)
+        allowed, retry_after = client.register_script(TOKEN_BUCKET_LUA)(
+            keys=[key], args=[interval, capacity]
+        )
+        return bool(allowed), float(retry_after)
+
+    @contextlib.contextmanager
+    def locked(self, cache):
+        """Serialize bucket updates between threads, and between processes on the file cache"""
+        with self.lock:
+            if fcntl is None or not isinstance(cache, FileBasedCache):
+                yield
+                return
+            os.makedirs(cache._dir, exist_ok=True)
+            with open(os.path.join(cache._dir, 'ratelimit.lock'), 'a') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+ROLE_MODELS = {'doctor': DoctorProfile, 'patient': PatientProfile}
+
+
+class RoleMiddleware:
+    """
+    Resolve the signed-in user's role and profile once per session
+
+    Sets request.role ('doctor', 'patient' or None), request.profile_id and
+    request.profile, which is only loaded when a view uses it. The lookup is
+    one query, stored in the session next to the user id, so views check
+    request.role instead of querying each profile relation with hasattr().
+    Must come after AuthenticationMiddleware.
+    """
+
+    session_key = '_role'
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.role, request.profile_id = self.resolve(request)
+        request.profile = SimpleLazyObject(lambda: self.load_profile(request))
+        return self.get_response(request)
+
+    def resolve(self, request):
+        """Return (role, profile_id) for request.user, from the session when possible"""
+        user = request.user
+        if not user.is_authenticated:
+            return None, None
+
+        cached = request.session.get(self.session_key)
+        if cached and cached[0] == user.pk:
+            return cached[1], cached[2]
+
+        doctor_id, patient_id = User.objects.filter(pk=user.pk).values_list(
+            'doctor_profile__id', 'patient_profile__id'
+        ).first() or (None, None)
+        if doctor_id:
+            role, profile_id = 'doctor', doctor_id
+        elif patient_id:
+            role, profile_id = 'patient', patient_id
+        else:
+            # Not cached: a profile may still be added to this account
+            return None, None
+        request.session[self.session_key] = [user.pk, role, profile_id]
+        return role, profile_id
+
+    def load_profile(self, request):
+        if request.role is None:
+            return None
+        model = ROLE_MODELS[request.role]
+        try:
+            return model.objects.get(pk=request.profile_id)
+        except model.DoesNotExist:
+            # The profile was removed since it was cached
+            request.session.pop(self.session_key, None)
+            raise Http404('Profile not found')
+
+
+# Profiled requests of this process, read by core.views.profiling_report
+profile_store = profiler.ProfileStore()
+
+
+class ProfilingMiddleware:
+    """
+    Sampling profiler for the views in core.views
+
+    Profiles one in PROFILE_SAMPLE_EVERY requests (0 turns sampling off) and
+    every request from a staff user that sends the PROFILE_HEADER header
+    ("X-Profile: 1"). Profiled requests run the view under cProfile and a
+    stack sampler and are marked with an X-Profiled response header; the
+    totals are kept in memory per process. Only one request per process is
+    profiled at a time, so overhead stays bounded. Keep it last in
+    MIDDLEWARE so it wraps nothing but the view itself.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sample_every = getattr(settings, 'PROFILE_SAMPLE_EVERY', 0)
+        self.header = 'HTTP_' + getattr(settings, 'PROFILE_HEADER', 'X-Profile').upper().replace('-', '_')
+        self.modules = getattr(settings, 'PROFILE_VIEW_MODULES', ('core.views',))
+        self._busy = threading.Lock()
+
+    def __call__(self, request):
+        return self.get_response(request)
+
+    def should_profile(self, request, view_func):
+        if view_func.__module__ not in self.modules:
+            return False
+        if request.META.get(self.header) and request.user.is_staff:
+            return True
+        return self.sample_every > 0 and random.random() * self.sample_every < 1
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if not self.should_profile(request, view_func) or not self._busy.acquire(blocking=False):
+            return None
+        try:
+            response, profile, stacks = profiler.profile_call(view_func, request, *view_args, **view_kwargs)
+        finally:
+            self._busy.release()
+        profile_store.add(request.resolver_match.view_name, profile, stacks)
+        response['X-Profiled'] = '1'
+        return response
+
+
+class CompressionMiddleware:
+    """
+    Brotli or gzip compression for HTML, JSON and other text responses
+
+    Replaces django.middleware.gzip.GZipMiddleware. The coding follows the
+    client's Accept-Encoding (brotli preferred, see core.utils.compression).
+    Bodies shorter than COMPRESSION_MIN_SIZE are sent as they are, as are
+    media types that are already compressed, partial (206) responses,
+    responses that already carry a Content-Encoding (precompressed static
+    files) and responses marked Cache-Control: no-transform. Streaming
+    responses are compressed chunk by chunk as they are sent. Put it near
+    the top of MIDDLEWARE, above ConditionalGetMiddleware, so ETags are
+    computed from and 304s decided on the uncompressed body.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.min_size = getattr(settings, 'COMPRESSION_MIN_SIZE', 512)
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if not self.should_compress(response):
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        encoding = compression.choose_encoding(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if encoding is None:
+            return response
+
+        if response.streaming:
+            response.streaming_content = compression.compress_stream(response.streaming_content, encoding)
+            # The compressed size is only known once the stream is sent
+            del response.headers['Content-Length']
+        else:
+            content = compression.compress(response.content, encoding)
+            if len(content) >= len(response.content):
+                return response
+            response.content = content
+            response.headers['Content-Length'] = str(len(content))
+
+        # The body now differs byte for byte, so a strong ETag becomes weak
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        response.headers['Content-Encoding'] = encoding
+        return response
+
+    def should_compress(self, response):
+        if response.status_code == 206 or response.has_header('Content-Encoding'):
+            return False
+        if not compression.is_compressible(response.get('Content-Type', '')):
+            return False
+        if 'no-transform' in response.get('Cache-Control', '').lower():
+            return False
+        if response.streaming:
+            # Async iterators are left alone; the project is served by WSGI
+            return not response.is_async
+        return len(response.content) >= self.min_size
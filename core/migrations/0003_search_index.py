@@ -0,0 +1,61 @@
+from django.db import migrations
+
+
+# Frozen copies of the core.search DDL and rowid scheme: migrations must not
+# follow later edits to application code
+FTS_TABLE = 'core_search_index'
+KIND_CODES = {'doctor': 1, 'hospital': 2, 'record': 3}
+
+
+def index_document(conn, kind, object_id, title, body):
+    with conn.cursor() as cursor:
+        cursor.execute(
+            f'INSERT OR REPLACE INTO {FTS_TABLE} (rowid, kind, object_id, title, body) '
+            'VALUES (%s, %s, %s, %s, %s)',
+            [object_id * 4 + KIND_CODES[kind], kind, object_id, title, body],
+        )
+
+
+def create_search_index(apps, schema_editor):
+    conn = schema_editor.connection
+    if conn.vendor != 'sqlite':
+        return
+    with conn.cursor() as cursor:
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+            "kind UNINDEXED, object_id UNINDEXED, title, body, "
+            "tokenize='porter unicode61')"
+        )
+
+    # Historical models have no custom methods, so build documents by hand
+    DoctorProfile = apps.get_model('core', 'DoctorProfile')
+    Hospital = apps.get_model('core', 'Hospital')
+    MedicalRecord = apps.get_model('core', 'MedicalRecord')
+    specializations = dict(DoctorProfile._meta.get_field('specialization').choices)
+
+    for d in DoctorProfile.objects.iterator():
+        body = ' '.join([specializations.get(d.specialization, ''), d.qualification, d.bio])
+        index_document(conn, 'doctor', d.pk, d.full_name, body)
+    for h in Hospital.objects.iterator():
+        index_document(conn, 'hospital', h.pk, h.name, f'{h.address} {h.facilities}')
+    for r in MedicalRecord.objects.iterator():
+        index_document(conn, 'record', r.pk, r.diagnosis, r.treatment)
+
+
+def drop_search_index(apps, schema_editor):
+    conn = schema_editor.connection
+    if conn.vendor != 'sqlite':
+        return
+    with conn.cursor() as cursor:
+        cursor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_directory_version'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
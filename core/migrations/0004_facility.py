@@ -0,0 +1,76 @@
+import hashlib
+
+from django.db import migrations, models
+from django.utils.text import slugify
+
+
+def facility_slug(name):
+    # Frozen copy of core.models.facility_slug: migrations must not follow
+    # later edits to model code
+    name = ' '.join(name.split()).lower()
+    digest = hashlib.md5(name.encode(), usedforsecurity=False).hexdigest()[:8]
+    return slugify(name) or f'facility-{digest}'
+
+
+def parse_facilities(apps, schema_editor):
+    """Move the comma separated Hospital.facilities text into Facility rows"""
+    Hospital = apps.get_model('core', 'Hospital')
+    Facility = apps.get_model('core', 'Facility')
+    by_slug = {}
+    for hospital in Hospital.objects.exclude(facilities=''):
+        facility_ids = []
+        for name in hospital.facilities.split(','):
+            name = ' '.join(name.split())
+            if not name:
+                continue
+            slug = facility_slug(name)
+            facility = by_slug.get(slug)
+            if facility is None:
+                facility, _ = Facility.objects.get_or_create(slug=slug, defaults={'name': name})
+                by_slug[slug] = facility
+            facility_ids.append(facility.id)
+        hospital.facility_set.set(facility_ids)
+
+
+def join_facilities(apps, schema_editor):
+    Hospital = apps.get_model('core', 'Hospital')
+    for hospital in Hospital.objects.prefetch_related('facility_set'):
+        hospital.facilities = ', '.join(f.name for f in hospital.facility_set.all())
+        hospital.save(update_fields=['facilities'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Facility',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('slug', models.SlugField(max_length=100, unique=True)),
+            ],
+            options={
+                'verbose_name_plural': 'Facilities',
+                'ordering': ['name'],
+            },
+        ),
+        migrations.AddField(
+            model_name='hospital',
+            name='facility_set',
+            field=models.ManyToManyField(blank=True, related_name='hospitals', to='core.facility'),
+        ),
+        migrations.RunPython(parse_facilities, join_facilities),
+        migrations.RemoveField(
+            model_name='hospital',
+            name='facilities',
+        ),
+        migrations.RenameField(
+            model_name='hospital',
+            old_name='facility_set',
+            new_name='facilities',
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.30 on 2026-10-19 06:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_facility'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='hospital',
+            index=models.Index(fields=['latitude', 'longitude'], name='core_hospit_latitud_6fd6f4_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='mobileclinic',
+            index=models.Index(fields=['latitude', 'longitude'], name='core_mobile_latitud_d654e8_idx'),
+        ),
+    ]
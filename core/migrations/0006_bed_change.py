@@ -0,0 +1,21 @@
+# Generated by Django 4.2.30 on 2026-10-19 06:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_map_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BedChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hospital_id', models.PositiveBigIntegerField(db_index=True)),
+                ('changed_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 4.2.30 on 2026-10-19 06:22
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('core', '0006_bed_change'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bed',
+            name='held_by',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='bed_holds', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='bed',
+            name='held_until',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='bed',
+            name='hold_token',
+            field=models.UUIDField(blank=True, null=True, unique=True),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 4.2.30 on 2026-10-19 06:25
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_bed_holds'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DoctorStats',
+            fields=[
+                ('doctor', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='core.doctorprofile')),
+                ('pending_count', models.IntegerField(default=0)),
+                ('completed_count', models.IntegerField(default=0)),
+                ('patients_served', models.IntegerField(default=0)),
+                ('timed_consultations', models.IntegerField(default=0)),
+                ('consultation_seconds', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['doctor', 'status', 'patient'], name='core_appoin_doctor__113b5b_idx'),
+        ),
+    ]
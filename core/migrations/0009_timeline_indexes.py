@@ -0,0 +1,25 @@
+# Generated by Django 4.2.30 on 2026-10-19 06:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_doctor_stats'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['patient', 'scheduled_date', 'id'], name='core_appoin_patient_6175af_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='medicalrecord',
+            index=models.Index(fields=['patient', 'visit_date', 'id'], name='core_medica_patient_ce455c_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='prescription',
+            index=models.Index(fields=['patient', 'issue_date', 'id'], name='core_prescr_patient_e6235a_idx'),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 4.2.30 on 2026-10-19 06:35
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def link_existing_patients(apps, schema_editor):
+    """One DoctorPatient row per doctor/patient pair that shares an appointment"""
+    Appointment = apps.get_model('core', 'Appointment')
+    DoctorPatient = apps.get_model('core', 'DoctorPatient')
+    pairs = Appointment.objects.values_list('doctor_id', 'patient_id').distinct().order_by()
+    DoctorPatient.objects.bulk_create(
+        [DoctorPatient(doctor_id=doctor_id, patient_id=patient_id) for doctor_id, patient_id in pairs],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_timeline_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DoctorPatient',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('doctor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='patient_links', to='core.doctorprofile')),
+                ('patient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='doctor_links', to='core.patientprofile')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['doctor', 'id'], name='core_doctor_doctor__c0f907_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='doctorpatient',
+            constraint=models.UniqueConstraint(fields=('doctor', 'patient'), name='unique_doctor_patient'),
+        ),
+        migrations.RunPython(link_existing_patients, migrations.RunPython.noop),
+    ]
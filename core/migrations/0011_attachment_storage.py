@@ -0,0 +1,34 @@
+# Generated by Django 4.2.30 on 2026-10-19 06:39
+
+import core.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_doctor_patient'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='doctorprofile',
+            name='profile_image',
+            field=models.ImageField(blank=True, null=True, storage=core.storage.attachment_storage, upload_to='doctors/', validators=[core.storage.validate_upload_size]),
+        ),
+        migrations.AlterField(
+            model_name='hospital',
+            name='image',
+            field=models.ImageField(blank=True, null=True, storage=core.storage.attachment_storage, upload_to='hospitals/', validators=[core.storage.validate_upload_size]),
+        ),
+        migrations.AlterField(
+            model_name='medicalrecord',
+            name='attachments',
+            field=models.FileField(blank=True, null=True, storage=core.storage.attachment_storage, upload_to='records/', validators=[core.storage.validate_upload_size]),
+        ),
+        migrations.AlterField(
+            model_name='patientprofile',
+            name='profile_image',
+            field=models.ImageField(blank=True, null=True, storage=core.storage.attachment_storage, upload_to='patients/', validators=[core.storage.validate_upload_size]),
+        ),
+    ]
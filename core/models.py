@@ -2,11 +2,15 @@
 Models for Telemedicine Platform
 Includes: User Profiles, Appointments, Medical Records, Hospitals, Beds
 """
-from django.db import models
+from django.db import connection, models, transaction
 from django.contrib.auth.models import User
 from django.utils import timezone
+from django.utils.text import slugify
+import hashlib
 import uuid
 
+from .storage import attachment_storage, validate_upload_size
+
 
 class PatientProfile(models.Model):
     """Extended profile for patients"""
@@ -24,7 +28,10 @@ class PatientProfile(models.Model):
     address = models.TextField()
     blood_group = models.CharField(max_length=5, choices=BLOOD_GROUPS, blank=True)
     emergency_contact = models.CharField(max_length=15, blank=True)
-    profile_image = models.ImageField(upload_to='patients/', null=True, blank=True)
+    profile_image = models.ImageField(
+        upload_to='patients/', storage=attachment_storage, validators=[validate_upload_size],
+        null=True, blank=True,
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
@@ -36,6 +43,52 @@ class PatientProfile(models.Model):
         verbose_name_plural = 'Patient Profiles'
 
 
+def facility_slug(name):
+    """
+    Slug identifying a facility name
+
+    Names that differ only in case or punctuation ("ICU", "I.C.U.") share a
+    slug and so a Facility. Names with no ASCII letters or digits get a
+    stable slug derived from the name instead of an empty one.
+    """
+    name = ' '.join(name.split()).lower()
+    digest = hashlib.md5(name.encode(), usedforsecurity=False).hexdigest()[:8]
+    return slugify(name) or f'facility-{digest}'
+
+
+class Facility(models.Model):
+    """A facility or service offered by hospitals (ICU, Blood Bank, ...)"""
+    name = models.CharField(max_length=100, unique=True)
+    slug = models.SlugField(max_length=100, unique=True)
+    
+    def __str__(self):
+        return self.name
+    
+    @staticmethod
+    def parse_names(text):
+        """Split a comma separated facilities string into clean, unique names"""
+        names = []
+        for name in (text or '').split(','):
+            name = ' '.join(name.split())
+            if name and name.lower() not in [n.lower() for n in names]:
+                names.append(name)
+        return names
+    
+    @classmethod
+    def get_or_create_many(cls, names):
+        """Facilities for names, looked up and created by slug"""
+        facilities = []
+        for name in names:
+            facility, _ = cls.objects.get_or_create(slug=facility_slug(name), defaults={'name': name})
+            if facility not in facilities:
+                facilities.append(facility)
+        return facilities
+    
+    class Meta:
+        ordering = ['name']
+        verbose_name_plural = 'Facilities'
+
+
 class Hospital(models.Model):
     """Hospital/Clinic information"""
     name = models.CharField(max_length=300)
@@ -45,8 +98,11 @@ class Hospital(models.Model):
     phone = models.CharField(max_length=15)
     email = models.EmailField()
     description = models.TextField(blank=True)
-    facilities = models.TextField(blank=True, help_text="Comma separated list of facilities")
-    image = models.ImageField(upload_to='hospitals/', null=True, blank=True)
+    facilities = models.ManyToManyField(Facility, blank=True, related_name='hospitals')
+    image = models.ImageField(
+        upload_to='hospitals/', storage=attachment_storage, validators=[validate_upload_size],
+        null=True, blank=True,
+    )
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
     
@@ -55,11 +111,26 @@ class Hospital(models.Model):
     
     @property
     def available_beds_count(self):
-        return self.beds.filter(is_available=True).count()
+        return self.beds.filter(Bed.free_filter()).count()
     
     @property
     def total_beds_count(self):
         return self.beds.count()
+    
+    @classmethod
+    def with_facilities(cls, slugs, queryset=None):
+        """Hospitals offering every one of the given facility slugs"""
+        if queryset is None:
+            queryset = cls.objects.all()
+        slugs = set(slugs)
+        if not slugs:
+            return queryset
+        return queryset.filter(facilities__slug__in=slugs).annotate(
+            matched_facilities=models.Count('facilities', distinct=True)
+        ).filter(matched_facilities=len(slugs))
+    
+    class Meta:
+        indexes = [models.Index(fields=['latitude', 'longitude'])]
 
 
 class DoctorProfile(models.Model):
@@ -89,7 +160,10 @@ class DoctorProfile(models.Model):
     consultation_fee = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     phone = models.CharField(max_length=15)
     bio = models.TextField(blank=True)
-    profile_image = models.ImageField(upload_to='doctors/', null=True, blank=True)
+    profile_image = models.ImageField(
+        upload_to='doctors/', storage=attachment_storage, validators=[validate_upload_size],
+        null=True, blank=True,
+    )
     is_verified = models.BooleanField(default=False)
     is_available = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
@@ -121,15 +195,84 @@ class Bed(models.Model):
     is_available = models.BooleanField(default=True)
     daily_rate = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     updated_at = models.DateTimeField(auto_now=True)
+    # Temporary reservation by a dispatcher (see core.beds.claim_bed)
+    held_until = models.DateTimeField(null=True, blank=True, db_index=True)
+    hold_token = models.UUIDField(null=True, blank=True, unique=True)
+    held_by = models.ForeignKey(
+        User, on_delete=models.SET_NULL, null=True, blank=True, related_name='bed_holds'
+    )
     
     def __str__(self):
         status = "Available" if self.is_available else "Occupied"
         return f"{self.hospital.name} - Bed {self.bed_number} ({status})"
     
+    @property
+    def is_held(self):
+        """Free but reserved by a dispatcher hold that has not lapsed"""
+        return self.is_available and self.held_until is not None and self.held_until > timezone.now()
+    
+    @staticmethod
+    def free_filter(prefix='', now=None):
+        """
+        Q for beds that can be claimed: available and not under a live hold
+        
+        A lapsed hold counts as free even before expire_holds() clears it.
+        `prefix` is the relation path when filtering from another model,
+        e.g. 'beds__' on Hospital.
+        """
+        now = now or timezone.now()
+        return models.Q(**{f'{prefix}is_available': True}) & (
+            models.Q(**{f'{prefix}held_until__isnull': True})
+            | models.Q(**{f'{prefix}held_until__lte': now})
+        )
+    
     class Meta:
         unique_together = ['hospital', 'bed_number']
 
 
+class BedChange(models.Model):
+    """Change log of hospitals whose beds changed; the id is the snapshot version"""
+    # Plain id (not a FK) so entries outlive a deleted hospital
+    hospital_id = models.PositiveBigIntegerField(db_index=True)
+    changed_at = models.DateTimeField(auto_now_add=True)
+    
+    # Entries kept for ?since= deltas; older pollers get a full snapshot
+    RETENTION = 10000
+    PRUNE_EVERY = 1000
+    
+    def __str__(self):
+        return f"v{self.pk}: hospital {self.hospital_id}"
+    
+    @classmethod
+    def record(cls, *hospital_ids):
+        """
+        Log a change for each hospital and return the new version
+        
+        Pollers resume from the highest id they have seen, so ids must
+        become visible in order. PostgreSQL hands out sequence values
+        before commit, and a later id could commit first and make a poller
+        skip the earlier one. The table lock (held until the surrounding
+        transaction commits) serializes writers there. SQLite already
+        allows only one writer at a time.
+        """
+        change = None
+        with transaction.atomic():
+            if hospital_ids and connection.vendor == 'postgresql':
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        f'LOCK TABLE {cls._meta.db_table} IN SHARE ROW EXCLUSIVE MODE'
+                    )
+            for hospital_id in set(hospital_ids):
+                change = cls.objects.create(hospital_id=hospital_id)
+                if change.pk % cls.PRUNE_EVERY == 0:
+                    cls.objects.filter(pk__lte=change.pk - cls.RETENTION).delete()
+        return change.pk if change else cls.latest_version()
+    
+    @classmethod
+    def latest_version(cls):
+        return cls.objects.aggregate(version=models.Max('pk'))['version'] or 0
+
+
 class Appointment(models.Model):
     """Appointment management"""
     STATUS_CHOICES = [
@@ -169,6 +312,11 @@ class Appointment(models.Model):
     
     class Meta:
         ordering = ['-scheduled_date', '-scheduled_time']
+        indexes = [
+            models.Index(fields=['doctor', 'status', 'patient']),
+            # Keyset pagination of the patient timeline
+            models.Index(fields=['patient', 'scheduled_date', 'id']),
+        ]
 
 
 class Consultation(models.Model):
@@ -193,7 +341,10 @@ class MedicalRecord(models.Model):
     diagnosis = models.CharField(max_length=500)
     treatment = models.TextField()
     visit_date = models.DateField()
-    attachments = models.FileField(upload_to='records/', null=True, blank=True)
+    attachments = models.FileField(
+        upload_to='records/', storage=attachment_storage, validators=[validate_upload_size],
+        null=True, blank=True,
+    )
     qr_code = models.ImageField(upload_to='qr_codes/', null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     
@@ -207,6 +358,7 @@ class MedicalRecord(models.Model):
     
     class Meta:
         ordering = ['-visit_date']
+        indexes = [models.Index(fields=['patient', 'visit_date', 'id'])]
 
 
 class Prescription(models.Model):
@@ -232,6 +384,7 @@ class Prescription(models.Model):
     
     class Meta:
         ordering = ['-issue_date']
+        indexes = [models.Index(fields=['patient', 'issue_date', 'id'])]
 
 
 class ChatMessage(models.Model):
@@ -292,3 +445,130 @@ class MobileClinic(models.Model):
     
     class Meta:
         ordering = ['scheduled_date', 'start_time']
+        indexes = [models.Index(fields=['latitude', 'longitude'])]
+
+
+class DirectoryVersion(models.Model):
+    """Change counters for the directory and map APIs (used for ETags)"""
+    scope = models.CharField(max_length=50, unique=True)
+    version = models.PositiveBigIntegerField(default=0)
+    
+    def __str__(self):
+        return f"{self.scope or 'all'} v{self.version}"
+    
+    @classmethod
+    def bump(cls, *scopes):
+        for scope in set(scopes):
+            updated = cls.objects.filter(scope=scope).update(version=models.F('version') + 1)
+            if not updated:
+                obj, created = cls.objects.get_or_create(scope=scope, defaults={'version': 1})
+                if not created:
+                    cls.objects.filter(scope=scope).update(version=models.F('version') + 1)
+    
+    @classmethod
+    def current(cls, *scopes):
+        versions = dict(cls.objects.filter(scope__in=scopes).values_list('scope', 'version'))
+        return [versions.get(scope, 0) for scope in scopes]
+
+
+class DoctorStats(models.Model):
+    """Materialized doctor dashboard counters, kept current by signals"""
+    doctor = models.OneToOneField(
+        DoctorProfile, on_delete=models.CASCADE, primary_key=True, related_name='stats'
+    )
+    pending_count = models.IntegerField(default=0)
+    completed_count = models.IntegerField(default=0)
+    patients_served = models.IntegerField(default=0)
+    # Consultations with both start and end times, and their summed length
+    timed_consultations = models.IntegerField(default=0)
+    consultation_seconds = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    COUNTERS = [
+        'pending_count', 'completed_count', 'patients_served',
+        'timed_consultations', 'consultation_seconds',
+    ]
+    
+    def __str__(self):
+        return f"Stats for Dr. {self.doctor_id}"
+    
+    @property
+    def average_consultation_minutes(self):
+        if not self.timed_consultations:
+            return None
+        return round(self.consultation_seconds / self.timed_consultations / 60)
+    
+    @staticmethod
+    def consultation_seconds_for(started_at, ended_at):
+        """Whole seconds a consultation lasted, or None if it isn't timed"""
+        if started_at is None or ended_at is None or ended_at <= started_at:
+            return None
+        return int((ended_at - started_at).total_seconds())
+    
+    @classmethod
+    def compute(cls, doctor_id):
+        """Recompute one doctor's counters from the appointment tables"""
+        counts = Appointment.objects.filter(doctor_id=doctor_id).aggregate(
+            pending_count=models.Count('id', filter=models.Q(status='pending')),
+            completed_count=models.Count('id', filter=models.Q(status='completed')),
+            patients_served=models.Count(
+                'patient', filter=models.Q(status='completed'), distinct=True
+            ),
+        )
+        durations = [
+            cls.consultation_seconds_for(started_at, ended_at)
+            for started_at, ended_at in Consultation.objects.filter(
+                appointment__doctor_id=doctor_id,
+                started_at__isnull=False, ended_at__isnull=False,
+            ).values_list('started_at', 'ended_at')
+        ]
+        durations = [seconds for seconds in durations if seconds is not None]
+        counts['timed_consultations'] = len(durations)
+        counts['consultation_seconds'] = sum(durations)
+        return counts
+    
+    @classmethod
+    def rebuild(cls, doctor_id):
+        stats, _ = cls.objects.update_or_create(doctor_id=doctor_id, defaults=cls.compute(doctor_id))
+        return stats
+    
+    @classmethod
+    def for_doctor(cls, doctor):
+        """The doctor's stats row, built from scratch the first time"""
+        return cls.objects.filter(doctor=doctor).first() or cls.rebuild(doctor.pk)
+    
+    @classmethod
+    def adjust(cls, doctor_id, **deltas):
+        """
+        Apply counter deltas to an existing row
+        
+        Missing rows are left alone: for_doctor() builds them from the
+        source tables, which already include the change.
+        """
+        changes = {field: models.F(field) + delta for field, delta in deltas.items() if delta}
+        if doctor_id is not None and changes:
+            cls.objects.filter(doctor_id=doctor_id).update(updated_at=timezone.now(), **changes)
+
+
+class DoctorPatient(models.Model):
+    """Distinct doctor-patient pairs, recorded when an appointment is booked"""
+    doctor = models.ForeignKey(DoctorProfile, on_delete=models.CASCADE, related_name='patient_links')
+    patient = models.ForeignKey(PatientProfile, on_delete=models.CASCADE, related_name='doctor_links')
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f"Dr. {self.doctor_id} - patient {self.patient_id}"
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['doctor', 'patient'], name='unique_doctor_patient'),
+        ]
+        # Keyset pagination of a doctor's patient list
+        indexes = [models.Index(fields=['doctor', 'id'])]
+    
+    @classmethod
+    def link(cls, doctor_id, patient_id):
+        """Record that the patient has booked with the doctor (idempotent)"""
+        cls.objects.bulk_create(
+            [cls(doctor_id=doctor_id, patient_id=patient_id)], ignore_conflicts=True
+        )
@@ -0,0 +1,125 @@
+"""
+Bulk patient account provisioning
+
+Creates User + PatientProfile rows for a district's patient list in one go.
+Rows are validated with the same form as self-registration, then every
+password is hashed on a pool of worker processes (the PBKDF2 cost is what
+limits throughput, and it is CPU bound) and the accounts are inserted with
+two bulk queries.
+"""
+import os
+import secrets
+from concurrent.futures import ProcessPoolExecutor
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import transaction
+
+from .forms import PatientRegistrationForm
+from .models import PatientProfile
+
+
+PROFILE_FIELDS = ('full_name', 'phone', 'address', 'date_of_birth', 'blood_group', 'emergency_contact')
+CSV_COLUMNS = ('username', 'email', 'password') + PROFILE_FIELDS
+GENERATED_PASSWORD_BYTES = 9
+
+
+def _init_worker(settings_module):
+    # Spawned workers (macOS, Windows) start without Django configured
+    import django
+    from django.conf import settings
+    if not settings.configured:
+        os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings_module)
+        django.setup()
+
+
+def hash_passwords(passwords, workers=None):
+    """
+    Hash raw passwords with the default hasher on a process pool
+
+    Args:
+        passwords: Raw passwords
+        workers: Worker processes (default: one per CPU); 1 hashes inline
+
+    Returns:
+        Encoded passwords, in the same order
+    """
+    passwords = list(passwords)
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(passwords) < 2:
+        return [make_password(password) for password in passwords]
+
+    chunksize = max(1, len(passwords) // (workers * 4))
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=_init_worker,
+        initargs=(os.environ.get('DJANGO_SETTINGS_MODULE', 'telemedicine.settings'),),
+    ) as pool:
+        return list(pool.map(make_password, passwords, chunksize=chunksize))
+
+
+def validate_rows(rows):
+    """
+    Check patient rows the way the registration form does
+
+    Args:
+        rows: Dicts keyed by CSV_COLUMNS; a blank password gets a generated one
+
+    Returns:
+        (accounts, errors): cleaned data for each valid row (with the raw
+        'password', and 'generated' set when it was made up here), and
+        (row_number, message) for each invalid one
+    """
+    accounts, errors, seen = [], [], set()
+    for number, row in enumerate(rows, start=1):
+        password = (row.get('password') or '').strip()
+        generated = not password
+        if generated:
+            password = secrets.token_urlsafe(GENERATED_PASSWORD_BYTES)
+        data = {column: (row.get(column) or '').strip() for column in CSV_COLUMNS}
+        data.update(password1=password, password2=password)
+        form = PatientRegistrationForm(data)
+        if not form.is_valid():
+            message = '; '.join(
+                f'{field}: {" ".join(field_errors)}' for field, field_errors in form.errors.items()
+            )
+            errors.append((number, message))
+            continue
+
+        username = form.cleaned_data['username']
+        if username.lower() in seen:
+            errors.append((number, f'username: {username} appears more than once'))
+            continue
+        seen.add(username.lower())
+        accounts.append({**form.cleaned_data, 'password': password, 'generated': generated})
+    return accounts, errors
+
+
+def provision_patients(accounts, workers=None):
+    """
+    Create patient accounts from validated rows
+
+    Args:
+        accounts: Cleaned rows from validate_rows()
+        workers: Password hashing processes (see hash_passwords)
+
+    Returns:
+        Number of accounts created
+    """
+    hashes = hash_passwords((account['password'] for account in accounts), workers)
+    with transaction.atomic():
+        User.objects.bulk_create([
+            User(username=account['username'], email=account['email'], password=encoded)
+            for account, encoded in zip(accounts, hashes)
+        ])
+        # Not every backend returns primary keys from bulk_create
+        user_ids = dict(User.objects.filter(
+            username__in=[account['username'] for account in accounts]
+        ).values_list('username', 'id'))
+        PatientProfile.objects.bulk_create([
+            PatientProfile(
+                user_id=user_ids[account['username']],
+                **{field: account[field] for field in PROFILE_FIELDS},
+            )
+            for account in accounts
+        ])
+    return len(accounts)
@@ -0,0 +1,254 @@
+"""
+Full-text search over doctors, hospitals and medical records
+
+On SQLite the searchable text lives in an FTS5 table (core_search_index)
+that is kept in sync by signals and ranked with bm25. On PostgreSQL the
+models are queried directly with tsvector/tsquery ranking. Other backends
+fall back to icontains filters.
+"""
+import re
+
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from .models import DoctorProfile, Hospital, MedicalRecord
+
+
+FTS_TABLE = 'core_search_index'
+
+# Each model gets a code that is folded into the FTS rowid, so rows can be
+# replaced or deleted by rowid instead of scanning UNINDEXED columns
+KIND_CODES = {
+    'doctor': 1,
+    'hospital': 2,
+    'record': 3,
+}
+KIND_MODELS = {
+    'doctor': DoctorProfile,
+    'hospital': Hospital,
+    'record': MedicalRecord,
+}
+# Fields searched on backends without an FTS index
+KIND_FIELDS = {
+    'doctor': ['full_name', 'qualification', 'bio'],
+    'hospital': ['name', 'address', 'facilities__name'],
+    'record': ['diagnosis', 'treatment'],
+}
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def uses_fts5():
+    return connection.vendor == 'sqlite'
+
+
+def uses_postgres():
+    return connection.vendor == 'postgresql'
+
+
+def kind_for_instance(instance):
+    for kind, model in KIND_MODELS.items():
+        if isinstance(instance, model):
+            return kind
+    return None
+
+
+def make_rowid(kind, object_id):
+    return object_id * 4 + KIND_CODES[kind]
+
+
+def document_for(kind, instance):
+    """Return (title, body) text indexed for an instance"""
+    if kind == 'doctor':
+        body = ' '.join([
+            instance.get_specialization_display(), instance.qualification, instance.bio
+        ])
+        return instance.full_name, body
+    if kind == 'hospital':
+        facilities = ' '.join(f.name for f in instance.facilities.all())
+        return instance.name, f'{instance.address} {facilities}'
+    return instance.diagnosis, instance.treatment
+
+
+def build_match_query(text):
+    """Turn free text into a safe FTS5 prefix query ("fev"* AND "head"*)"""
+    tokens = _TOKEN_RE.findall(text.lower())
+    return ' AND '.join(f'"{token}"*' for token in tokens[:10])
+
+
+# ==================== INDEX MAINTENANCE ====================
+
+def create_index(schema_editor=None):
+    conn = schema_editor.connection if schema_editor else connection
+    if conn.vendor != 'sqlite':
+        return
+    with conn.cursor() as cursor:
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+            "kind UNINDEXED, object_id UNINDEXED, title, body, "
+            "tokenize='porter unicode61')"
+        )
+
+
+def drop_index(schema_editor=None):
+    conn = schema_editor.connection if schema_editor else connection
+    if conn.vendor != 'sqlite':
+        return
+    with conn.cursor() as cursor:
+        cursor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+def index_document(kind, object_id, title, body, conn=None):
+    conn = conn or connection
+    with conn.cursor() as cursor:
+        cursor.execute(
+            f'INSERT OR REPLACE INTO {FTS_TABLE} (rowid, kind, object_id, title, body) '
+            'VALUES (%s, %s, %s, %s, %s)',
+            [make_rowid(kind, object_id), kind, object_id, title, body],
+        )
+
+
+def index_instance(instance):
+    """Insert or replace the index row for a saved instance"""
+    kind = kind_for_instance(instance)
+    if kind is None or not uses_fts5():
+        return
+    title, body = document_for(kind, instance)
+    index_document(kind, instance.pk, title, body)
+
+
+def remove_instance(instance):
+    kind = kind_for_instance(instance)
+    if kind is None or not uses_fts5() or instance.pk is None:
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [make_rowid(kind, instance.pk)]
+        )
+
+
+def rebuild_index(kinds=None):
+    """Re-index every instance of the given kinds; returns rows written"""
+    if not uses_fts5():
+        return 0
+    count = 0
+    for kind in kinds or KIND_MODELS:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {FTS_TABLE} WHERE rowid %% 4 = %s', [KIND_CODES[kind]]
+            )
+        for instance in KIND_MODELS[kind].objects.iterator():
+            index_instance(instance)
+            count += 1
+    return count
+
+
+# ==================== QUERIES ====================
+
+def search_ids(kind, text, limit=20, queryset=None):
+    """
+    Search one kind of object
+
+    Args:
+        kind: 'doctor', 'hospital' or 'record'
+        text: Free-text query from the user
+        limit: Maximum number of ids to return
+        queryset: Optional queryset restricting which objects may match
+
+    Returns:
+        List of primary keys, best match first
+    """
+    model = KIND_MODELS[kind]
+    if queryset is None:
+        queryset = model.objects.all()
+    if not _TOKEN_RE.search(text or ''):
+        return []
+
+    if uses_fts5():
+        return _search_fts5(kind, text, limit, queryset)
+    if uses_postgres():
+        return _search_postgres(kind, text, limit, queryset)
+
+    condition = Q()
+    for token in _TOKEN_RE.findall(text):
+        token_q = Q()
+        for field in KIND_FIELDS[kind]:
+            token_q |= Q(**{f'{field}__icontains': token})
+        condition &= token_q
+    return list(queryset.filter(condition).distinct().values_list('pk', flat=True)[:limit])
+
+
+def matching(kind, text, queryset=None):
+    """
+    Filter a queryset down to every object matching a search, unranked
+
+    Unlike search_ids() there is no limit: the match is applied as a
+    subquery, so callers that paginate themselves (the admin changelist)
+    see all results.
+    """
+    model = KIND_MODELS[kind]
+    if queryset is None:
+        queryset = model.objects.all()
+    if not _TOKEN_RE.search(text or ''):
+        return queryset.none()
+
+    if uses_fts5():
+        return queryset.filter(pk__in=RawSQL(
+            f'SELECT object_id FROM {FTS_TABLE} '
+            f'WHERE {FTS_TABLE} MATCH %s AND rowid %% 4 = %s',
+            [build_match_query(text), KIND_CODES[kind]],
+        ))
+    if uses_postgres():
+        return queryset.filter(pk__in=_postgres_matches(kind, text, queryset).values('pk'))
+
+    condition = Q()
+    for token in _TOKEN_RE.findall(text):
+        token_q = Q()
+        for field in KIND_FIELDS[kind]:
+            token_q |= Q(**{f'{field}__icontains': token})
+        condition &= token_q
+    return queryset.filter(pk__in=queryset.filter(condition).values('pk'))
+
+
+def _search_fts5(kind, text, limit, queryset):
+    # The scope is applied inside the query, so rows outside it can't
+    # outrank and crowd out the ones the caller may see
+    scope_sql, scope_params = queryset.order_by().values('pk').query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT object_id FROM {FTS_TABLE} '
+            f'WHERE {FTS_TABLE} MATCH %s AND rowid %% 4 = %s AND object_id IN ({scope_sql}) '
+            f'ORDER BY bm25({FTS_TABLE}, 0.0, 0.0, 10.0, 1.0) LIMIT %s',
+            [build_match_query(text), KIND_CODES[kind], *scope_params, limit],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def _postgres_matches(kind, text, queryset):
+    """Annotate a queryset with its tsvector rank, keeping matches only"""
+    from django.contrib.postgres.aggregates import StringAgg
+    from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+    from django.db.models import Value
+
+    title_field, *body_fields = KIND_FIELDS[kind]
+    vector = SearchVector(title_field, weight='A')
+    for field in body_fields:
+        if '__' in field:
+            # Multi-valued relation: aggregate so each object ranks once
+            field = StringAgg(field, delimiter=' ', default=Value(''))
+        vector += SearchVector(field, weight='B')
+    query = SearchQuery(text, search_type='websearch')
+    return queryset.annotate(rank=SearchRank(vector, query)).filter(rank__gt=0)
+
+
+def _search_postgres(kind, text, limit, queryset):
+    matches = _postgres_matches(kind, text, queryset)
+    return list(matches.order_by('-rank').values_list('pk', flat=True)[:limit])
+
+
+def search(kind, text, limit=20, queryset=None):
+    """Return model instances for a search, best match first"""
+    ids = search_ids(kind, text, limit=limit, queryset=queryset)
+    objects = KIND_MODELS[kind].objects.in_bulk(ids)
+    return [objects[pk] for pk in ids if pk in objects]
@@ -0,0 +1,274 @@
+"""
+Signal handlers for Telemedicine Platform
+"""
+from django.db.models.signals import post_init, post_save, post_delete, m2m_changed
+from django.db import transaction
+from django.dispatch import Signal, receiver
+
+from .models import (
+    DoctorProfile, Hospital, Bed, BedChange, MedicalRecord, MobileClinic, DirectoryVersion,
+    Appointment, Consultation, DoctorStats, DoctorPatient
+)
+from . import agenda, search
+
+
+# Sent after the transaction of an appointment status change commits, with
+# appointment_ids, doctor_ids and status (see core.appointments)
+appointments_transitioned = Signal()
+
+# Scope names for DirectoryVersion counters
+DIRECTORY_ALL = ''
+DIRECTORY_HOSPITALS = 'hospitals'
+DIRECTORY_CLINICS = 'clinics'
+
+
+@receiver(post_init, sender=DoctorProfile)
+def remember_doctor_specialization(sender, instance, **kwargs):
+    # Read from __dict__ so deferred loads don't trigger an extra query
+    instance._loaded_specialization = instance.__dict__.get('specialization')
+
+
+@receiver(post_save, sender=DoctorProfile)
+@receiver(post_delete, sender=DoctorProfile)
+def bump_doctor_directory(sender, instance, **kwargs):
+    """Invalidate directory ETags for the doctor's old and new specialization"""
+    DirectoryVersion.bump(
+        DIRECTORY_ALL,
+        instance.specialization,
+        getattr(instance, '_loaded_specialization', None) or instance.specialization,
+    )
+    # Read from __dict__ so deferred loads don't trigger an extra query
+    instance._loaded_specialization = instance.__dict__.get('specialization')
+
+
+@receiver(post_save, sender=Hospital)
+@receiver(post_delete, sender=Hospital)
+def bump_hospital_directory(sender, instance, **kwargs):
+    """Hospital names are embedded in every directory page"""
+    DirectoryVersion.bump(DIRECTORY_HOSPITALS)
+
+
+@receiver(post_save, sender=Bed)
+@receiver(post_delete, sender=Bed)
+def log_bed_change(sender, instance, **kwargs):
+    """Feed the bed availability change log used for ?since= deltas"""
+    BedChange.record(instance.hospital_id)
+
+
+@receiver(post_save, sender=Hospital)
+@receiver(post_delete, sender=Hospital)
+def log_hospital_bed_change(sender, instance, **kwargs):
+    """Renames and (de)activation change a hospital's snapshot entry"""
+    BedChange.record(instance.pk)
+
+
+@receiver(post_save, sender=MobileClinic)
+@receiver(post_delete, sender=MobileClinic)
+def bump_clinic_directory(sender, instance, **kwargs):
+    """Invalidate cached mobile clinic map markers"""
+    DirectoryVersion.bump(DIRECTORY_CLINICS)
+
+
+@receiver(m2m_changed, sender=Hospital.facilities.through)
+def bump_hospital_facilities(sender, action, **kwargs):
+    """Facility-filtered hospital maps depend on the facility links"""
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        DirectoryVersion.bump(DIRECTORY_HOSPITALS)
+
+
+@receiver(post_save, sender=DoctorProfile)
+@receiver(post_save, sender=Hospital)
+@receiver(post_save, sender=MedicalRecord)
+def update_search_index(sender, instance, raw=False, **kwargs):
+    """Keep the full-text index in step with searchable models"""
+    if not raw:
+        search.index_instance(instance)
+
+
+@receiver(post_delete, sender=DoctorProfile)
+@receiver(post_delete, sender=Hospital)
+@receiver(post_delete, sender=MedicalRecord)
+def remove_from_search_index(sender, instance, **kwargs):
+    search.remove_instance(instance)
+
+
+@receiver(m2m_changed, sender=Hospital.facilities.through)
+def reindex_hospital_facilities(sender, instance, action, reverse, **kwargs):
+    """Facilities are set after the hospital row is saved, so re-index then"""
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if reverse:
+        # Changed from the facility side; instance is a Facility
+        for hospital in instance.hospitals.all():
+            search.index_instance(hospital)
+    else:
+        search.index_instance(instance)
+
+
+# ==================== DOCTOR STATS ====================
+
+def _appointment_state(instance):
+    # Read from __dict__ so deferred loads don't trigger an extra query
+    fields = instance.__dict__
+    return fields.get('doctor_id'), fields.get('patient_id'), fields.get('status')
+
+
+def _appointment_deltas(instance, state, sign):
+    """Counter changes for adding (sign=1) or removing (sign=-1) one appointment state"""
+    doctor_id, patient_id, status = state
+    deltas = {
+        'pending_count': sign * (status == 'pending'),
+        'completed_count': sign * (status == 'completed'),
+    }
+    if status == 'completed':
+        # The patient only counts once per doctor, however many visits
+        seen_elsewhere = Appointment.objects.filter(
+            doctor_id=doctor_id, patient_id=patient_id, status='completed'
+        ).exclude(pk=instance.pk).exists()
+        deltas['patients_served'] = 0 if seen_elsewhere else sign
+    return deltas
+
+
+@receiver(post_init, sender=Appointment)
+def remember_appointment_state(sender, instance, **kwargs):
+    instance._loaded_state = _appointment_state(instance)
+
+
+@receiver(post_save, sender=Appointment)
+def update_stats_on_appointment_save(sender, instance, created, raw=False, **kwargs):
+    """Move the doctor's counters along with the appointment's status"""
+    old, new = instance._loaded_state, _appointment_state(instance)
+    instance._loaded_state = new
+    if raw or (old == new and not created):
+        return
+    if not created and old[2] is None:
+        # Status was deferred when loaded, so the old state is unknown
+        DoctorStats.rebuild(instance.doctor_id)
+        return
+    if not created:
+        DoctorStats.adjust(old[0], **_appointment_deltas(instance, old, -1))
+    DoctorStats.adjust(new[0], **_appointment_deltas(instance, new, 1))
+
+
+@receiver(post_delete, sender=Appointment)
+def update_stats_on_appointment_delete(sender, instance, **kwargs):
+    DoctorStats.adjust(instance.doctor_id, **_appointment_deltas(instance, _appointment_state(instance), -1))
+
+
+def _consultation_seconds(instance):
+    fields = instance.__dict__
+    return DoctorStats.consultation_seconds_for(fields.get('started_at'), fields.get('ended_at'))
+
+
+def _adjust_consultation_time(instance, old, new):
+    if old == new:
+        return
+    doctor_id = Appointment.objects.filter(
+        pk=instance.appointment_id
+    ).values_list('doctor_id', flat=True).first()
+    DoctorStats.adjust(
+        doctor_id,
+        timed_consultations=(new is not None) - (old is not None),
+        consultation_seconds=(new or 0) - (old or 0),
+    )
+
+
+@receiver(post_init, sender=Consultation)
+def remember_consultation_time(sender, instance, **kwargs):
+    instance._loaded_seconds = _consultation_seconds(instance)
+
+
+@receiver(post_save, sender=Consultation)
+def update_stats_on_consultation_save(sender, instance, raw=False, **kwargs):
+    """Feed the doctor's average consultation length"""
+    old, new = instance._loaded_seconds, _consultation_seconds(instance)
+    instance._loaded_seconds = new
+    if not raw:
+        _adjust_consultation_time(instance, old, new)
+
+
+@receiver(post_delete, sender=Consultation)
+def update_stats_on_consultation_delete(sender, instance, **kwargs):
+    _adjust_consultation_time(instance, _consultation_seconds(instance), None)
+
+
+# ==================== DAILY AGENDAS ====================
+
+def _refresh_agendas_after_commit(*keys):
+    # Rebuild from committed rows, once per (doctor, day) touched
+    keys = {key for key in keys if None not in key}
+    transaction.on_commit(lambda: [agenda.refresh(*key) for key in keys])
+
+
+def _agenda_state(instance):
+    fields = instance.__dict__
+    return fields.get('doctor_id'), fields.get('scheduled_date')
+
+
+@receiver(post_init, sender=Appointment)
+def remember_appointment_agenda(sender, instance, **kwargs):
+    instance._loaded_agenda = _agenda_state(instance)
+
+
+@receiver(post_save, sender=Appointment)
+@receiver(post_delete, sender=Appointment)
+def refresh_agenda_on_appointment_change(sender, instance, raw=False, **kwargs):
+    """Bookings, cancellations and reschedules reorder the day's queue"""
+    if raw:
+        return
+    old, new = instance._loaded_agenda, _agenda_state(instance)
+    instance._loaded_agenda = new
+    if None in old:
+        # Deferred when loaded; only the current day is known
+        old = (instance.doctor_id, instance.scheduled_date)
+    _refresh_agendas_after_commit(old, new)
+
+
+@receiver(post_init, sender=Consultation)
+def remember_consultation_start(sender, instance, **kwargs):
+    instance._loaded_started_at = instance.__dict__.get('started_at')
+
+
+@receiver(post_save, sender=Consultation)
+def refresh_agenda_on_consultation_start(sender, instance, raw=False, **kwargs):
+    """Wait estimates count from when the current consultation started"""
+    started_at = instance.__dict__.get('started_at')
+    if raw or started_at == instance._loaded_started_at:
+        return
+    instance._loaded_started_at = started_at
+    key = Appointment.objects.filter(
+        pk=instance.appointment_id
+    ).values_list('doctor_id', 'scheduled_date').first()
+    if key:
+        _refresh_agendas_after_commit(key)
+
+
+# ==================== DOCTOR PATIENTS ====================
+
+def _unlink_if_unused(doctor_id, patient_id):
+    # Drop the pair once no appointment connects them any more
+    if not Appointment.objects.filter(doctor_id=doctor_id, patient_id=patient_id).exists():
+        DoctorPatient.objects.filter(doctor_id=doctor_id, patient_id=patient_id).delete()
+
+
+@receiver(post_init, sender=Appointment)
+def remember_appointment_pair(sender, instance, **kwargs):
+    fields = instance.__dict__
+    instance._loaded_pair = fields.get('doctor_id'), fields.get('patient_id')
+
+
+@receiver(post_save, sender=Appointment)
+def link_doctor_patient(sender, instance, created, raw=False, **kwargs):
+    """A booking puts the patient on the doctor's patient list"""
+    old, new = instance._loaded_pair, (instance.doctor_id, instance.patient_id)
+    instance._loaded_pair = new
+    if raw or (old == new and not created):
+        return
+    DoctorPatient.link(*new)
+    if not created and None not in old:
+        _unlink_if_unused(*old)
+
+
+@receiver(post_delete, sender=Appointment)
+def unlink_doctor_patient(sender, instance, **kwargs):
+    _unlink_if_unused(instance.doctor_id, instance.patient_id)
@@ -0,0 +1,195 @@
+"""
+Storage backends for Telemedicine Platform
+"""
+import hashlib
+import os
+import posixpath
+import re
+import tempfile
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.core.files.move import file_move_safe
+from django.core.files.storage import FileSystemStorage, storages
+from django.template.defaultfilters import filesizeformat
+
+from .utils import thumbnails
+from .utils.assets import MINIFIABLE_EXTENSIONS, compressed_variants, minify
+
+
+class MinifiedSource:
+    """
+    Wraps a finder's source storage so CSS/JS are read back minified
+
+    The manifest hashes whatever post_process reads from the source, so
+    minifying here keeps each fingerprint tied to the bytes actually served.
+    """
+
+    def __init__(self, storage):
+        self.storage = storage
+
+    def open(self, path, mode='rb'):
+        with self.storage.open(path, mode) as f:
+            content = f.read()
+        if path.endswith(MINIFIABLE_EXTENSIONS):
+            minified = minify(path, content)
+            if len(minified) < len(content):
+                content = minified
+        return ContentFile(content)
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """
+    Fingerprinted static files, minified and precompressed at collectstatic
+
+    CSS/JS are minified before they are hashed (see MinifiedSource), then
+    .gz and (if the brotli package is installed) .br siblings are written
+    next to every text asset so the static handler never compresses on the
+    fly.
+    """
+
+    def post_process(self, paths, dry_run=False, **options):
+        sources = {}
+        paths = {
+            name: (sources.setdefault(id(storage), MinifiedSource(storage)), path)
+            for name, (storage, path) in paths.items()
+        }
+        processed = []
+        for name, hashed_name, result in super().post_process(paths, dry_run, **options):
+            if hashed_name and not isinstance(result, Exception):
+                processed.append((name, hashed_name))
+            yield name, hashed_name, result
+
+        if dry_run:
+            return
+
+        for name, hashed_name in dict.fromkeys(processed):
+            # The unhashed copy is what DEBUG mode links to; collectstatic
+            # wrote it unminified before post-processing
+            self._minify_and_compress(name)
+            self._compress(hashed_name)
+
+    def _minify_and_compress(self, name):
+        with self.open(name) as f:
+            content = f.read()
+
+        if name.endswith(MINIFIABLE_EXTENSIONS):
+            minified = minify(name, content)
+            if len(minified) < len(content):
+                content = minified
+                self.delete(name)
+                self._save(name, ContentFile(content))
+        self._compress(name, content)
+
+    def _compress(self, name, content=None):
+        if content is None:
+            with self.open(name) as f:
+                content = f.read()
+        for suffix, data in compressed_variants(name, content):
+            variant = name + suffix
+            if self.exists(variant):
+                self.delete(variant)
+            self._save(variant, ContentFile(data))
+
+
+# ==================== UPLOADS ====================
+
+DEFAULT_ATTACHMENT_MAX_SIZE = 50 * 1024 * 1024
+
+_DIGEST_RE = re.compile(r'^[0-9a-f]{64}$')
+
+
+def attachment_storage():
+    """Storage for user uploads (callable so models follow settings.STORAGES)"""
+    return storages['attachments']
+
+
+def validate_upload_size(file):
+    """Reject uploads larger than settings.ATTACHMENT_MAX_SIZE"""
+    limit = getattr(settings, 'ATTACHMENT_MAX_SIZE', DEFAULT_ATTACHMENT_MAX_SIZE)
+    if file.size > limit:
+        raise ValidationError(
+            f'File is too large ({filesizeformat(file.size)}); the limit is {filesizeformat(limit)}.'
+        )
+
+
+def content_digest(name):
+    """SHA-256 a content-addressed file was stored under, or None for other names"""
+    stem = os.path.splitext(posixpath.basename(name or ''))[0]
+    return stem if _DIGEST_RE.match(stem) else None
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Uploads stored under their SHA-256: <upload_to>/<ab>/<sha256><ext>
+
+    Files are streamed to disk in chunks while hashing, so large scans are
+    never held in memory. Uploading a file that is already stored keeps the
+    existing copy, and image uploads get a WebP thumbnail generated in the
+    background. Stored files may be shared by several rows, so never delete
+    one just because a single row stops referencing it.
+    """
+    chunk_size = 1024 * 1024
+
+    def get_available_name(self, name, max_length=None):
+        # The final name is only known once the content is hashed in _save
+        return name
+
+    def _save(self, name, content):
+        directory = posixpath.dirname(name)
+        extension = os.path.splitext(name)[1].lower()
+
+        if hasattr(content, 'temporary_file_path'):
+            # Already spooled to disk by the upload handler: hash, then move
+            source, moved = content.temporary_file_path(), True
+            digest = hashlib.sha256()
+            for chunk in content.chunks(self.chunk_size):
+                digest.update(chunk)
+        else:
+            (source, digest), moved = self._spool(content), False
+        digest = digest.hexdigest()
+
+        name = posixpath.join(directory, digest[:2], digest + extension)
+        full_path = self.path(name)
+        if os.path.exists(full_path):
+            # Same content stored before: keep that copy
+            if not moved:
+                os.remove(source)
+        else:
+            os.makedirs(os.path.dirname(full_path), exist_ok=True)
+            if moved:
+                file_move_safe(source, full_path)
+            else:
+                os.replace(source, full_path)
+            if self.file_permissions_mode is not None:
+                os.chmod(full_path, self.file_permissions_mode)
+
+        if thumbnails.is_image(name):
+            thumbnails.schedule(full_path, self.path(thumbnails.thumbnail_name(name, digest)))
+        return name
+
+    def _spool(self, content):
+        """Copy content to a temporary file beside MEDIA_ROOT files, hashing as it goes"""
+        incoming = self.path('.incoming')
+        os.makedirs(incoming, exist_ok=True)
+        digest = hashlib.sha256()
+        fd, path = tempfile.mkstemp(dir=incoming)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in content.chunks(self.chunk_size):
+                    digest.update(chunk)
+                    f.write(chunk)
+        except BaseException:
+            os.remove(path)
+            raise
+        return path, digest
+
+    def thumbnail_url(self, name):
+        """URL of an image's WebP thumbnail, or None until it has been generated"""
+        digest = content_digest(name)
+        if digest is None or not thumbnails.is_image(name):
+            return None
+        thumbnail = thumbnails.thumbnail_name(name, digest)
+        return self.url(thumbnail) if self.exists(thumbnail) else None
@@ -0,0 +1,66 @@
+"""
+Template tags for static asset bundles
+"""
+import json
+from functools import lru_cache
+
+from django import template
+from django.contrib.staticfiles import finders
+from django.templatetags.static import static
+from django.utils.html import format_html, format_html_join
+
+from ..utils import templates
+
+register = template.Library()
+
+BUNDLE_MANIFEST = 'bundle.json'
+BUNDLE_PATH = 'fonts/' + BUNDLE_MANIFEST
+
+GOOGLE_FONTS_URL = (
+    'https://fonts.googleapis.com/css2?family=Inter:wght@300;400;500;600;700'
+    '&family=Outfit:wght@400;500;600;700;800&display=swap'
+)
+FONT_AWESOME_CDN_URL = 'https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.5.1/css/all.min.css'
+
+
+@lru_cache(maxsize=1)
+def load_font_bundle():
+    """Read fonts/bundle.json written by the build_font_bundle command"""
+    path = finders.find(BUNDLE_PATH)
+    if not path:
+        return {}
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+@register.simple_tag
+def font_bundle():
+    """
+    Link the self-hosted font bundle, falling back to the CDNs
+
+    Each part (icons, web fonts) not present in the bundle is still loaded
+    from its CDN, so pages look the same before the bundle is built.
+    """
+    bundle = load_font_bundle()
+    tags = []
+    if bundle.get('css'):
+        tags.append(format_html_join(
+            '\n', '<link rel="preload" href="{}" as="font" type="font/woff2" crossorigin>',
+            ((static(path),) for path in bundle.get('preload', [])),
+        ))
+        tags.append(format_html('<link rel="stylesheet" href="{}">', static(bundle['css'])))
+    if not bundle.get('webfonts'):
+        tags.append(format_html(
+            '<link rel="preconnect" href="https://fonts.googleapis.com">\n'
+            '<link rel="preconnect" href="https://fonts.gstatic.com" crossorigin>\n'
+            '<link href="{}" rel="stylesheet">', GOOGLE_FONTS_URL,
+        ))
+    if not bundle.get('icons'):
+        tags.append(format_html('<link rel="stylesheet" href="{}">', FONT_AWESOME_CDN_URL))
+    return format_html_join('\n', '{}', ((tag,) for tag in tags))
+
+
+@register.simple_tag
+def template_version():
+    """Deploy version for {% cache %} keys: {% template_version as version %}"""
+    return templates.template_version()
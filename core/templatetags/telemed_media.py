@@ -0,0 +1,20 @@
+"""
+Template filters for uploaded media
+"""
+from django import template
+
+register = template.Library()
+
+
+@register.filter
+def thumbnail(fieldfile):
+    """
+    URL of an uploaded image's WebP thumbnail
+
+    Empty for non-images, files stored outside the attachment storage and
+    thumbnails still being generated, so templates can fall back to an icon.
+    """
+    if not fieldfile:
+        return ''
+    lookup = getattr(fieldfile.storage, 'thumbnail_url', None)
+    return (lookup(fieldfile.name) if lookup else None) or ''
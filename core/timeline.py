@@ -0,0 +1,151 @@
+"""
+Patient health timeline
+
+Merges a patient's appointments, consultations, medical records and
+prescriptions into one list, newest first. Pages are keyset paginated on
+(date, kind, id): each source is read with one indexed, LIMITed query past
+the cursor, and the sorted results are merged in Python, so every page costs
+the same four queries however long the patient's history is.
+"""
+import datetime
+import heapq
+
+from django.db.models import Q
+from django.urls import reverse
+
+from .models import Appointment, Consultation, MedicalRecord, Prescription
+from .utils.keyset import bounded_int
+
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 50
+
+
+def _appointment_event(row):
+    return {
+        'title': f"Appointment with Dr. {row['doctor__full_name']}",
+        'detail': f"{row['booking_id']} at {row['scheduled_time']:%H:%M}",
+        'status': row['status'],
+        'url': reverse('patient_appointments'),
+    }
+
+
+def _consultation_event(row):
+    detail = row['diagnosis'] or 'Consultation'
+    if row['started_at'] and row['ended_at'] and row['ended_at'] > row['started_at']:
+        minutes = round((row['ended_at'] - row['started_at']).total_seconds() / 60)
+        detail = f'{detail} ({minutes} min)'
+    return {
+        'title': f"Consultation with Dr. {row['appointment__doctor__full_name']}",
+        'detail': detail,
+        'status': 'completed' if row['ended_at'] else 'in_progress',
+        'url': reverse('consultation_room', args=[row['appointment_id']]),
+    }
+
+
+def _record_event(row):
+    doctor = row['doctor__full_name']
+    return {
+        'title': row['diagnosis'],
+        'detail': row['record_id'] + (f' by Dr. {doctor}' if doctor else ''),
+        'status': None,
+        'url': reverse('view_record_qr', args=[row['record_id']]),
+    }
+
+
+def _prescription_event(row):
+    doctor = row['doctor__full_name']
+    medications = row['medications'].strip().splitlines()
+    return {
+        'title': f"Prescription {row['prescription_id']}" + (f' from Dr. {doctor}' if doctor else ''),
+        'detail': medications[0] if medications else '',
+        'status': None,
+        'url': reverse('view_prescription_qr', args=[row['prescription_id']]),
+    }
+
+
+# kind: (rank within a day, model, patient lookup, date field, columns, formatter)
+# Higher ranks come first on the same day: the prescription written after
+# a visit is listed above the visit itself
+SOURCES = {
+    'prescription': (3, Prescription, 'patient', 'issue_date', (
+        'prescription_id', 'medications', 'doctor__full_name',
+    ), _prescription_event),
+    'record': (2, MedicalRecord, 'patient', 'visit_date', (
+        'record_id', 'diagnosis', 'doctor__full_name',
+    ), _record_event),
+    'consultation': (1, Consultation, 'appointment__patient', 'appointment__scheduled_date', (
+        'appointment_id', 'diagnosis', 'started_at', 'ended_at',
+        'appointment__doctor__full_name',
+    ), _consultation_event),
+    'appointment': (0, Appointment, 'patient', 'scheduled_date', (
+        'booking_id', 'scheduled_time', 'status', 'doctor__full_name',
+    ), _appointment_event),
+}
+
+
+def encode_cursor(key):
+    date, rank, pk = key
+    return f'{date.isoformat()}.{rank}.{pk}'
+
+
+def decode_cursor(cursor):
+    """Parse a cursor from a previous page; raises ValueError if malformed"""
+    date, rank, pk = cursor.split('.')
+    max_rank = max(source[0] for source in SOURCES.values())
+    return datetime.date.fromisoformat(date), bounded_int(rank, maximum=max_rank), bounded_int(pk)
+
+
+def _after(date_field, rank, cursor):
+    # Rows sorting after the cursor in (date, rank, id) descending order
+    date, cursor_rank, cursor_pk = cursor
+    if rank < cursor_rank:
+        return Q(**{f'{date_field}__lte': date})
+    if rank > cursor_rank:
+        return Q(**{f'{date_field}__lt': date})
+    return Q(**{f'{date_field}__lt': date}) | Q(**{date_field: date, 'pk__lt': cursor_pk})
+
+
+def _source_events(kind, patient_id, cursor, limit):
+    rank, model, patient_lookup, date_field, columns, formatter = SOURCES[kind]
+    rows = model.objects.filter(**{patient_lookup: patient_id})
+    if kind == 'consultation':
+        # Opening a consultation room creates the row; list only ones that started
+        rows = rows.filter(started_at__isnull=False)
+    if cursor is not None:
+        rows = rows.filter(_after(date_field, rank, cursor))
+    rows = rows.order_by(f'-{date_field}', '-pk').values('pk', date_field, *columns)[:limit]
+
+    events = []
+    for row in rows:
+        event = {'kind': kind, 'id': row['pk'], 'date': row[date_field], **formatter(row)}
+        event['key'] = (row[date_field], rank, row['pk'])
+        events.append(event)
+    return events
+
+
+def page(patient_id, cursor=None, limit=DEFAULT_PAGE_SIZE):
+    """
+    One page of a patient's timeline
+
+    Args:
+        patient_id: PatientProfile id
+        cursor: Opaque cursor from the previous page (None for the first)
+        limit: Events per page, capped at MAX_PAGE_SIZE
+
+    Returns:
+        (events, next_cursor); next_cursor is None on the last page.
+        Raises ValueError for a malformed cursor.
+    """
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    position = decode_cursor(cursor) if cursor else None
+
+    # limit + 1 rows per source tell us whether anything is left after the page
+    sources = [_source_events(kind, patient_id, position, limit + 1) for kind in SOURCES]
+    merged = list(heapq.merge(*sources, key=lambda event: event['key'], reverse=True))
+
+    events = merged[:limit]
+    next_cursor = encode_cursor(events[-1]['key']) if len(merged) > limit else None
+    for event in events:
+        del event['key']
+    return events, next_cursor
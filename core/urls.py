@@ -10,6 +10,8 @@ urlpatterns = [
     path('about/', views.about, name='about'),
     path('services/', views.services, name='services'),
     path('contact/', views.contact, name='contact'),
+    path('offline/', views.offline, name='offline'),
+    path('sw.js', views.service_worker, name='service_worker'),
     
     # Authentication
     path('register/', views.register_patient, name='register'),
@@ -24,7 +26,9 @@ urlpatterns = [
     path('patient/book-appointment/', views.book_appointment, name='book_appointment'),
     path('patient/appointments/', views.patient_appointments, name='patient_appointments'),
     path('patient/records/', views.patient_records, name='patient_records'),
+    path('patient/records/more/', views.patient_records, {'fragment': True}, name='patient_records_more'),
     path('patient/prescriptions/', views.patient_prescriptions, name='patient_prescriptions'),
+    path('patient/prescriptions/more/', views.patient_prescriptions, {'fragment': True}, name='patient_prescriptions_more'),
     path('patient/profile/', views.patient_profile, name='patient_profile'),
     path('patient/consultation/<int:appointment_id>/', views.consultation_room, name='consultation_room'),
     
@@ -32,8 +36,10 @@ urlpatterns = [
     path('doctor/dashboard/', views.doctor_dashboard, name='doctor_dashboard'),
     path('doctor/appointments/', views.doctor_appointments, name='doctor_appointments'),
     path('doctor/patients/', views.doctor_patients, name='doctor_patients'),
+    path('doctor/patients/more/', views.doctor_patients, {'fragment': True}, name='doctor_patients_more'),
     path('doctor/profile/', views.doctor_profile, name='doctor_profile'),
     path('doctor/appointment/<int:appointment_id>/update/', views.update_appointment_status, name='update_appointment_status'),
+    path('doctor/appointments/cancel-day/', views.cancel_day_appointments, name='cancel_day_appointments'),
     path('doctor/appointment/<int:appointment_id>/prescription/', views.create_prescription, name='create_prescription'),
     path('doctor/consultation/<int:appointment_id>/', views.doctor_consultation, name='doctor_consultation'),
     path('consultation/<int:appointment_id>/end/', views.end_consultation, name='end_consultation'),
@@ -42,7 +48,15 @@ urlpatterns = [
     path('find-hospitals/', views.find_hospitals, name='find_hospitals'),
     path('hospital/<int:hospital_id>/', views.hospital_detail, name='hospital_detail'),
     path('bed-availability/', views.bed_availability, name='bed_availability'),
+    path('api/agenda/', views.doctor_agenda, name='doctor_agenda'),
+    path('api/queue/<int:appointment_id>/', views.queue_position, name='queue_position'),
+    path('api/beds/', views.bed_snapshot, name='bed_snapshot'),
+    path('api/beds/hold/', views.hold_bed, name='hold_bed'),
+    path('api/beds/hold/<uuid:token>/confirm/', views.end_bed_hold, {'action': 'confirm'}, name='confirm_bed_hold'),
+    path('api/beds/hold/<uuid:token>/release/', views.end_bed_hold, {'action': 'release'}, name='release_bed_hold'),
     path('mobile-clinics/', views.mobile_clinics, name='mobile_clinics'),
+    path('api/hospitals/', views.hospitals_by_facility, name='hospitals_by_facility'),
+    path('api/map/<str:kind>/', views.map_markers, name='map_markers'),
     
     # Chatbot API
     path('api/chatbot/', views.chatbot_response, name='chatbot_response'),
@@ -52,8 +66,13 @@ urlpatterns = [
     path('api/messages/<int:consultation_id>/', views.get_chat_messages, name='get_chat_messages'),
     path('api/notification/<int:notification_id>/read/', views.mark_notification_read, name='mark_notification_read'),
     path('api/doctors/', views.get_doctors_by_specialization, name='get_doctors'),
+    path('api/search/', views.search_api, name='search'),
+    path('api/timeline/', views.patient_timeline, name='patient_timeline'),
+    path('staff/profile/', views.profiling_report, name='profiling_report'),
     
     # QR Code views
     path('record/<str:record_id>/', views.view_record_qr, name='view_record_qr'),
+    path('record/<str:record_id>/attachment/', views.record_attachment, name='record_attachment'),
+    path('record/<str:record_id>/attachment/thumbnail/', views.record_attachment, {'thumbnail': True}, name='record_attachment_thumbnail'),
     path('prescription/<str:prescription_id>/', views.view_prescription_qr, name='view_prescription_qr'),
 ]
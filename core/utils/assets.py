@@ -0,0 +1,83 @@
+"""
+Static asset helpers: dependency-free CSS/JS minification and
+precompressed (gzip / brotli) variants
+"""
+import gzip
+import re
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip variants are always written
+    brotli = None
+
+
+# Only compress text formats; images and fonts are already compressed
+COMPRESSIBLE_EXTENSIONS = ('.css', '.js', '.svg', '.html', '.txt', '.json', '.map', '.webmanifest')
+MINIFIABLE_EXTENSIONS = ('.css', '.js')
+
+# Small files aren't worth a second round trip through the decompressor
+MIN_COMPRESS_SIZE = 512
+
+_CSS_COMMENT_RE = re.compile(r'/\*.*?\*/', re.S)
+_CSS_STRING_RE = re.compile(r'''("(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*')''')
+_CSS_SPACE_RE = re.compile(r'\s+')
+_CSS_PUNCT_RE = re.compile(r'\s*([{};,>])\s*')
+_CSS_COLON_RE = re.compile(r':\s+')
+_JS_BLOCK_COMMENT_RE = re.compile(r'^\s*/\*(?:(?!\*/).)*\*/\s*$', re.S | re.M)
+_JS_LINE_COMMENT_RE = re.compile(r'^\s*//.*$', re.M)
+
+
+def _minify_css_code(text):
+    text = _CSS_SPACE_RE.sub(' ', text)
+    text = _CSS_PUNCT_RE.sub(r'\1', text)
+    text = _CSS_COLON_RE.sub(':', text)
+    return text.replace(';}', '}')
+
+
+def minify_css(text):
+    """Strip comments and redundant whitespace from a stylesheet"""
+    text = _CSS_COMMENT_RE.sub('', text)
+    # Quoted strings (content, data URLs) are copied through untouched
+    parts = _CSS_STRING_RE.split(text)
+    return ''.join(
+        part if i % 2 else _minify_css_code(part) for i, part in enumerate(parts)
+    ).strip()
+
+
+def minify_js(text):
+    """
+    Conservative JavaScript minification
+
+    Only whole-line comments, indentation and blank lines are removed, so
+    strings, template literals and regex literals are never rewritten.
+    """
+    text = _JS_BLOCK_COMMENT_RE.sub('', text)
+    text = _JS_LINE_COMMENT_RE.sub('', text)
+    lines = (line.strip() for line in text.splitlines())
+    return '\n'.join(line for line in lines if line) + '\n'
+
+
+def minify(name, content):
+    """Minify bytes for a file name; unknown types are returned unchanged"""
+    if name.endswith('.css'):
+        return minify_css(content.decode('utf-8')).encode('utf-8')
+    if name.endswith('.js'):
+        return minify_js(content.decode('utf-8')).encode('utf-8')
+    return content
+
+
+def compressed_variants(name, content):
+    """
+    Yield (suffix, bytes) for each precompressed variant worth keeping
+
+    A variant is skipped when it would not actually be smaller.
+    """
+    if not name.endswith(COMPRESSIBLE_EXTENSIONS) or len(content) < MIN_COMPRESS_SIZE:
+        return
+    gz = gzip.compress(content, compresslevel=9, mtime=0)
+    if len(gz) < len(content):
+        yield '.gz', gz
+    if brotli is not None:
+        br = brotli.compress(content, quality=11)
+        if len(br) < len(content):
+            yield '.br', br
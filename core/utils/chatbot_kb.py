@@ -0,0 +1,137 @@
+"""
+Chatbot knowledge base loader with hot reload and response caching
+
+The knowledge base is a versioned JSON file (core/data/chatbot_kb.json by
+default, override with the CHATBOT_KB_PATH setting). It is parsed once into
+an in-memory index and swapped atomically whenever the file changes on disk,
+so health workers can edit guidance without restarting workers.
+"""
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+
+DEFAULT_KB_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'chatbot_kb.json'
+)
+
+# Seconds between mtime checks of the knowledge base file
+RELOAD_CHECK_INTERVAL = 5
+
+# Number of normalized queries kept in the response cache
+RESPONSE_CACHE_SIZE = 512
+
+_WORD_RE = re.compile(r"[^\w\s]+")
+_SPACE_RE = re.compile(r"\s+")
+
+
+def normalize_query(message):
+    """Lowercase, strip punctuation and collapse whitespace"""
+    message = _WORD_RE.sub(' ', (message or '').lower())
+    return _SPACE_RE.sub(' ', message).strip()
+
+
+class KnowledgeBase:
+    """Immutable, indexed snapshot of one version of the knowledge base"""
+
+    def __init__(self, data, mtime=None):
+        self.version = data.get('version', 0)
+        self.mtime = mtime
+        self.greeting = data['greeting']
+        self.symptom_fallback = data['symptom_fallback']
+        # Keep file order: the first matching keyword wins
+        self.topics = [
+            (normalize_query(t['keyword']), t.get('response'), t.get('symptom_lookup', False))
+            for t in data.get('topics', [])
+        ]
+        self.symptoms = [
+            (normalize_query(s['keyword']), s['advice'])
+            for s in data.get('symptoms', [])
+        ]
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+
+    @classmethod
+    def from_file(cls, path):
+        mtime = os.stat(path).st_mtime
+        with open(path, encoding='utf-8') as f:
+            return cls(json.load(f), mtime=mtime)
+
+    def symptom_response(self, query):
+        for keyword, advice in self.symptoms:
+            if keyword in query:
+                return advice
+        return self.symptom_fallback
+
+    def _lookup(self, query):
+        for keyword, response, symptom_lookup in self.topics:
+            if keyword in query:
+                return self.symptom_response(query) if symptom_lookup else response
+        return self.greeting
+
+    def respond(self, message):
+        """Answer a message, serving repeated normalized queries from an LRU cache"""
+        query = normalize_query(message)
+        with self._cache_lock:
+            if query in self._cache:
+                self._cache.move_to_end(query)
+                return self._cache[query]
+
+        response = self._lookup(query)
+
+        with self._cache_lock:
+            self._cache[query] = response
+            if len(self._cache) > RESPONSE_CACHE_SIZE:
+                self._cache.popitem(last=False)
+        return response
+
+
+_kb = None
+_last_check = 0.0
+_load_lock = threading.Lock()
+
+
+def get_kb_path():
+    return str(getattr(settings, 'CHATBOT_KB_PATH', DEFAULT_KB_PATH))
+
+
+def get_knowledge_base():
+    """
+    Return the current knowledge base, reloading it if the file changed
+
+    A broken edit on disk never takes the chatbot down: the previous
+    snapshot keeps serving until a valid file is written.
+    """
+    global _kb, _last_check
+
+    now = time.monotonic()
+    if _kb is not None and now - _last_check < RELOAD_CHECK_INTERVAL:
+        return _kb
+
+    with _load_lock:
+        if _kb is not None and now - _last_check < RELOAD_CHECK_INTERVAL:
+            return _kb
+        _last_check = now
+        path = get_kb_path()
+        try:
+            mtime = os.stat(path).st_mtime
+            if _kb is None or mtime != _kb.mtime:
+                _kb = KnowledgeBase.from_file(path)
+        except (OSError, ValueError, KeyError):
+            if _kb is None:
+                raise
+    return _kb
+
+
+def reload_knowledge_base():
+    """Force the next lookup to re-read the knowledge base file"""
+    global _kb, _last_check
+    with _load_lock:
+        _kb = None
+        _last_check = 0.0
+    return get_knowledge_base()
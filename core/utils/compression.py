@@ -0,0 +1,115 @@
+"""
+Response compression helpers: Accept-Encoding negotiation and brotli / gzip
+encoders for whole bodies and streams
+
+Brotli is tried first because it makes HTML and JSON around 10% smaller
+than gzip at a similar CPU cost at the mid quality level used here. Quality 11
+(used for static files at collectstatic time) is far too slow per request.
+"""
+import re
+
+from django.utils.text import compress_sequence, compress_string
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; clients then get gzip
+    brotli = None
+
+
+BROTLI_QUALITY = 5
+STREAM_FLUSH_SIZE = 4096
+# Random bytes in the gzip header vary the compressed length of identical
+# pages, as Django's GZipMiddleware does against BREACH
+GZIP_MAX_RANDOM_BYTES = 100
+
+# Text formats only; images, video, audio, fonts, PDFs and archives are
+# already compressed and only grow when compressed again
+COMPRESSIBLE_TYPES = (
+    'application/javascript',
+    'application/json',
+    'application/manifest+json',
+    'application/xml',
+    'image/svg+xml',
+)
+
+_CODING_RE = re.compile(r'^\s*([\w*-]+)\s*(?:;\s*q\s*=\s*([0-9.]+))?\s*$')
+
+
+def accepted_encodings(header):
+    """
+    Parse an Accept-Encoding header into {coding: q}
+
+    Codings with q=0 (explicitly refused) are kept so they can override '*'.
+    """
+    codings = {}
+    for part in header.lower().split(','):
+        match = _CODING_RE.match(part)
+        if not match:
+            continue
+        try:
+            q = float(match.group(2)) if match.group(2) else 1.0
+        except ValueError:
+            continue
+        codings[match.group(1)] = q
+    return codings
+
+
+def choose_encoding(header):
+    """
+    Pick the response coding for an Accept-Encoding header
+
+    Args:
+        header: Accept-Encoding request header ('' if absent)
+
+    Returns:
+        'br', 'gzip' or None. Brotli wins ties; a client that ranks gzip
+        higher gets gzip.
+    """
+    codings = accepted_encodings(header)
+    wildcard = codings.get('*', 0)
+    candidates = []
+    if brotli is not None:
+        candidates.append(('br', codings.get('br', wildcard)))
+    candidates.append(('gzip', codings.get('gzip', codings.get('x-gzip', wildcard))))
+    name, q = max(candidates, key=lambda candidate: candidate[1])
+    return name if q > 0 else None
+
+
+def is_compressible(content_type):
+    """Whether a Content-Type header names a format worth compressing"""
+    media_type = content_type.split(';', 1)[0].strip().lower()
+    return (
+        media_type.startswith('text/')
+        or media_type in COMPRESSIBLE_TYPES
+        or media_type.endswith(('+json', '+xml'))
+    )
+
+
+def compress(content, encoding):
+    """Compress a whole body with 'br' or 'gzip'"""
+    if encoding == 'br':
+        return brotli.compress(content, mode=brotli.MODE_TEXT, quality=BROTLI_QUALITY)
+    return compress_string(content, max_random_bytes=GZIP_MAX_RANDOM_BYTES)
+
+
+def _brotli_sequence(sequence):
+    compressor = brotli.Compressor(mode=brotli.MODE_TEXT, quality=BROTLI_QUALITY)
+    pending = 0
+    for chunk in sequence:
+        data = compressor.process(chunk)
+        pending += len(chunk)
+        # Each brotli flush costs a few bytes, which outweighs tiny chunks
+        # (CSV rows), so output is flushed once enough input has gone in
+        if pending >= STREAM_FLUSH_SIZE:
+            data += compressor.flush()
+            pending = 0
+        if data:
+            yield data
+    yield compressor.finish()
+
+
+def compress_stream(sequence, encoding):
+    """Compress an iterable of byte chunks lazily, as it is sent"""
+    if encoding == 'br':
+        return _brotli_sequence(sequence)
+    return compress_sequence(sequence, max_random_bytes=GZIP_MAX_RANDOM_BYTES)
@@ -0,0 +1,68 @@
+"""
+Keyset (seek) pagination utility
+
+Pages newest-first lists by remembering the last row shown instead of an
+OFFSET, so every page is an indexed range scan no matter how deep the
+reader has scrolled.
+"""
+import datetime
+
+from django.db.models import Q
+
+# Largest value a 64-bit integer column (SQLite INTEGER, PostgreSQL bigint)
+# holds; bigger numbers make the database driver raise OverflowError
+MAX_DB_INT = 2 ** 63 - 1
+
+
+def bounded_int(value, minimum=0, maximum=MAX_DB_INT):
+    """Parse an integer query parameter; raises ValueError outside [minimum, maximum]"""
+    number = int(value)
+    if not minimum <= number <= maximum:
+        raise ValueError(f'{value} is out of range')
+    return number
+
+
+def encode_cursor(item, date_field=None):
+    if date_field is None:
+        return str(item.pk)
+    return f'{getattr(item, date_field).isoformat()}~{item.pk}'
+
+
+def decode_cursor(cursor, date_field=None):
+    if date_field is None:
+        return None, bounded_int(cursor)
+    date, pk = cursor.split('~')
+    return datetime.date.fromisoformat(date), bounded_int(pk)
+
+
+def paginate(queryset, cursor=None, per_page=10, date_field=None):
+    """
+    One page of a queryset, newest first
+
+    Args:
+        queryset: Rows to page through
+        cursor: Cursor returned with the previous page (None for the first)
+        per_page: Rows per page
+        date_field: Date field to order by, with pk breaking ties; None to
+            order by pk alone
+
+    Returns:
+        (items, next_cursor); next_cursor is None on the last page.
+        Raises ValueError for a malformed cursor.
+    """
+    if cursor:
+        date, pk = decode_cursor(cursor, date_field)
+        if date_field is None:
+            queryset = queryset.filter(pk__lt=pk)
+        else:
+            queryset = queryset.filter(
+                Q(**{f'{date_field}__lt': date}) | Q(**{date_field: date, 'pk__lt': pk})
+            )
+    ordering = ['-pk'] if date_field is None else [f'-{date_field}', '-pk']
+
+    # One extra row tells us whether another page follows
+    items = list(queryset.order_by(*ordering)[:per_page + 1])
+    if len(items) <= per_page:
+        return items, None
+    items = items[:per_page]
+    return items, encode_cursor(items[-1], date_field)
@@ -0,0 +1,154 @@
+"""
+Sampling profiler utility
+
+Profiles individual requests two ways at once: cProfile for per-function
+call counts and times, and a background thread that samples the request
+thread's Python stack every few milliseconds for flamegraphs. Results are
+aggregated per view in this process's memory and read back as pstats text
+or collapsed stacks (one "frame;frame;frame count" line per stack, the
+input format of flamegraph.pl and speedscope).
+"""
+import cProfile
+import io
+import os
+import pstats
+import sys
+import sysconfig
+import threading
+from collections import Counter
+
+DEFAULT_INTERVAL = 0.002
+MAX_STACKS_PER_VIEW = 5000
+OTHER_STACK = '[other]'
+
+# Longest prefixes first, so site-packages wins over the stdlib directory
+_PATH_PREFIXES = sorted({
+    os.path.join(path, '') for path in (
+        *sys.path, *sysconfig.get_paths().values(),
+    ) if path
+}, key=len, reverse=True)
+
+
+def _frame_label(code):
+    filename = code.co_filename
+    for prefix in _PATH_PREFIXES:
+        if filename.startswith(prefix):
+            filename = filename[len(prefix):]
+            break
+    return f'{filename}:{code.co_name}'.replace(' ', '_').replace(';', ':')
+
+
+class StackSampler:
+    """Count the stacks a thread is seen in while the sampler runs"""
+
+    def __init__(self, thread_id=None, interval=DEFAULT_INTERVAL):
+        self.thread_id = thread_id or threading.get_ident()
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            labels = []
+            while frame is not None:
+                labels.append(_frame_label(frame.f_code))
+                frame = frame.f_back
+            if labels:
+                self.stacks[';'.join(reversed(labels))] += 1
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+
+
+class ProfileStore:
+    """Per-view totals of profiled requests, safe to share between threads"""
+
+    def __init__(self, max_stacks=MAX_STACKS_PER_VIEW):
+        self.max_stacks = max_stacks
+        self._lock = threading.Lock()
+        self._views = {}
+
+    def add(self, view_name, profile, stacks):
+        """
+        Fold one profiled request into its view's totals
+
+        Args:
+            view_name: Name the results are grouped under
+            profile: Finished cProfile.Profile
+            stacks: Counter of collapsed stacks from a StackSampler
+        """
+        with self._lock:
+            entry = self._views.setdefault(view_name, {'requests': 0, 'stats': None, 'stacks': Counter()})
+            entry['requests'] += 1
+            if entry['stats'] is None:
+                entry['stats'] = pstats.Stats(profile)
+            else:
+                entry['stats'].add(profile)
+            for stack, count in stacks.items():
+                # Bound memory: once full, new stacks only add to one bucket
+                if stack in entry['stacks'] or len(entry['stacks']) < self.max_stacks:
+                    entry['stacks'][stack] += count
+                else:
+                    entry['stacks'][OTHER_STACK] += count
+
+    def summary(self):
+        """(view_name, requests, stack samples) for every profiled view, busiest first"""
+        with self._lock:
+            rows = [
+                (name, entry['requests'], sum(entry['stacks'].values()))
+                for name, entry in self._views.items()
+            ]
+        return sorted(rows, key=lambda row: -row[1])
+
+    def collapsed(self, view_name=None):
+        """Collapsed stacks for one view, or all views merged"""
+        with self._lock:
+            entries = [self._views[view_name]] if view_name in self._views else (
+                [] if view_name else list(self._views.values())
+            )
+            stacks = Counter()
+            for entry in entries:
+                stacks.update(entry['stacks'])
+        return ''.join(f'{stack} {count}\n' for stack, count in stacks.most_common())
+
+    def stats_text(self, view_name, sort='cumulative', limit=50):
+        """pstats report for one view ('' if it has not been profiled)"""
+        output = io.StringIO()
+        with self._lock:
+            entry = self._views.get(view_name)
+            if entry is None:
+                return ''
+            # Stats.print_stats writes to the stream it was given
+            stats = entry['stats']
+            stats.stream = output
+            stats.sort_stats(sort).print_stats(limit)
+            stats.stream = sys.stdout
+        return output.getvalue()
+
+    def reset(self):
+        with self._lock:
+            self._views.clear()
+
+
+def profile_call(fn, *args, interval=DEFAULT_INTERVAL, **kwargs):
+    """
+    Call fn under cProfile and the stack sampler
+
+    Returns:
+        (result, profile, stacks)
+    """
+    profile = cProfile.Profile()
+    with StackSampler(interval=interval) as sampler:
+        profile.enable()
+        try:
+            result = fn(*args, **kwargs)
+        finally:
+            profile.disable()
+    return result, profile, sampler.stacks
@@ -0,0 +1,85 @@
+"""
+Template warm-up utility
+
+With the cached template loader each worker parses a template the first
+time it is used and keeps the compiled version for the life of the process.
+Warming compiles every project template at startup instead, so the first
+visitors after a deploy don't pay for parsing, and a syntax error in any
+template fails the deploy rather than a page.
+"""
+import hashlib
+import os
+from functools import lru_cache
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.template import TemplateSyntaxError, engines
+
+
+def django_engine():
+    return engines['django'].engine
+
+
+def template_names(engine=None):
+    """Names of every .html template under the engine's DIRS, sorted"""
+    engine = engine or django_engine()
+    names = set()
+    for directory in engine.dirs:
+        for root, _, files in os.walk(directory):
+            for filename in files:
+                if filename.endswith('.html'):
+                    path = os.path.join(root, filename)
+                    names.add(os.path.relpath(path, directory).replace(os.sep, '/'))
+    return sorted(names)
+
+
+def warm_templates(engine=None):
+    """
+    Load (and so compile and cache) every project template
+
+    Args:
+        engine: Template engine to warm (default: the project's)
+
+    Returns:
+        (loaded, errors): number of templates compiled and a list of
+        (name, exception) for templates that failed to compile
+    """
+    engine = engine or django_engine()
+    loaded, errors = 0, []
+    for name in template_names(engine):
+        try:
+            engine.get_template(name)
+        except TemplateSyntaxError as exc:
+            errors.append((name, exc))
+        else:
+            loaded += 1
+    return loaded, errors
+
+
+@lru_cache(maxsize=1)
+def _deployed_version():
+    engine = django_engine()
+    digest = hashlib.md5(usedforsecurity=False)
+    for name in template_names(engine):
+        for directory in engine.dirs:
+            path = os.path.join(directory, name)
+            if os.path.isfile(path):
+                with open(path, 'rb') as f:
+                    digest.update(name.encode() + b'\0' + f.read())
+                break
+    # Fingerprinted static URLs rendered into fragments change with it
+    digest.update(getattr(staticfiles_storage, 'manifest_hash', '').encode())
+    return digest.hexdigest()[:12]
+
+
+def template_version():
+    """
+    Short digest of the project templates and static manifest
+
+    Used as a {% cache %} vary-on argument so fragments in a shared cache
+    are not served from the previous deploy's markup. Computed once per
+    process, or on every call under DEBUG where templates are edited live.
+    """
+    if settings.DEBUG:
+        _deployed_version.cache_clear()
+    return _deployed_version()
@@ -0,0 +1,87 @@
+"""
+WebP thumbnails for uploaded images
+
+Thumbnails are named after the content hash of their source file and
+kept in a thumbs/ folder inside the upload's top-level directory, so they
+are protected exactly like the originals (records/thumbs/...) and
+identical uploads share one thumbnail. They are generated on a small
+background thread pool after the upload is stored; until one exists,
+pages fall back to their placeholder icon.
+"""
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.gif', '.webp', '.bmp', '.tif', '.tiff')
+
+THUMBNAIL_DIR = 'thumbs'
+THUMBNAIL_SIZE = (320, 320)
+THUMBNAIL_QUALITY = 80
+
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='thumbnails')
+_pending = set()
+_pending_lock = threading.Lock()
+
+
+def is_image(name):
+    return name.lower().endswith(IMAGE_EXTENSIONS)
+
+
+def thumbnail_name(name, digest):
+    """Storage name of the thumbnail for a stored file"""
+    top = name.split('/', 1)[0] if '/' in name else ''
+    return '/'.join(filter(None, (top, THUMBNAIL_DIR, digest[:2], f'{digest}.webp')))
+
+
+def generate(source_path, target_path):
+    """
+    Write a downscaled WebP copy of an image
+
+    Args:
+        source_path: Image file on disk
+        target_path: Where to write the thumbnail
+
+    Returns:
+        True if the thumbnail was written, False if the source isn't an
+        image Pillow can read
+    """
+    try:
+        with Image.open(source_path) as image:
+            # Let JPEG decode at reduced size instead of full resolution
+            image.draft('RGB', THUMBNAIL_SIZE)
+            image = ImageOps.exif_transpose(image)
+            image.thumbnail(THUMBNAIL_SIZE)
+            if image.mode not in ('RGB', 'RGBA'):
+                image = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+            os.makedirs(os.path.dirname(target_path), exist_ok=True)
+            partial = f'{target_path}.{threading.get_ident()}.tmp'
+            image.save(partial, 'WEBP', quality=THUMBNAIL_QUALITY, method=4)
+    except (UnidentifiedImageError, OSError, Image.DecompressionBombError) as exc:
+        logger.warning('No thumbnail for %s: %s', source_path, exc)
+        return False
+    os.replace(partial, target_path)
+    return True
+
+
+def _run(source_path, target_path):
+    try:
+        generate(source_path, target_path)
+    except Exception:
+        logger.exception('Thumbnail generation failed for %s', source_path)
+    finally:
+        with _pending_lock:
+            _pending.discard(target_path)
+
+
+def schedule(source_path, target_path):
+    """Generate a thumbnail in the background unless it exists or is queued"""
+    with _pending_lock:
+        if target_path in _pending or os.path.exists(target_path):
+            return
+        _pending.add(target_path)
+    _executor.submit(_run, source_path, target_path)
@@ -0,0 +1,35 @@
+"""
+Timing instrumentation utility
+
+Logs how long a block took to the core.timing logger, one line per event
+with its outcome, so authentication load can be measured from the logs
+(e.g. login and registration times during the morning rush).
+"""
+import logging
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger('core.timing')
+
+
+@contextmanager
+def timed(event, **fields):
+    """
+    Time a block and log it when the block exits
+
+    Args:
+        event: Name of what is being timed (e.g. 'login')
+        **fields: Extra values to log; the block can add more to the
+            yielded dict (e.g. whether the login succeeded)
+    """
+    fields = dict(fields)
+    start = time.perf_counter()
+    try:
+        yield fields
+    finally:
+        duration_ms = (time.perf_counter() - start) * 1000
+        logger.info(
+            '%s %.1fms %s', event, duration_ms,
+            ' '.join(f'{key}={value}' for key, value in fields.items()),
+            extra={'event': event, 'duration_ms': duration_ms, 'fields': fields},
+        )
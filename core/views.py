@@ -2,27 +2,65 @@
 Views for Telemedicine Platform
 """
 from django.shortcuts import render, redirect, get_object_or_404
+from django.urls import reverse
 from django.contrib.auth import login, logout, authenticate
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.http import JsonResponse
-from django.views.decorators.http import require_POST
-from django.db.models import Q
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.contrib.staticfiles.views import serve as staticfiles_serve
+from django.templatetags.static import static
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import (
+    JsonResponse, HttpResponse, HttpResponseNotModified, FileResponse, Http404,
+    StreamingHttpResponse
+)
+from django.views.decorators.http import condition, require_POST
+from django.db.models import Q, Count, Max, Prefetch
 from django.utils import timezone
+from django.core.cache import cache
 from django.core.paginator import Paginator
+from django.utils._os import safe_join
+from django.utils.http import content_disposition_header, parse_etags, urlencode, http_date
+from django.views.static import was_modified_since
+from decimal import Decimal
+import datetime
+import hashlib
 import json
+import math
+import mimetypes
+import os
+import re
 
 from .models import (
-    PatientProfile, DoctorProfile, Hospital, Bed,
-    Appointment, Consultation, MedicalRecord, Prescription,
-    Notification, MobileClinic, ChatMessage
+    PatientProfile, DoctorProfile, Hospital, Facility, Bed,
+    BedChange, Appointment, Consultation, MedicalRecord, Prescription,
+    Notification, MobileClinic, ChatMessage, DirectoryVersion, DoctorStats, DoctorPatient
 )
 from .forms import (
     PatientRegistrationForm, DoctorRegistrationForm, LoginForm,
     AppointmentForm, PrescriptionForm, MedicalRecordForm,
     ProfileUpdateForm, DoctorProfileUpdateForm, ContactForm
 )
+from . import agenda, appointments, beds, maps, search, timeline
 from .utils.qr_generator import generate_qr_code
+from .utils.chatbot_kb import get_knowledge_base, normalize_query
+from .middleware import profile_store
+from .storage import content_digest
+from .utils import compression, keyset, thumbnails, timing
+from .utils.singleflight import SingleFlight
+from .templatetags.telemed_assets import load_font_bundle
+from .signals import DIRECTORY_ALL, DIRECTORY_HOSPITALS, DIRECTORY_CLINICS
+
+
+_doctor_lookups = SingleFlight()
+_map_lookups = SingleFlight()
+
+# Directory pages are keyed by ETag, so stale entries are never served
+DIRECTORY_CACHE_TIMEOUT = 300
+
+# Items per page (and per "load more") on record, prescription and patient lists
+LIST_PAGE_SIZE = 12
 
 
 # ==================== PUBLIC VIEWS ====================
@@ -79,22 +117,24 @@ def register_patient(request):
     if request.method == 'POST':
         form = PatientRegistrationForm(request.POST)
         if form.is_valid():
-            user = form.save(commit=False)
-            user.email = form.cleaned_data['email']
-            user.save()
-            
-            # Create patient profile
-            PatientProfile.objects.create(
-                user=user,
-                full_name=form.cleaned_data['full_name'],
-                phone=form.cleaned_data['phone'],
-                address=form.cleaned_data['address'],
-                date_of_birth=form.cleaned_data.get('date_of_birth'),
-                blood_group=form.cleaned_data.get('blood_group', ''),
-                emergency_contact=form.cleaned_data.get('emergency_contact', ''),
-            )
-            
-            login(request, user)
+            # Hashing the password is most of the cost
+            with timing.timed('register', role='patient'):
+                user = form.save(commit=False)
+                user.email = form.cleaned_data['email']
+                user.save()
+                
+                # Create patient profile
+                PatientProfile.objects.create(
+                    user=user,
+                    full_name=form.cleaned_data['full_name'],
+                    phone=form.cleaned_data['phone'],
+                    address=form.cleaned_data['address'],
+                    date_of_birth=form.cleaned_data.get('date_of_birth'),
+                    blood_group=form.cleaned_data.get('blood_group', ''),
+                    emergency_contact=form.cleaned_data.get('emergency_contact', ''),
+                )
+                
+                login(request, user)
             messages.success(request, 'Registration successful! Welcome to TeleMed.')
             return redirect('patient_dashboard')
     else:
@@ -111,26 +151,27 @@ def register_doctor(request):
     if request.method == 'POST':
         form = DoctorRegistrationForm(request.POST)
         if form.is_valid():
-            user = form.save(commit=False)
-            user.email = form.cleaned_data['email']
-            user.save()
-            
-            # Create doctor profile
-            DoctorProfile.objects.create(
-                user=user,
-                full_name=form.cleaned_data['full_name'],
-                phone=form.cleaned_data['phone'],
-                specialization=form.cleaned_data['specialization'],
-                qualification=form.cleaned_data['qualification'],
-                license_number=form.cleaned_data['license_number'],
-                experience_years=form.cleaned_data['experience_years'],
-                consultation_fee=form.cleaned_data['consultation_fee'],
-                hospital=form.cleaned_data.get('hospital'),
-                bio=form.cleaned_data.get('bio', ''),
-                is_verified=False,
-            )
-            
-            login(request, user)
+            with timing.timed('register', role='doctor'):
+                user = form.save(commit=False)
+                user.email = form.cleaned_data['email']
+                user.save()
+                
+                # Create doctor profile
+                DoctorProfile.objects.create(
+                    user=user,
+                    full_name=form.cleaned_data['full_name'],
+                    phone=form.cleaned_data['phone'],
+                    specialization=form.cleaned_data['specialization'],
+                    qualification=form.cleaned_data['qualification'],
+                    license_number=form.cleaned_data['license_number'],
+                    experience_years=form.cleaned_data['experience_years'],
+                    consultation_fee=form.cleaned_data['consultation_fee'],
+                    hospital=form.cleaned_data.get('hospital'),
+                    bio=form.cleaned_data.get('bio', ''),
+                    is_verified=False,
+                )
+                
+                login(request, user)
             messages.info(request, 'Registration successful! Your profile is pending verification.')
             return redirect('doctor_dashboard')
     else:
@@ -147,10 +188,13 @@ def user_login(request):
     if request.method == 'POST':
         username = request.POST.get('username')
         password = request.POST.get('password')
-        user = authenticate(request, username=username, password=password)
+        with timing.timed('login') as event:
+            user = authenticate(request, username=username, password=password)
+            if user is not None:
+                login(request, user)
+            event['ok'] = user is not None
         
         if user is not None:
-            login(request, user)
             return redirect('dashboard')
         else:
             messages.error(request, 'Invalid username or password.')
@@ -168,9 +212,9 @@ def user_logout(request):
 @login_required
 def dashboard(request):
     """Redirect to appropriate dashboard based on user type"""
-    if hasattr(request.user, 'doctor_profile'):
+    if request.role == 'doctor':
         return redirect('doctor_dashboard')
-    elif hasattr(request.user, 'patient_profile'):
+    elif request.role == 'patient':
         return redirect('patient_dashboard')
     else:
         return redirect('home')
@@ -181,26 +225,26 @@ def dashboard(request):
 @login_required
 def patient_dashboard(request):
     """Patient dashboard"""
-    if not hasattr(request.user, 'patient_profile'):
+    if request.role != 'patient':
         messages.error(request, 'Access denied. Patient account required.')
         return redirect('home')
     
-    patient = request.user.patient_profile
+    patient = request.profile
     upcoming_appointments = Appointment.objects.filter(
         patient=patient,
         scheduled_date__gte=timezone.now().date(),
         status__in=['pending', 'confirmed']
     ).order_by('scheduled_date', 'scheduled_time')[:5]
     
-    recent_records = MedicalRecord.objects.filter(patient=patient)[:5]
-    recent_prescriptions = Prescription.objects.filter(patient=patient)[:5]
     notifications = Notification.objects.filter(user=request.user, is_read=False)[:5]
     
+    # Records and prescriptions are listed by the timeline card, which pages
+    # through /api/timeline/; only their totals are needed here
     context = {
         'patient': patient,
         'upcoming_appointments': upcoming_appointments,
-        'recent_records': recent_records,
-        'recent_prescriptions': recent_prescriptions,
+        'record_count': MedicalRecord.objects.filter(patient=patient).count(),
+        'prescription_count': Prescription.objects.filter(patient=patient).count(),
         'notifications': notifications,
     }
     return render(request, 'patient/dashboard.html', context)
@@ -209,7 +253,7 @@ def patient_dashboard(request):
 @login_required
 def book_appointment(request):
     """Book new appointment"""
-    if not hasattr(request.user, 'patient_profile'):
+    if request.role != 'patient':
         messages.error(request, 'Access denied.')
         return redirect('home')
     
@@ -217,7 +261,7 @@ def book_appointment(request):
         form = AppointmentForm(request.POST)
         if form.is_valid():
             appointment = form.save(commit=False)
-            appointment.patient = request.user.patient_profile
+            appointment.patient_id = request.profile_id
             appointment.save()
             
             # Create notification for doctor
@@ -242,51 +286,93 @@ def book_appointment(request):
 @login_required
 def patient_appointments(request):
     """View patient appointments"""
-    if not hasattr(request.user, 'patient_profile'):
+    if request.role != 'patient':
         return redirect('home')
     
-    appointments = Appointment.objects.filter(patient=request.user.patient_profile)
+    appointments = Appointment.objects.filter(patient_id=request.profile_id)
     paginator = Paginator(appointments, 10)
     page = request.GET.get('page')
     appointments = paginator.get_page(page)
     
-    return render(request, 'patient/appointments.html', {'appointments': appointments})
+    context = {
+        'appointments': appointments,
+        'today': timezone.localdate(),
+    }
+    return render(request, 'patient/appointments.html', context)
+
+
+def _render_list_page(request, template, fragment_template, fragment, context):
+    """Render a keyset-paged list, or just its next items for 'load more'"""
+    if not fragment:
+        return render(request, template, context)
+    response = render(request, fragment_template, context)
+    response['X-Next-Cursor'] = context['next_cursor'] or ''
+    return response
 
 
 @login_required
-def patient_records(request):
+def patient_records(request, fragment=False):
     """View medical records"""
-    if not hasattr(request.user, 'patient_profile'):
+    if request.role != 'patient':
         return redirect('home')
     
-    records = MedicalRecord.objects.filter(patient=request.user.patient_profile)
-    return render(request, 'patient/records.html', {'records': records})
+    records = MedicalRecord.objects.filter(
+        patient_id=request.profile_id
+    ).select_related('doctor').only(
+        'record_id', 'diagnosis', 'treatment', 'visit_date', 'qr_code', 'doctor__full_name'
+    )
+    try:
+        records, next_cursor = keyset.paginate(
+            records, request.GET.get('cursor'), LIST_PAGE_SIZE, 'visit_date'
+        )
+    except ValueError:
+        return HttpResponse('Invalid cursor', status=400)
+    
+    context = {'records': records, 'next_cursor': next_cursor}
+    return _render_list_page(
+        request, 'patient/records.html', 'patient/_record_cards.html', fragment, context
+    )
 
 
 @login_required
-def patient_prescriptions(request):
+def patient_prescriptions(request, fragment=False):
     """View prescriptions"""
-    if not hasattr(request.user, 'patient_profile'):
+    if request.role != 'patient':
         return redirect('home')
     
-    prescriptions = Prescription.objects.filter(patient=request.user.patient_profile)
-    return render(request, 'patient/prescriptions.html', {'prescriptions': prescriptions})
+    prescriptions = Prescription.objects.filter(
+        patient_id=request.profile_id
+    ).select_related('doctor').only(
+        'prescription_id', 'medications', 'issue_date', 'valid_until', 'qr_code',
+        'doctor__full_name', 'doctor__specialization',
+    )
+    try:
+        prescriptions, next_cursor = keyset.paginate(
+            prescriptions, request.GET.get('cursor'), LIST_PAGE_SIZE, 'issue_date'
+        )
+    except ValueError:
+        return HttpResponse('Invalid cursor', status=400)
+    
+    context = {'prescriptions': prescriptions, 'next_cursor': next_cursor}
+    return _render_list_page(
+        request, 'patient/prescriptions.html', 'patient/_prescription_cards.html', fragment, context
+    )
 
 
 @login_required
 def patient_profile(request):
     """Update patient profile"""
-    if not hasattr(request.user, 'patient_profile'):
+    if request.role != 'patient':
         return redirect('home')
     
     if request.method == 'POST':
-        form = ProfileUpdateForm(request.POST, request.FILES, instance=request.user.patient_profile)
+        form = ProfileUpdateForm(request.POST, request.FILES, instance=request.profile)
         if form.is_valid():
             form.save()
             messages.success(request, 'Profile updated successfully!')
             return redirect('patient_profile')
     else:
-        form = ProfileUpdateForm(instance=request.user.patient_profile)
+        form = ProfileUpdateForm(instance=request.profile)
     
     return render(request, 'patient/profile.html', {'form': form})
 
@@ -294,11 +380,11 @@ def patient_profile(request):
 @login_required
 def consultation_room(request, appointment_id):
     """Consultation room for patient"""
-    if not hasattr(request.user, 'patient_profile'):
+    if request.role != 'patient':
         return redirect('home')
     
     appointment = get_object_or_404(
-        Appointment, id=appointment_id, patient=request.user.patient_profile
+        Appointment, id=appointment_id, patient_id=request.profile_id
     )
     
     consultation, created = Consultation.objects.get_or_create(appointment=appointment)
@@ -317,34 +403,27 @@ def consultation_room(request, appointment_id):
 @login_required
 def doctor_dashboard(request):
     """Doctor dashboard"""
-    if not hasattr(request.user, 'doctor_profile'):
+    if request.role != 'doctor':
         messages.error(request, 'Access denied. Doctor account required.')
         return redirect('home')
     
-    doctor = request.user.doctor_profile
-    today = timezone.now().date()
-    
-    todays_appointments = Appointment.objects.filter(
-        doctor=doctor,
-        scheduled_date=today,
-        status__in=['pending', 'confirmed', 'in_progress']
-    ).order_by('scheduled_time')
+    doctor = request.profile
     
-    pending_appointments = Appointment.objects.filter(
-        doctor=doctor, status='pending'
-    ).count()
+    # Today's queue comes precomputed from the cache
+    todays_appointments = agenda.with_wait_times(agenda.get(doctor.pk))
     
-    total_patients = Appointment.objects.filter(
-        doctor=doctor, status='completed'
-    ).values('patient').distinct().count()
+    # Counters are maintained incrementally instead of counted on every load
+    stats = DoctorStats.for_doctor(doctor)
     
     notifications = Notification.objects.filter(user=request.user, is_read=False)[:5]
     
     context = {
         'doctor': doctor,
         'todays_appointments': todays_appointments,
-        'pending_appointments': pending_appointments,
-        'total_patients': total_patients,
+        'next_patient': agenda.next_patient(todays_appointments),
+        'pending_appointments': stats.pending_count,
+        'total_patients': stats.patients_served,
+        'stats': stats,
         'notifications': notifications,
     }
     return render(request, 'doctor/dashboard.html', context)
@@ -353,11 +432,11 @@ def doctor_dashboard(request):
 @login_required
 def doctor_appointments(request):
     """View doctor appointments"""
-    if not hasattr(request.user, 'doctor_profile'):
+    if request.role != 'doctor':
         return redirect('home')
     
     status_filter = request.GET.get('status', '')
-    appointments = Appointment.objects.filter(doctor=request.user.doctor_profile)
+    appointments = Appointment.objects.filter(doctor_id=request.profile_id)
     
     if status_filter:
         appointments = appointments.filter(status=status_filter)
@@ -370,33 +449,43 @@ def doctor_appointments(request):
 
 
 @login_required
-def doctor_patients(request):
+def doctor_patients(request, fragment=False):
     """View doctor's patients"""
-    if not hasattr(request.user, 'doctor_profile'):
+    if request.role != 'doctor':
         return redirect('home')
     
-    patient_ids = Appointment.objects.filter(
-        doctor=request.user.doctor_profile
-    ).values_list('patient_id', flat=True).distinct()
+    # Newest first, from the doctor-patient pairs recorded at booking
+    links = DoctorPatient.objects.filter(
+        doctor_id=request.profile_id
+    ).select_related('patient').only(
+        'patient__full_name', 'patient__blood_group', 'patient__date_of_birth',
+        'patient__phone', 'patient__address',
+    )
+    try:
+        links, next_cursor = keyset.paginate(links, request.GET.get('cursor'), LIST_PAGE_SIZE)
+    except ValueError:
+        return HttpResponse('Invalid cursor', status=400)
     
-    patients = PatientProfile.objects.filter(id__in=patient_ids)
-    return render(request, 'doctor/patients.html', {'patients': patients})
+    context = {'patients': [link.patient for link in links], 'next_cursor': next_cursor}
+    return _render_list_page(
+        request, 'doctor/patients.html', 'doctor/_patient_cards.html', fragment, context
+    )
 
 
 @login_required
 def doctor_profile(request):
     """Update doctor profile"""
-    if not hasattr(request.user, 'doctor_profile'):
+    if request.role != 'doctor':
         return redirect('home')
     
     if request.method == 'POST':
-        form = DoctorProfileUpdateForm(request.POST, request.FILES, instance=request.user.doctor_profile)
+        form = DoctorProfileUpdateForm(request.POST, request.FILES, instance=request.profile)
         if form.is_valid():
             form.save()
             messages.success(request, 'Profile updated successfully!')
             return redirect('doctor_profile')
     else:
-        form = DoctorProfileUpdateForm(instance=request.user.doctor_profile)
+        form = DoctorProfileUpdateForm(instance=request.profile)
     
     return render(request, 'doctor/profile.html', {'form': form})
 
@@ -404,48 +493,64 @@ def doctor_profile(request):
 @login_required
 def update_appointment_status(request, appointment_id):
     """Update appointment status (doctor only)"""
-    if not hasattr(request.user, 'doctor_profile'):
+    if request.role != 'doctor':
         return JsonResponse({'error': 'Access denied'}, status=403)
     
     appointment = get_object_or_404(
-        Appointment, id=appointment_id, doctor=request.user.doctor_profile
+        Appointment, id=appointment_id, doctor_id=request.profile_id
     )
     
     if request.method == 'POST':
         status = request.POST.get('status')
-        if status in ['confirmed', 'in_progress', 'completed', 'cancelled']:
-            appointment.status = status
-            appointment.save()
-            
-            # Notify patient
-            Notification.objects.create(
-                user=appointment.patient.user,
-                notification_type='appointment',
-                title='Appointment Update',
-                message=f'Your appointment ({appointment.booking_id}) has been {status}.',
-                link=f'/patient/appointments/'
-            )
-            
+        try:
+            appointments.transition(appointment, status, notify=True)
+        except appointments.InvalidTransition as e:
+            messages.error(request, str(e))
+        else:
             messages.success(request, f'Appointment {status} successfully!')
     
     return redirect('doctor_appointments')
 
 
+@login_required
+@require_POST
+def cancel_day_appointments(request):
+    """Cancel all of the doctor's open appointments on one day (doctor only)"""
+    if request.role != 'doctor':
+        return redirect('home')
+    
+    try:
+        day = datetime.date.fromisoformat(request.POST.get('date', ''))
+    except ValueError:
+        messages.error(request, 'Please choose a valid date.')
+        return redirect('doctor_appointments')
+    
+    cancelled = appointments.bulk_transition(
+        Appointment.objects.filter(
+            doctor_id=request.profile_id, scheduled_date=day,
+            status__in=['pending', 'confirmed'],
+        ),
+        'cancelled',
+    )
+    messages.success(request, f'{cancelled} appointment(s) on {day:%d %b %Y} cancelled.')
+    return redirect('doctor_appointments')
+
+
 @login_required
 def create_prescription(request, appointment_id):
     """Create prescription for an appointment"""
-    if not hasattr(request.user, 'doctor_profile'):
+    if request.role != 'doctor':
         return redirect('home')
     
     appointment = get_object_or_404(
-        Appointment, id=appointment_id, doctor=request.user.doctor_profile
+        Appointment, id=appointment_id, doctor_id=request.profile_id
     )
     
     if request.method == 'POST':
         form = PrescriptionForm(request.POST)
         if form.is_valid():
             prescription = form.save(commit=False)
-            prescription.doctor = request.user.doctor_profile
+            prescription.doctor_id = request.profile_id
             prescription.patient = appointment.patient
             prescription.appointment = appointment
             prescription.save()
@@ -465,19 +570,23 @@ def create_prescription(request, appointment_id):
 @login_required
 def doctor_consultation(request, appointment_id):
     """Doctor consultation room"""
-    if not hasattr(request.user, 'doctor_profile'):
+    if request.role != 'doctor':
         return redirect('home')
     
     appointment = get_object_or_404(
-        Appointment, id=appointment_id, doctor=request.user.doctor_profile
+        Appointment, id=appointment_id, doctor_id=request.profile_id
     )
     
+    if appointment.status == 'cancelled':
+        messages.error(request, 'This appointment was cancelled.')
+        return redirect('doctor_appointments')
+    if appointments.can_transition(appointment.status, 'in_progress'):
+        try:
+            appointments.transition(appointment, 'in_progress')
+        except appointments.InvalidTransition as e:
+            messages.error(request, str(e))
+            return redirect('doctor_appointments')
     consultation, created = Consultation.objects.get_or_create(appointment=appointment)
-    if created:
-        consultation.started_at = timezone.now()
-        consultation.save()
-        appointment.status = 'in_progress'
-        appointment.save()
     
     chat_messages = ChatMessage.objects.filter(consultation=consultation)
     
@@ -495,24 +604,20 @@ def end_consultation(request, appointment_id):
     appointment = get_object_or_404(Appointment, id=appointment_id)
     
     # Verify user is either the doctor or patient
-    is_doctor = hasattr(request.user, 'doctor_profile') and appointment.doctor == request.user.doctor_profile
-    is_patient = hasattr(request.user, 'patient_profile') and appointment.patient == request.user.patient_profile
+    is_doctor = request.role == 'doctor' and appointment.doctor_id == request.profile_id
+    is_patient = request.role == 'patient' and appointment.patient_id == request.profile_id
     
     if not (is_doctor or is_patient):
         messages.error(request, 'Access denied.')
         return redirect('home')
     
-    # Mark appointment as completed
-    appointment.status = 'completed'
-    appointment.save()
-    
-    # Update consultation end time
-    try:
-        consultation = appointment.consultation
-        consultation.ended_at = timezone.now()
-        consultation.save()
-    except:
-        pass
+    # Mark appointment as completed; also stamps the consultation end time
+    if appointment.status != 'completed':
+        try:
+            appointments.transition(appointment, 'completed')
+        except appointments.InvalidTransition as e:
+            messages.error(request, str(e))
+            return redirect('doctor_appointments' if is_doctor else 'patient_appointments')
     
     messages.success(request, 'Consultation ended successfully.')
     
@@ -524,31 +629,70 @@ def end_consultation(request, appointment_id):
 
 # ==================== HOSPITAL & LOCATION VIEWS ====================
 
+def _hospitals_for_facilities(request):
+    """Active hospitals filtered by ?facility=<slug> (all must match)"""
+    selected = [slug for slug in request.GET.getlist('facility') if slug]
+    hospitals = Hospital.with_facilities(selected, Hospital.objects.filter(is_active=True))
+    hospitals = hospitals.annotate(
+        available_beds=Count('beds', filter=Bed.free_filter('beds__'), distinct=True),
+        total_beds=Count('beds', distinct=True),
+    ).prefetch_related('facilities').order_by('name')
+    return hospitals, selected
+
+
 def find_hospitals(request):
     """Find nearby hospitals with map"""
-    hospitals = Hospital.objects.filter(is_active=True)
+    hospitals, selected_facilities = _hospitals_for_facilities(request)
     
-    hospitals_data = [{
+    # Map markers are fetched per viewport from map_markers
+    marker_url = reverse('map_markers', args=['hospitals'])
+    if selected_facilities:
+        marker_url += '?' + urlencode([('facility', slug) for slug in selected_facilities])
+    
+    context = {
+        'hospitals': hospitals,
+        'facilities': Facility.objects.all(),
+        'selected_facilities': selected_facilities,
+        'marker_url': marker_url,
+        'google_maps_api_key': settings.GOOGLE_MAPS_API_KEY,
+    }
+    return render(request, 'find_hospitals.html', context)
+
+
+def hospitals_by_facility(request):
+    """API: hospitals offering every requested facility, nearest first if lat/lng given"""
+    hospitals, selected_facilities = _hospitals_for_facilities(request)
+    
+    data = [{
         'id': h.id,
         'name': h.name,
         'address': h.address,
         'lat': h.latitude,
         'lng': h.longitude,
         'phone': h.phone,
-        'available_beds': h.available_beds_count,
-        'total_beds': h.total_beds_count,
+        'available_beds': h.available_beds,
+        'facilities': [f.name for f in h.facilities.all()],
     } for h in hospitals]
     
-    context = {
-        'hospitals': hospitals,
-        'hospitals_json': json.dumps(hospitals_data),
-    }
-    return render(request, 'find_hospitals.html', context)
+    try:
+        lat, lng = float(request.GET['lat']), float(request.GET['lng'])
+    except (KeyError, ValueError):
+        pass
+    else:
+        # Equirectangular distance is plenty for ranking nearby hospitals
+        scale = math.cos(math.radians(lat))
+        for h in data:
+            h['distance_km'] = round(111.32 * math.hypot(
+                h['lat'] - lat, (h['lng'] - lng) * scale
+            ), 1)
+        data.sort(key=lambda h: h['distance_km'])
+    
+    return JsonResponse({'facilities': selected_facilities, 'hospitals': data})
 
 
 def hospital_detail(request, hospital_id):
     """Hospital detail page"""
-    hospital = get_object_or_404(Hospital, id=hospital_id)
+    hospital = get_object_or_404(Hospital.objects.prefetch_related('facilities'), id=hospital_id)
     beds = hospital.beds.all()
     doctors = hospital.doctors.filter(is_verified=True)
     
@@ -556,17 +700,25 @@ def hospital_detail(request, hospital_id):
         'hospital': hospital,
         'beds': beds,
         'doctors': doctors,
+        'facilities': hospital.facilities.all(),
     }
     return render(request, 'hospital_detail.html', context)
 
 
 def bed_availability(request):
     """View bed availability across hospitals"""
-    hospitals = Hospital.objects.filter(is_active=True).prefetch_related('beds')
+    # Ordered by ward so the template's regroup sees each ward once
+    hospitals = Hospital.objects.filter(is_active=True).annotate(
+        available_beds=Count('beds', filter=Bed.free_filter('beds__'), distinct=True),
+    ).prefetch_related(
+        Prefetch('beds', queryset=Bed.objects.order_by('ward_type', 'bed_number'))
+    )
     
     ward_filter = request.GET.get('ward', '')
     if ward_filter:
-        hospitals = hospitals.filter(beds__ward_type=ward_filter, beds__is_available=True).distinct()
+        hospitals = hospitals.filter(
+            pk__in=Bed.objects.filter(Bed.free_filter(), ward_type=ward_filter).values('hospital_id')
+        )
     
     context = {
         'hospitals': hospitals,
@@ -576,6 +728,53 @@ def bed_availability(request):
     return render(request, 'bed_availability.html', context)
 
 
+BED_SNAPSHOT_CACHE_TIMEOUT = 300
+
+
+def bed_snapshot(request):
+    """API: per-hospital, per-ward bed availability; ?since=<version> for changes only"""
+    try:
+        since = keyset.bounded_int(request.GET['since']) if request.GET.get('since') else None
+    except ValueError:
+        return JsonResponse({'error': 'Invalid since version'}, status=400)
+    
+    version = BedChange.latest_version()
+    # Holds that lapse change the counts without a new version; the
+    # expire_bed_holds command logs them later
+    lapsed = beds.lapsed_hold_hospitals()
+    lapsed_key = ','.join(map(str, sorted(lapsed)))
+    state = '%d-%s' % (version, hashlib.md5(lapsed_key.encode()).hexdigest()[:8] if lapsed else '0')
+    etag = 'W/"beds-%s-%s"' % (state, 'full' if since is None else since)
+    if etag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', '')):
+        response = HttpResponseNotModified()
+        response['ETag'] = etag
+        return response
+    
+    delta = beds.changes_since(since, version, lapsed) if since is not None else None
+    if delta is not None:
+        hospitals, removed = delta
+        data = {
+            'version': version, 'full': False, 'ward_fields': beds.WARD_FIELDS,
+            'hospitals': hospitals, 'removed': removed,
+        }
+    else:
+        # Full snapshots are shared by every poller at this version
+        cache_key = f'bed_snapshot:{state}'
+        data = cache.get(cache_key)
+        if data is None:
+            data = {
+                'version': version, 'full': True, 'ward_fields': beds.WARD_FIELDS,
+                'hospitals': beds.snapshot(), 'removed': [],
+            }
+            cache.set(cache_key, data, BED_SNAPSHOT_CACHE_TIMEOUT)
+    
+    response = JsonResponse(data, json_dumps_params={'separators': (',', ':')})
+    response['ETag'] = etag
+    response['Cache-Control'] = 'no-cache'
+    return response
+
+
+
 def mobile_clinics(request):
     """View mobile clinic schedules"""
     clinics = MobileClinic.objects.filter(
@@ -583,70 +782,139 @@ def mobile_clinics(request):
         is_active=True
     )
     
-    clinics_data = [{
-        'id': c.id,
-        'name': c.name,
-        'location': c.location,
-        'lat': c.latitude,
-        'lng': c.longitude,
-        'date': str(c.scheduled_date),
-        'start_time': str(c.start_time),
-        'end_time': str(c.end_time),
-        'services': c.services,
-    } for c in clinics]
-    
     context = {
         'clinics': clinics,
-        'clinics_json': json.dumps(clinics_data),
+        'marker_url': reverse('map_markers', args=['clinics']),
+        'google_maps_api_key': settings.GOOGLE_MAPS_API_KEY,
     }
     return render(request, 'mobile_clinics.html', context)
 
 
+def _parse_hold_request(request):
+    """Validate a bed hold request body; raises ValueError on bad input"""
+    data = json.loads(request.body)
+    hospital_id = int(data['hospital'])
+    ward_type = data['ward_type']
+    if ward_type not in dict(Bed.WARD_TYPES):
+        raise ValueError('Unknown ward type')
+    minutes = int(data.get('minutes', beds.DEFAULT_HOLD_MINUTES))
+    if not 1 <= minutes <= beds.MAX_HOLD_MINUTES:
+        raise ValueError('Hold length out of range')
+    return hospital_id, ward_type, minutes
+
+
+@login_required
+@require_POST
+def hold_bed(request):
+    """API: reserve the first free bed of a ward type at a hospital for a limited time"""
+    if not request.user.is_staff:
+        return JsonResponse({'error': 'Access denied'}, status=403)
+    try:
+        hospital_id, ward_type, minutes = _parse_hold_request(request)
+    except (KeyError, TypeError, ValueError):
+        return JsonResponse({'error': 'Invalid hold request'}, status=400)
+    
+    bed = beds.claim_bed(hospital_id, ward_type, user=request.user, minutes=minutes)
+    if bed is None:
+        return JsonResponse({'error': 'No free bed in this ward'}, status=409)
+    
+    return JsonResponse({
+        'bed_id': bed.id,
+        'hospital_id': bed.hospital_id,
+        'bed_number': bed.bed_number,
+        'ward_type': bed.ward_type,
+        'hold_token': str(bed.hold_token),
+        'held_until': bed.held_until.isoformat(),
+    }, status=201)
+
+
+@login_required
+@require_POST
+def end_bed_hold(request, token, action):
+    """API: confirm (admit) or release a bed hold"""
+    if not request.user.is_staff:
+        return JsonResponse({'error': 'Access denied'}, status=403)
+    if action == 'confirm':
+        ended = beds.confirm_hold(token)
+    else:
+        ended = beds.release_hold(token)
+    if not ended:
+        return JsonResponse({'error': 'Hold not found or expired'}, status=410)
+    return JsonResponse({'success': True})
+
+
+# Map API path segment -> (marker kind, DirectoryVersion scope)
+MAP_KINDS = {
+    'hospitals': ('hospital', DIRECTORY_HOSPITALS),
+    'clinics': ('clinic', DIRECTORY_CLINICS),
+}
+MAP_CACHE_TIMEOUT = 300
+
+
+def _fetch_map_markers(kind, bbox, zoom, facilities):
+    queryset = maps.marker_queryset(kind)
+    if facilities:
+        queryset = queryset.filter(pk__in=Hospital.with_facilities(facilities).values('pk'))
+    return maps.markers_in_viewport(kind, bbox, zoom, queryset)
+
+
+def map_markers(request, kind):
+    """API: compact marker batch for a map viewport, clustered when zoomed out"""
+    if kind not in MAP_KINDS:
+        raise Http404('Unknown map')
+    kind, scope = MAP_KINDS[kind]
+    try:
+        bbox, zoom = maps.parse_viewport(request.GET)
+    except (KeyError, ValueError):
+        return JsonResponse({'error': 'Invalid bbox or zoom'}, status=400)
+    facilities = []
+    if kind == 'hospital':
+        facilities = sorted({slug for slug in request.GET.getlist('facility') if slug})
+    
+    # Clinics drop off the map once their date passes, so the day is part of the key
+    version, = DirectoryVersion.current(scope)
+    params = urlencode(
+        [('bbox', ','.join(map(str, bbox))), ('zoom', zoom), ('day', timezone.now().date())]
+        + [('facility', slug) for slug in facilities]
+    )
+    digest = hashlib.md5(params.encode(), usedforsecurity=False).hexdigest()[:12]
+    etag = 'W/"map-%s-%d-%s"' % (kind, version, digest)
+    
+    if etag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', '')):
+        response = HttpResponseNotModified()
+        response['ETag'] = etag
+        return response
+    
+    cache_key = f'map_markers:{etag}'
+    data = cache.get(cache_key)
+    if data is None:
+        data = _map_lookups.do(cache_key, _fetch_map_markers, kind, bbox, zoom, facilities)
+        cache.set(cache_key, data, MAP_CACHE_TIMEOUT)
+    
+    response = JsonResponse(data, json_dumps_params={'separators': (',', ':')})
+    response['ETag'] = etag
+    response['Cache-Control'] = 'public, max-age=60'
+    return response
+
+
 # ==================== CHATBOT API ====================
 
 @require_POST
 def chatbot_response(request):
     """Handle chatbot messages"""
     data = json.loads(request.body)
-    message = data.get('message', '').lower()
-    
-    # Simple rule-based responses
-    responses = {
-        'symptoms': get_symptom_response(message),
-        'appointment': "To book an appointment, please visit our 'Book Appointment' page or log in to your account. Would you like me to guide you there?",
-        'emergency': "🚨 For emergencies, please call 108 (Ambulance) or 112 (Emergency). You can also use our 'Find Hospitals' feature to locate the nearest hospital.",
-        'doctor': "We have qualified doctors across various specializations. You can browse our doctors on the 'Find Doctors' page and book a consultation.",
-        'bed': "You can check real-time bed availability on our 'Bed Availability' page. Would you like me to help you find a bed?",
-        'mobile clinic': "Mobile clinics bring healthcare to your village. Check the schedule on our 'Mobile Clinics' page to find one near you.",
-        'prescription': "Your prescriptions are available in your patient dashboard. Each prescription has a QR code for easy sharing with pharmacies.",
-        'record': "Your medical records are securely stored in your dashboard. You can view, download, or share them via QR code.",
-    }
-    
-    response = "Hello! I'm C_Bot, your healthcare assistant. How can I help you today? You can ask me about appointments, symptoms, finding hospitals, bed availability, or mobile clinics."
+    message = data.get('message', '')
     
-    for key, value in responses.items():
-        if key in message:
-            response = value
-            break
+    # Rule-based responses served from the data-driven knowledge base
+    kb = get_knowledge_base()
+    response = kb.respond(message)
     
-    return JsonResponse({'response': response})
+    return JsonResponse({'response': response, 'kb_version': kb.version})
 
 
 def get_symptom_response(message):
     """Get response based on symptoms mentioned"""
-    symptom_advice = {
-        'fever': "For fever, rest well, stay hydrated, and monitor your temperature. If it persists beyond 3 days or exceeds 103°F, please consult a doctor.",
-        'headache': "For headaches, try resting in a quiet, dark room. Stay hydrated and avoid screens. If headaches are severe or frequent, please book a consultation.",
-        'cold': "For cold symptoms, get plenty of rest, drink warm fluids, and try steam inhalation. If symptoms worsen, consider booking an appointment.",
-        'cough': "For cough, try warm water with honey, stay hydrated, and avoid irritants. If cough persists beyond 2 weeks or you have difficulty breathing, seek medical attention.",
-        'stomach': "For stomach issues, stay hydrated, eat light foods, and avoid spicy or oily meals. If symptoms persist, please consult a doctor.",
-    }
-    
-    for symptom, advice in symptom_advice.items():
-        if symptom in message:
-            return advice
-    
-    return "I understand you're experiencing some symptoms. For accurate diagnosis, I recommend booking a consultation with one of our doctors. Shall I help you book an appointment?"
+    return get_knowledge_base().symptom_response(normalize_query(message))
 
 
 # ==================== API ENDPOINTS ====================
@@ -661,7 +929,7 @@ def send_chat_message(request):
         
         consultation = get_object_or_404(Consultation, id=consultation_id)
         
-        is_doctor = hasattr(request.user, 'doctor_profile')
+        is_doctor = request.role == 'doctor'
         
         message = ChatMessage.objects.create(
             consultation=consultation,
@@ -683,9 +951,30 @@ def send_chat_message(request):
     return JsonResponse({'error': 'Invalid request'}, status=400)
 
 
+def _chat_state(request, consultation_id):
+    """Message count, newest id and newest timestamp of a chat, one query per request"""
+    state = getattr(request, '_chat_state', None)
+    if state is None:
+        state = request._chat_state = ChatMessage.objects.filter(
+            consultation_id=consultation_id
+        ).aggregate(count=Count('id'), latest_id=Max('id'), latest=Max('timestamp'))
+    return state
+
+
+def _chat_etag(request, consultation_id):
+    # Messages are only ever added, so count and newest id identify the list
+    state = _chat_state(request, consultation_id)
+    return f'chat-{consultation_id}-{state["count"]}-{state["latest_id"] or 0}'
+
+
+def _chat_last_modified(request, consultation_id):
+    return _chat_state(request, consultation_id)['latest']
+
+
 @login_required
+@condition(etag_func=_chat_etag, last_modified_func=_chat_last_modified)
 def get_chat_messages(request, consultation_id):
-    """Get chat messages for consultation"""
+    """Get chat messages for consultation; polls answer 304 until a message arrives"""
     consultation = get_object_or_404(Consultation, id=consultation_id)
     messages_list = ChatMessage.objects.filter(consultation=consultation)
     
@@ -696,7 +985,9 @@ def get_chat_messages(request, consultation_id):
         'timestamp': m.timestamp.strftime('%H:%M'),
     } for m in messages_list]
     
-    return JsonResponse({'messages': data})
+    response = JsonResponse({'messages': data})
+    response['Cache-Control'] = 'private, no-cache'
+    return response
 
 
 @login_required
@@ -708,27 +999,174 @@ def mark_notification_read(request, notification_id):
     return JsonResponse({'success': True})
 
 
-def get_doctors_by_specialization(request):
-    """API to get doctors by specialization"""
-    specialization = request.GET.get('specialization', '')
-    
+DIRECTORY_PAGE_SIZE = 50
+DIRECTORY_MAX_PAGE_SIZE = 100
+DIRECTORY_FIELDS = (
+    'id', 'full_name', 'specialization', 'hospital_id', 'hospital__name',
+    'consultation_fee', 'experience_years',
+)
+
+
+def _parse_directory_filters(params):
+    """Validate directory query parameters; raises ValueError on bad input"""
+    filters = {
+        'specialization': params.get('specialization', ''),
+        'hospital': params.get('hospital', ''),
+        'min_fee': params.get('min_fee', ''),
+        'max_fee': params.get('max_fee', ''),
+        'min_experience': params.get('min_experience', ''),
+        'cursor': params.get('cursor', ''),
+        'limit': params.get('limit', ''),
+    }
+    if filters['specialization'] and filters['specialization'] not in dict(DoctorProfile.SPECIALIZATIONS):
+        raise ValueError('Unknown specialization')
+    for key in ('hospital', 'min_experience', 'cursor'):
+        if filters[key]:
+            filters[key] = keyset.bounded_int(filters[key])
+    for key in ('min_fee', 'max_fee'):
+        if filters[key]:
+            filters[key] = Decimal(filters[key])
+            # Decimal() also parses NaN and Infinity, which the ORM rejects
+            if not filters[key].is_finite() or filters[key] < 0:
+                raise ValueError(f'Invalid {key}')
+    limit = int(filters['limit']) if filters['limit'] else DIRECTORY_PAGE_SIZE
+    filters['limit'] = max(1, min(limit, DIRECTORY_MAX_PAGE_SIZE))
+    return filters
+
+
+def _fetch_doctors(filters):
+    """Fetch one keyset page of verified, available doctors"""
     doctors = DoctorProfile.objects.filter(
         is_verified=True, is_available=True
     )
     
-    if specialization:
-        doctors = doctors.filter(specialization=specialization)
-    
+    if filters['specialization']:
+        doctors = doctors.filter(specialization=filters['specialization'])
+    if filters['hospital']:
+        doctors = doctors.filter(hospital_id=filters['hospital'])
+    if filters['min_fee'] != '':
+        doctors = doctors.filter(consultation_fee__gte=filters['min_fee'])
+    if filters['max_fee'] != '':
+        doctors = doctors.filter(consultation_fee__lte=filters['max_fee'])
+    if filters['min_experience'] != '':
+        doctors = doctors.filter(experience_years__gte=filters['min_experience'])
+    if filters['cursor']:
+        doctors = doctors.filter(id__gt=filters['cursor'])
+    
+    # One extra row tells us whether another page exists
+    limit = filters['limit']
+    rows = list(doctors.order_by('id').values(*DIRECTORY_FIELDS)[:limit + 1])
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    
+    specializations = dict(DoctorProfile.SPECIALIZATIONS)
     data = [{
-        'id': d.id,
-        'name': d.full_name,
-        'specialization': d.get_specialization_display(),
-        'hospital': d.hospital.name if d.hospital else 'Independent',
-        'fee': str(d.consultation_fee),
-        'experience': d.experience_years,
-    } for d in doctors]
+        'id': d['id'],
+        'name': d['full_name'],
+        'specialization': specializations.get(d['specialization'], d['specialization']),
+        'hospital': d['hospital__name'] or 'Independent',
+        'hospital_id': d['hospital_id'],
+        'fee': str(d['consultation_fee']),
+        'experience': d['experience_years'],
+    } for d in rows]
+    
+    return {
+        'doctors': data,
+        'next_cursor': rows[-1]['id'] if has_more else None,
+    }
+
+
+def get_doctors_by_specialization(request):
+    """Doctor directory API with filters, keyset pagination and ETags"""
+    try:
+        filters = _parse_directory_filters(request.GET)
+    except (ValueError, ArithmeticError):
+        return JsonResponse({'error': 'Invalid filter parameters'}, status=400)
+    
+    # The ETag only changes when a doctor in this specialization (or any
+    # hospital name) changes, so unchanged pages revalidate with a 304
+    versions = DirectoryVersion.current(
+        DIRECTORY_HOSPITALS, filters['specialization'] or DIRECTORY_ALL
+    )
+    params = urlencode(sorted((k, str(v)) for k, v in filters.items()))
+    digest = hashlib.md5(params.encode(), usedforsecurity=False).hexdigest()[:12]
+    etag = 'W/"dir-%d-%d-%s"' % (versions[0], versions[1], digest)
+    
+    if etag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', '')):
+        response = HttpResponseNotModified()
+        response['ETag'] = etag
+        return response
     
-    return JsonResponse({'doctors': data})
+    # Pages are cached by ETag; identical concurrent misses share one query
+    cache_key = f'doctor_directory:{etag}'
+    data = cache.get(cache_key)
+    if data is None:
+        data = _doctor_lookups.do(cache_key, _fetch_doctors, filters)
+        cache.set(cache_key, data, DIRECTORY_CACHE_TIMEOUT)
+    
+    response = JsonResponse(data)
+    response['ETag'] = etag
+    response['Cache-Control'] = 'public, no-cache'
+    return response
+
+
+SEARCH_LIMIT = 20
+
+
+def search_api(request):
+    """Ranked full-text search over doctors, hospitals and the user's records"""
+    query = request.GET.get('q', '').strip()
+    kinds = request.GET.getlist('type') or ['doctor', 'hospital', 'record']
+    try:
+        limit = max(1, min(int(request.GET.get('limit', SEARCH_LIMIT)), SEARCH_LIMIT))
+    except ValueError:
+        limit = SEARCH_LIMIT
+    
+    results = {}
+    if not query:
+        return JsonResponse({'query': query, 'results': results})
+    
+    if 'doctor' in kinds:
+        doctors = search.search(
+            'doctor', query, limit=limit,
+            queryset=DoctorProfile.objects.filter(is_verified=True, is_available=True),
+        )
+        results['doctors'] = [{
+            'id': d.id,
+            'name': d.full_name,
+            'specialization': d.get_specialization_display(),
+            'qualification': d.qualification,
+        } for d in doctors]
+    
+    if 'hospital' in kinds:
+        hospitals = search.search(
+            'hospital', query, limit=limit,
+            queryset=Hospital.objects.filter(is_active=True),
+        )
+        results['hospitals'] = [{
+            'id': h.id,
+            'name': h.name,
+            'address': h.address,
+            'url': reverse('hospital_detail', args=[h.id]),
+        } for h in hospitals]
+    
+    # Medical records are private: only the patient's own, or those the doctor wrote
+    if 'record' in kinds and request.user.is_authenticated:
+        if request.role == 'patient':
+            records = MedicalRecord.objects.filter(patient_id=request.profile_id)
+        elif request.role == 'doctor':
+            records = MedicalRecord.objects.filter(doctor_id=request.profile_id)
+        else:
+            records = None
+        if records is not None:
+            results['records'] = [{
+                'record_id': r.record_id,
+                'diagnosis': r.diagnosis,
+                'visit_date': str(r.visit_date),
+                'url': reverse('view_record_qr', args=[r.record_id]),
+            } for r in search.search('record', query, limit=limit, queryset=records)]
+    
+    return JsonResponse({'query': query, 'results': results})
 
 
 def view_record_qr(request, record_id):
@@ -741,3 +1179,373 @@ def view_prescription_qr(request, prescription_id):
     """View prescription via QR code"""
     prescription = get_object_or_404(Prescription, prescription_id=prescription_id)
     return render(request, 'view_prescription.html', {'prescription': prescription})
+
+
+def _queue_entry(entry):
+    return {
+        'booking_id': entry['booking_id'],
+        'status': entry['status'],
+        'position': entry['position'],
+        'scheduled_time': entry['scheduled_time'].strftime('%H:%M'),
+        'expected_start': timezone.localtime(entry['expected_start']).isoformat(),
+        'wait_minutes': entry['wait_minutes'],
+    }
+
+
+@login_required
+def doctor_agenda(request):
+    """API: the doctor's queue for today with the next patient and wait estimates"""
+    if request.role != 'doctor':
+        return JsonResponse({'error': 'Access denied'}, status=403)
+    
+    day = agenda.get(request.profile_id)
+    entries = agenda.with_wait_times(day)
+    upcoming = agenda.next_patient(entries)
+    data = {
+        'date': day['date'].isoformat(),
+        'consultation_minutes': day['consultation_minutes'],
+        'next_patient': upcoming and upcoming['id'],
+        'queue': [
+            {**_queue_entry(entry), 'id': entry['id'], 'patient': entry['patient_name'],
+             'appointment_type': entry['appointment_type']}
+            for entry in entries
+        ],
+    }
+    response = JsonResponse(data, json_dumps_params={'separators': (',', ':')})
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+@login_required
+def queue_position(request, appointment_id):
+    """API: a patient's place in today's queue for one of their appointments"""
+    if request.role != 'patient':
+        return JsonResponse({'error': 'Access denied'}, status=403)
+    
+    day, entries = agenda.locate(appointment_id)
+    entry = next((e for e in entries or () if e['id'] == appointment_id), None)
+    if entry is None or entry['patient_id'] != request.profile_id:
+        return JsonResponse({'error': 'Appointment is not in today\'s queue'}, status=404)
+    
+    data = {
+        **_queue_entry(entry),
+        # Includes the patient currently with the doctor
+        'patients_ahead': entries.index(entry),
+        'consultation_minutes': day['consultation_minutes'],
+    }
+    response = JsonResponse(data, json_dumps_params={'separators': (',', ':')})
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+@login_required
+def patient_timeline(request):
+    """API: the patient's appointments, consultations, records and prescriptions, newest first"""
+    if request.role != 'patient':
+        return JsonResponse({'error': 'Access denied'}, status=403)
+    
+    try:
+        limit = int(request.GET.get('limit', timeline.DEFAULT_PAGE_SIZE))
+    except ValueError:
+        limit = timeline.DEFAULT_PAGE_SIZE
+    try:
+        events, next_cursor = timeline.page(
+            request.profile_id, request.GET.get('cursor'), limit
+        )
+    except ValueError:
+        return JsonResponse({'error': 'Invalid cursor'}, status=400)
+    
+    for event in events:
+        event['date'] = event['date'].isoformat()
+    response = JsonResponse(
+        {'events': events, 'next_cursor': next_cursor},
+        json_dumps_params={'separators': (',', ':')},
+    )
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+# ==================== ATTACHMENTS ====================
+
+ATTACHMENT_CHUNK_SIZE = 64 * 1024
+ATTACHMENT_MAX_AGE = 60 * 60
+BYTE_RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def _parse_byte_range(header, size):
+    """
+    Resolve a Range header against a file size
+    
+    Returns:
+        (start, end) inclusive, None to send the whole file (no range,
+        several ranges or a malformed header), or False if the range
+        starts past the end of the file
+    """
+    match = BYTE_RANGE_RE.match(header.strip())
+    if not match or match.groups() == ('', ''):
+        return None
+    first, last = match.groups()
+    if not first:
+        # Suffix range: the last N bytes
+        length = int(last)
+        return (max(size - length, 0), size - 1) if length and size else False
+    start = int(first)
+    if last and int(last) < start:
+        return None
+    if start >= size:
+        return False
+    end = min(int(last), size - 1) if last else size - 1
+    return start, end
+
+
+def _file_chunks(path, start, length):
+    with open(path, 'rb') as f:
+        f.seek(start)
+        while length > 0:
+            chunk = f.read(min(ATTACHMENT_CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+def _serve_protected_file(request, storage, name, filename):
+    """
+    Send a stored file the caller has already been authorized for
+    
+    With settings.ATTACHMENT_SENDFILE set, the web server sends the file
+    (nginx X-Accel-Redirect or Apache/lighttpd X-Sendfile). Otherwise whole
+    files go out through FileResponse, which uses the server's zero-copy
+    file wrapper, and Range requests get a 206 with just the bytes asked for.
+    """
+    path = storage.path(name)
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        raise Http404('File not found')
+    
+    # Content-addressed names are their own strong validator
+    digest = content_digest(name)
+    etag = f'"{digest}"' if digest else f'"{int(stat.st_mtime)}-{stat.st_size}"'
+    last_modified = http_date(stat.st_mtime)
+    if etag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', '')):
+        response = HttpResponseNotModified()
+        response['ETag'] = etag
+        return response
+    
+    content_type = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+    sendfile = getattr(settings, 'ATTACHMENT_SENDFILE', '')
+    if sendfile == 'x-accel-redirect':
+        response = HttpResponse(content_type=content_type)
+        prefix = getattr(settings, 'ATTACHMENT_ACCEL_PREFIX', '/protected-media/')
+        response['X-Accel-Redirect'] = prefix.rstrip('/') + '/' + name
+    elif sendfile == 'x-sendfile':
+        response = HttpResponse(content_type=content_type)
+        response['X-Sendfile'] = path
+    else:
+        # A stale If-Range means the client's partial copy is outdated
+        if_range = request.META.get('HTTP_IF_RANGE')
+        byte_range = None
+        if 'HTTP_RANGE' in request.META and if_range in (None, etag, last_modified):
+            byte_range = _parse_byte_range(request.META['HTTP_RANGE'], stat.st_size)
+        
+        if byte_range is False:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{stat.st_size}'
+        elif byte_range:
+            start, end = byte_range
+            response = StreamingHttpResponse(
+                _file_chunks(path, start, end - start + 1), status=206, content_type=content_type
+            )
+            response['Content-Range'] = f'bytes {start}-{end}/{stat.st_size}'
+            response['Content-Length'] = end - start + 1
+        else:
+            response = FileResponse(open(path, 'rb'), content_type=content_type)
+        response['Accept-Ranges'] = 'bytes'
+    
+    response['Content-Disposition'] = content_disposition_header(False, filename)
+    response['ETag'] = etag
+    response['Last-Modified'] = last_modified
+    response['Cache-Control'] = f'private, max-age={ATTACHMENT_MAX_AGE}'
+    return response
+
+
+@login_required
+def record_attachment(request, record_id, thumbnail=False):
+    """Download a medical record attachment (its patient, their doctors and staff only)"""
+    records = MedicalRecord.objects.filter(record_id=record_id)
+    if not request.user.is_staff:
+        # One query decides access: the patient, the record's author or a
+        # doctor the patient has booked with
+        records = records.filter(
+            Q(patient__user=request.user)
+            | Q(doctor__user=request.user)
+            | Q(patient__doctor_links__doctor__user=request.user)
+        )
+    name = records.values_list('attachments', flat=True).first()
+    if not name:
+        raise Http404('Attachment not found')
+    
+    extension = os.path.splitext(name)[1]
+    if thumbnail:
+        digest = content_digest(name)
+        if digest is None or not thumbnails.is_image(name):
+            raise Http404('No thumbnail')
+        name, extension = thumbnails.thumbnail_name(name, digest), '.webp'
+    storage = MedicalRecord._meta.get_field('attachments').storage
+    return _serve_protected_file(request, storage, name, f'{record_id}{extension}')
+
+
+# ==================== PROFILING ====================
+
+@login_required
+def profiling_report(request):
+    """Staff: this process's sampled profiles (summary, collapsed stacks or pstats)"""
+    if not request.user.is_staff:
+        return HttpResponse('Access denied', status=403, content_type='text/plain')
+    
+    if request.method == 'POST':
+        profile_store.reset()
+        return redirect('profiling_report')
+    
+    view_name = request.GET.get('view')
+    output = request.GET.get('format', 'collapsed' if view_name else 'summary')
+    if output == 'collapsed':
+        # Feed to flamegraph.pl or open in speedscope.app
+        body = profile_store.collapsed(view_name)
+    elif output == 'stats' and view_name:
+        sort = request.GET.get('sort', 'cumulative')
+        if sort not in ('cumulative', 'tottime', 'ncalls'):
+            return HttpResponse('Unknown sort', status=400, content_type='text/plain')
+        body = profile_store.stats_text(view_name, sort)
+    elif output == 'summary':
+        body = ''.join(
+            f'{name}\t{requests} request(s)\t{samples} sample(s)\n'
+            for name, requests, samples in profile_store.summary()
+        ) or 'Nothing profiled yet.\n'
+    else:
+        return HttpResponse('Unknown format', status=400, content_type='text/plain')
+    
+    response = HttpResponse(body, content_type='text/plain; charset=utf-8')
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+# ==================== STATIC ASSETS ====================
+
+# Fingerprinted names (styles.3f2a9c1b7d4e.css) never change content
+HASHED_ASSET_RE = re.compile(r'\.[0-9a-f]{12}\.[^/]+$')
+mimetypes.add_type('application/manifest+json', '.webmanifest')
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+UNHASHED_MAX_AGE = 60 * 60
+
+
+def serve_static(request, path):
+    """
+    Serve collected static files, preferring precompressed variants
+    
+    Picks the .br or .gz sibling written at collectstatic time when the
+    client accepts it, and marks fingerprinted files as immutable. Under
+    DEBUG the app/static finders win, so edits show up without
+    re-running collectstatic.
+    """
+    if settings.DEBUG:
+        try:
+            return staticfiles_serve(request, path, insecure=True)
+        except Http404:
+            pass  # Hashed names only exist in STATIC_ROOT
+    
+    root = settings.STATIC_ROOT
+    try:
+        fullpath = safe_join(root, path)
+    except SuspiciousFileOperation:
+        raise Http404('Invalid path')
+    
+    if not os.path.isfile(fullpath):
+        raise Http404('File not found')
+    
+    content_type, _ = mimetypes.guess_type(fullpath)
+    accepted = compression.accepted_encodings(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+    wildcard = accepted.get('*', 0)
+    quality = {
+        'br': accepted.get('br', wildcard),
+        'gzip': accepted.get('gzip', accepted.get('x-gzip', wildcard)),
+    }
+    variants = [
+        (quality[name], suffix, name)
+        for suffix, name in (('.br', 'br'), ('.gz', 'gzip'))
+        if os.path.isfile(fullpath + suffix)
+    ]
+    # Highest q wins; brotli comes first so it wins ties
+    variants.sort(key=lambda variant: variant[0], reverse=True)
+    encoding = None
+    if variants and variants[0][0] > 0:
+        _, suffix, encoding = variants[0]
+        fullpath += suffix
+    
+    stat = os.stat(fullpath)
+    if not was_modified_since(request.META.get('HTTP_IF_MODIFIED_SINCE'), stat.st_mtime):
+        response = HttpResponseNotModified()
+    else:
+        response = FileResponse(open(fullpath, 'rb'), content_type=content_type or 'application/octet-stream')
+        response['Content-Length'] = stat.st_size
+        if encoding:
+            response['Content-Encoding'] = encoding
+    
+    response['Last-Modified'] = http_date(stat.st_mtime)
+    response['Vary'] = 'Accept-Encoding'
+    if HASHED_ASSET_RE.search(path):
+        response['Cache-Control'] = f'public, max-age={IMMUTABLE_MAX_AGE}, immutable'
+    else:
+        response['Cache-Control'] = f'public, max-age={UNHASHED_MAX_AGE}'
+    return response
+
+
+# ==================== OFFLINE SUPPORT ====================
+
+# App shell cached by the service worker at install time
+SERVICE_WORKER_PRECACHE = [
+    'css/styles.css',
+    'js/main.js',
+    'js/chatbot.js',
+    'manifest.webmanifest',
+    'img/icon.svg',
+]
+
+
+def offline(request):
+    """Fallback page shown by the service worker when there is no network"""
+    return render(request, 'offline.html')
+
+
+def service_worker(request):
+    """
+    Serve static/js/sw.js from the site root so it can control every page
+    
+    The precache list is prepended with this deployment's hashed static
+    URLs; the version string changes whenever those URLs or the script
+    change, which makes browsers install the new worker.
+    """
+    path = finders.find('js/sw.js')
+    if not path:
+        raise Http404('Service worker not found')
+    with open(path, encoding='utf-8') as f:
+        script = f.read()
+    
+    urls = [static(name) for name in SERVICE_WORKER_PRECACHE]
+    bundle = load_font_bundle()
+    if bundle.get('css'):
+        urls.append(static(bundle['css']))
+    urls.append(reverse('offline'))
+    version = hashlib.md5(
+        (script + '|'.join(urls)).encode(), usedforsecurity=False
+    ).hexdigest()[:12]
+    
+    header = (
+        f'const PRECACHE_URLS = {json.dumps(urls)};\n'
+        f'const CACHE_VERSION = {json.dumps(version)};\n'
+    )
+    response = HttpResponse(header + script, content_type='application/javascript')
+    response['Cache-Control'] = 'no-cache'
+    response['Service-Worker-Allowed'] = '/'
+    return response
@@ -10,7 +10,7 @@ django.setup()
 
 from django.contrib.auth.models import User
 from core.models import (
-    PatientProfile, DoctorProfile, Hospital, Bed,
+    PatientProfile, DoctorProfile, Hospital, Facility, Bed,
     Appointment, MobileClinic
 )
 from datetime import date, time, timedelta
@@ -56,12 +56,14 @@ def create_sample_data():
     
     hospitals = []
     for h_data in hospitals_data:
+        facilities = Facility.parse_names(h_data.pop('facilities', ''))
         hospital, created = Hospital.objects.get_or_create(
             name=h_data['name'],
             defaults=h_data
         )
         hospitals.append(hospital)
         if created:
+            hospital.facilities.set(Facility.get_or_create_many(facilities))
             print(f"  Created hospital: {hospital.name}")
     
     # Create Beds for hospitals
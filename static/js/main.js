@@ -96,7 +96,7 @@ function isValidPhone(phone) {
 }
 
 // ==================== ALERTS ====================
-function showAlert(message, type = 'info') {
+function showAlert(message, type = 'info', timeout = 5000) {
     const alertDiv = document.createElement('div');
     alertDiv.className = `alert alert-${type} animate-fade-in`;
     alertDiv.innerHTML = `
@@ -108,10 +108,12 @@ function showAlert(message, type = 'info') {
     const container = document.querySelector('.container') || document.body;
     container.insertBefore(alertDiv, container.firstChild);
     
-    // Auto remove after 5 seconds
-    setTimeout(() => {
-        alertDiv.remove();
-    }, 5000);
+    // Auto remove after 5 seconds (timeout 0 keeps it until closed)
+    if (timeout) {
+        setTimeout(() => {
+            alertDiv.remove();
+        }, timeout);
+    }
 }
 
 function getAlertIcon(type) {
@@ -261,4 +263,83 @@ document.addEventListener('keydown', function(e) {
     }
 });
 
+// ==================== LOAD MORE ====================
+// Buttons with data-load-more fetch the next page fragment, append it to
+// data-target and follow the X-Next-Cursor header; they also fire on their
+// own when scrolled into view
+function loadMore(button) {
+    if (button.disabled) return;
+    showLoading(button);
+    const url = button.dataset.loadMore + '?cursor=' + encodeURIComponent(button.dataset.cursor);
+    fetch(url, { credentials: 'same-origin', headers: { 'X-Requested-With': 'XMLHttpRequest' } })
+        .then(response => {
+            if (!response.ok) throw new Error(response.statusText);
+            return response.text().then(html => [html, response.headers.get('X-Next-Cursor')]);
+        })
+        .then(([html, nextCursor]) => {
+            document.getElementById(button.dataset.target).insertAdjacentHTML('beforeend', html);
+            hideLoading(button);
+            if (nextCursor) {
+                button.dataset.cursor = nextCursor;
+                if (loadMoreObserver) {
+                    // Observing again fires at once if the button is still in view
+                    loadMoreObserver.unobserve(button);
+                    loadMoreObserver.observe(button);
+                }
+            } else {
+                button.parentElement.remove();
+            }
+        })
+        .catch(() => {
+            hideLoading(button);
+            showAlert('Could not load more items. Please try again.', 'error');
+        });
+}
+
+const loadMoreButtons = document.querySelectorAll('[data-load-more]');
+let loadMoreObserver = null;
+loadMoreButtons.forEach(button => {
+    button.addEventListener('click', () => loadMore(button));
+});
+if ('IntersectionObserver' in window && loadMoreButtons.length) {
+    loadMoreObserver = new IntersectionObserver(entries => {
+        entries.forEach(entry => {
+            if (entry.isIntersecting) loadMore(entry.target);
+        });
+    }, { rootMargin: '200px' });
+    loadMoreButtons.forEach(button => loadMoreObserver.observe(button));
+}
+
+// ==================== OFFLINE SUPPORT ====================
+if ('serviceWorker' in navigator) {
+    window.addEventListener('load', function() {
+        navigator.serviceWorker.register('/sw.js', { scope: '/' });
+    });
+    
+    // Flush requests queued while offline (browsers without Background Sync)
+    window.addEventListener('online', function() {
+        if (navigator.serviceWorker.controller) {
+            navigator.serviceWorker.controller.postMessage('replay-outbox');
+        }
+    });
+    
+    // Queued requests the server refused when they were replayed
+    const QUEUED_REQUEST_LABELS = {
+        '/patient/book-appointment/': 'appointment request',
+        '/api/send-message/': 'chat message',
+    };
+    navigator.serviceWorker.addEventListener('message', function(event) {
+        if (!event.data || event.data.type !== 'outbox-failed') return;
+        event.data.requests.forEach(request => {
+            const label = QUEUED_REQUEST_LABELS[request.path] || 'request';
+            const queuedAt = new Date(request.queuedAt).toLocaleString();
+            showAlert(`Your ${label} from ${queuedAt} could not be sent. Please submit it again.`, 'error', 0);
+        });
+        event.source.postMessage('discard-failed');
+    });
+    if (navigator.serviceWorker.controller) {
+        navigator.serviceWorker.controller.postMessage('outbox-status');
+    }
+}
+
 console.log('TeleMed - Main JS loaded successfully');
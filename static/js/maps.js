@@ -0,0 +1,130 @@
+/**
+ * TeleMed - Maps
+ * Loads hospital and clinic markers for the visible viewport on demand
+ *
+ * Any element with data-marker-url becomes a Google Map once the Maps API
+ * calls initTelemedMaps. Markers come from /api/map/<kind>/ as compact
+ * arrays; zoomed-out views get server-side clusters instead of points.
+ */
+
+// ==================== MARKER MAPS ====================
+const DEFAULT_MAP_CENTER = { lat: 22.5, lng: 79.0 };
+const DEFAULT_MAP_ZOOM = 5;
+
+function initMarkerMap(element) {
+    const map = new google.maps.Map(element, {
+        center: DEFAULT_MAP_CENTER,
+        zoom: DEFAULT_MAP_ZOOM,
+        streetViewControl: false,
+    });
+    const infoWindow = new google.maps.InfoWindow();
+    let overlays = [];
+    let loaded = null;
+    let controller = null;
+
+    map.addListener('idle', () => {
+        const bounds = map.getBounds();
+        if (!bounds) return;
+        const sw = bounds.getSouthWest();
+        const ne = bounds.getNorthEast();
+        const bbox = [sw.lng(), sw.lat(), ne.lng(), ne.lat()];
+        const zoom = map.getZoom();
+
+        // The server snaps its bbox outwards, so small pans are often covered already
+        if (loaded && loaded.zoom === zoom && bboxContains(loaded.bbox, bbox)) return;
+
+        if (controller) controller.abort();
+        controller = new AbortController();
+
+        const url = new URL(element.dataset.markerUrl, window.location.origin);
+        url.searchParams.set('bbox', bbox.map((value) => value.toFixed(5)).join(','));
+        url.searchParams.set('zoom', zoom);
+
+        fetch(url, { signal: controller.signal })
+            .then((response) => response.ok ? response.json() : Promise.reject(response.status))
+            .then((data) => {
+                loaded = data;
+                render(data);
+            })
+            .catch(() => {});
+    });
+
+    function render(data) {
+        overlays.forEach((overlay) => overlay.setMap(null));
+        overlays = [];
+
+        const field = {};
+        data.fields.forEach((name, index) => { field[name] = index; });
+
+        data.markers.forEach((row) => {
+            const marker = new google.maps.Marker({
+                map: map,
+                position: { lat: row[field.lat], lng: row[field.lng] },
+                title: row[field.name],
+            });
+            marker.addListener('click', () => {
+                infoWindow.setContent(markerPopup(element, row, field));
+                infoWindow.open({ anchor: marker, map: map });
+            });
+            overlays.push(marker);
+        });
+
+        data.clusters.forEach(([lat, lng, count]) => {
+            const marker = new google.maps.Marker({
+                map: map,
+                position: { lat: lat, lng: lng },
+                label: { text: String(count), color: '#ffffff', fontWeight: '600' },
+                icon: {
+                    path: google.maps.SymbolPath.CIRCLE,
+                    scale: 14 + Math.min(Math.log10(count) * 6, 16),
+                    fillColor: '#0552b5',
+                    fillOpacity: 0.85,
+                    strokeColor: '#ffffff',
+                    strokeWeight: 2,
+                },
+            });
+            marker.addListener('click', () => {
+                map.panTo({ lat: lat, lng: lng });
+                map.setZoom(map.getZoom() + 2);
+            });
+            overlays.push(marker);
+        });
+    }
+}
+
+function bboxContains(outer, inner) {
+    return outer[0] <= inner[0] && outer[1] <= inner[1] &&
+        outer[2] >= inner[2] && outer[3] >= inner[3];
+}
+
+function markerPopup(element, row, field) {
+    const popup = document.createElement('div');
+    const name = document.createElement('strong');
+    name.textContent = row[field.name];
+    popup.appendChild(name);
+
+    if (field.date !== undefined) {
+        const date = document.createElement('div');
+        date.textContent = row[field.date];
+        popup.appendChild(date);
+    }
+
+    const link = document.createElement('a');
+    if (element.dataset.detailUrl) {
+        link.href = element.dataset.detailUrl.replace('/0/', `/${row[field.id]}/`);
+        link.textContent = 'View Details';
+    } else {
+        link.href = `https://www.google.com/maps/dir/?api=1&destination=${row[field.lat]},${row[field.lng]}`;
+        link.target = '_blank';
+        link.textContent = 'Get Directions';
+    }
+    link.style.display = 'block';
+    link.style.marginTop = '0.25rem';
+    popup.appendChild(link);
+    return popup;
+}
+
+// Called by the Google Maps script tag once the API has loaded
+window.initTelemedMaps = function() {
+    document.querySelectorAll('[data-marker-url]').forEach(initMarkerMap);
+};
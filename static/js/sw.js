@@ -0,0 +1,282 @@
+/**
+ * TeleMed - Service Worker
+ * Offline-first caching for rural connections
+ *
+ * Served at /sw.js by core.views.service_worker, which prepends
+ * PRECACHE_URLS and CACHE_VERSION for the current deployment.
+ */
+
+const SHELL_CACHE = `telemed-shell-${CACHE_VERSION}`;
+const PAGE_CACHE = 'telemed-pages';
+const ASSET_CACHE = 'telemed-assets';
+const OFFLINE_URL = '/offline/';
+const LOGIN_URL = '/login/';
+
+const OUTBOX_DB = 'telemed-outbox';
+const OUTBOX_STORE = 'requests';
+const SYNC_TAG = 'telemed-outbox';
+
+// Pages served stale-while-revalidate so they open instantly and offline
+const PAGE_PATTERNS = [
+    /^\/patient\/records\/$/,
+    /^\/patient\/prescriptions\/$/,
+    /^\/record\/[^/]+\/$/,
+    /^\/prescription\/[^/]+\/$/,
+];
+
+// POSTs queued in IndexedDB when the network is down
+const QUEUED_POSTS = [
+    /^\/patient\/book-appointment\/$/,
+    /^\/api\/send-message\/$/,
+];
+
+// ==================== LIFECYCLE ====================
+self.addEventListener('install', (event) => {
+    event.waitUntil(
+        caches.open(SHELL_CACHE)
+            .then((cache) => cache.addAll(PRECACHE_URLS))
+            .then(() => self.skipWaiting())
+    );
+});
+
+self.addEventListener('activate', (event) => {
+    event.waitUntil(
+        caches.keys()
+            .then((keys) => Promise.all(
+                keys.filter((key) => key.startsWith('telemed-shell-') && key !== SHELL_CACHE)
+                    .map((key) => caches.delete(key))
+            ))
+            .then(() => self.clients.claim())
+            .then(() => replayOutbox())
+    );
+});
+
+// ==================== FETCH ====================
+self.addEventListener('fetch', (event) => {
+    const request = event.request;
+    const url = new URL(request.url);
+    if (url.origin !== self.location.origin) return;
+
+    if (request.method === 'POST') {
+        if (QUEUED_POSTS.some((pattern) => pattern.test(url.pathname))) {
+            event.respondWith(networkOrQueue(request));
+        } else if (url.pathname === LOGIN_URL) {
+            // A different user may be signing in on this device
+            event.waitUntil(clearUserData());
+        }
+        return;
+    }
+    if (request.method !== 'GET') return;
+
+    if (url.pathname === '/logout/') {
+        event.waitUntil(clearUserData());
+        return;
+    }
+
+    if (PAGE_PATTERNS.some((pattern) => pattern.test(url.pathname))) {
+        event.respondWith(staleWhileRevalidate(event, request));
+    } else if (url.pathname.startsWith('/static/')) {
+        event.respondWith(cacheFirst(request));
+    } else if (request.mode === 'navigate') {
+        event.respondWith(fetch(request).catch(() => offlineFallback(request)));
+    }
+});
+
+async function staleWhileRevalidate(event, request) {
+    const cache = await caches.open(PAGE_CACHE);
+    const cached = await cache.match(request);
+    const network = fetch(request).then((response) => {
+        // Only keep real pages, never login redirects or errors
+        if (response.ok && !response.redirected) {
+            cache.put(request, response.clone());
+        }
+        return response;
+    });
+
+    if (cached) {
+        event.waitUntil(network.catch(() => null));
+        return cached;
+    }
+    return network.catch(() => offlineFallback(request));
+}
+
+async function cacheFirst(request) {
+    const cached = await caches.match(request);
+    if (cached) return cached;
+    const response = await fetch(request);
+    if (response.ok) {
+        const cache = await caches.open(ASSET_CACHE);
+        cache.put(request, response.clone());
+    }
+    return response;
+}
+
+async function offlineFallback(request) {
+    const cached = await caches.match(request);
+    return cached || caches.match(OFFLINE_URL);
+}
+
+// Cached pages and queued requests belong to the signed-in user; never
+// show or replay them in someone else's session on a shared device
+function clearUserData() {
+    return Promise.all([caches.delete(PAGE_CACHE), clearOutbox()]);
+}
+
+// ==================== OUTBOX ====================
+async function networkOrQueue(request) {
+    const copy = request.clone();
+    try {
+        return await fetch(request);
+    } catch (error) {
+        await enqueue(copy);
+        if (self.registration.sync) {
+            try {
+                await self.registration.sync.register(SYNC_TAG);
+            } catch (e) {
+                // Background Sync unavailable; replayed on next activation or 'online'
+            }
+        }
+        return queuedResponse(copy);
+    }
+}
+
+function queuedResponse(request) {
+    if (request.mode === 'navigate') {
+        return new Response(
+            '<!DOCTYPE html><html><head><meta charset="UTF-8">' +
+            '<meta name="viewport" content="width=device-width, initial-scale=1.0">' +
+            '<title>Saved offline - TeleMed</title></head>' +
+            '<body style="font-family: sans-serif; padding: 2rem; text-align: center;">' +
+            '<h2>You are offline</h2>' +
+            '<p>Your request has been saved and will be sent automatically when you are back online. ' +
+            'If it cannot be sent, TeleMed will ask you to submit it again.</p>' +
+            '<p><a href="/patient/dashboard/">Back to dashboard</a></p></body></html>',
+            { status: 202, headers: { 'Content-Type': 'text/html; charset=utf-8' } }
+        );
+    }
+    return new Response(
+        JSON.stringify({ success: true, queued: true }),
+        { status: 202, headers: { 'Content-Type': 'application/json' } }
+    );
+}
+
+function openOutbox() {
+    return new Promise((resolve, reject) => {
+        const open = indexedDB.open(OUTBOX_DB, 1);
+        open.onupgradeneeded = () => {
+            open.result.createObjectStore(OUTBOX_STORE, { keyPath: 'id', autoIncrement: true });
+        };
+        open.onsuccess = () => resolve(open.result);
+        open.onerror = () => reject(open.error);
+    });
+}
+
+function outboxTransaction(mode, callback) {
+    return openOutbox().then((db) => new Promise((resolve, reject) => {
+        const tx = db.transaction(OUTBOX_STORE, mode);
+        const result = callback(tx.objectStore(OUTBOX_STORE));
+        tx.oncomplete = () => resolve(result.result !== undefined ? result.result : result);
+        tx.onerror = () => reject(tx.error);
+    }));
+}
+
+async function enqueue(request) {
+    const headers = {};
+    for (const [name, value] of request.headers.entries()) {
+        headers[name] = value;
+    }
+    const entry = {
+        url: request.url,
+        method: request.method,
+        mode: request.mode,
+        headers: headers,
+        body: await request.text(),
+        queuedAt: Date.now(),
+    };
+    return outboxTransaction('readwrite', (store) => store.add(entry));
+}
+
+function clearOutbox() {
+    return outboxTransaction('readwrite', (store) => store.clear());
+}
+
+function wasDelivered(entry, response) {
+    // Redirected to the login page: the session ended while offline
+    if (response.redirected && new URL(response.url).pathname === LOGIN_URL) return false;
+    // 403 (stale CSRF token) and other client errors
+    if (!response.ok) return false;
+    // Forms redirect after a successful POST and re-render with errors
+    return entry.mode !== 'navigate' || response.redirected;
+}
+
+async function replayOutbox() {
+    const entries = await outboxTransaction('readonly', (store) => store.getAll());
+    for (const entry of entries) {
+        if (entry.failed) continue;
+        let response;
+        try {
+            response = await fetch(entry.url, {
+                method: entry.method,
+                headers: entry.headers,
+                body: entry.body,
+                credentials: 'same-origin',
+            });
+        } catch (error) {
+            // Still offline: keep this and the remaining entries in order
+            break;
+        }
+        // Server errors are retried later
+        if (response.status >= 500) continue;
+        if (wasDelivered(entry, response)) {
+            await outboxTransaction('readwrite', (store) => store.delete(entry.id));
+        } else {
+            // Kept (not retried) until the page has told the user to resubmit
+            entry.failed = true;
+            entry.status = response.status;
+            await outboxTransaction('readwrite', (store) => store.put(entry));
+        }
+    }
+    await reportFailed();
+}
+
+async function reportFailed(client) {
+    const entries = await outboxTransaction('readonly', (store) => store.getAll());
+    const failed = entries.filter((entry) => entry.failed).map((entry) => ({
+        path: new URL(entry.url).pathname,
+        status: entry.status,
+        queuedAt: entry.queuedAt,
+    }));
+    if (!failed.length) return;
+    const clients = client ? [client] : await self.clients.matchAll({ type: 'window' });
+    clients.forEach((target) => target.postMessage({ type: 'outbox-failed', requests: failed }));
+}
+
+function discardFailed() {
+    return outboxTransaction('readwrite', (store) => {
+        const cursor = store.openCursor();
+        cursor.onsuccess = () => {
+            if (!cursor.result) return;
+            if (cursor.result.value.failed) cursor.result.delete();
+            cursor.result.continue();
+        };
+        return cursor;
+    });
+}
+
+self.addEventListener('sync', (event) => {
+    if (event.tag === SYNC_TAG) {
+        event.waitUntil(replayOutbox());
+    }
+});
+
+self.addEventListener('message', (event) => {
+    if (event.data === 'replay-outbox') {
+        event.waitUntil(replayOutbox());
+    } else if (event.data === 'outbox-status') {
+        event.waitUntil(reportFailed(event.source));
+    } else if (event.data === 'discard-failed') {
+        event.waitUntil(discardFailed());
+    } else if (event.data === 'clear-pages') {
+        event.waitUntil(caches.delete(PAGE_CACHE));
+    }
+});
@@ -0,0 +1,53 @@
+"""
+Environment helpers for settings.py
+
+Settings are layered: the defaults in settings.py, then the defaults of the
+DJANGO_ENV profile ('development' or 'production'), then variables from a
+.env file in the project root, then the real process environment, which
+wins over .env.
+"""
+import os
+
+from dotenv import load_dotenv
+from django.core.exceptions import ImproperlyConfigured
+
+TRUE_VALUES = ('1', 'true', 'yes', 'on')
+FALSE_VALUES = ('0', 'false', 'no', 'off', '')
+
+
+def load(base_dir):
+    """Read base_dir/.env into os.environ without overriding set variables"""
+    load_dotenv(os.path.join(base_dir, '.env'), override=False)
+
+
+def env_str(name, default=''):
+    return os.environ.get(name, default)
+
+
+def env_bool(name, default=False):
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    if value.strip().lower() in TRUE_VALUES:
+        return True
+    if value.strip().lower() in FALSE_VALUES:
+        return False
+    raise ImproperlyConfigured(f'{name} must be true or false, not {value!r}')
+
+
+def env_int(name, default=0):
+    value = os.environ.get(name)
+    if value is None or value.strip() == '':
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        raise ImproperlyConfigured(f'{name} must be a whole number, not {value!r}')
+
+
+def env_list(name, default=()):
+    """Comma-separated list"""
+    value = os.environ.get(name)
+    if value is None:
+        return list(default)
+    return [item.strip() for item in value.split(',') if item.strip()]
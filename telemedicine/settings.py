@@ -6,16 +6,36 @@ Telemedicine Access for Rural Healthcare
 from pathlib import Path
 import os
 
+from django.core.exceptions import ImproperlyConfigured
+
+from .env import env_bool, env_int, env_list, env_str, load as load_env
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
+# Everything below can be set from the environment or a .env file (see
+# .env.example); DJANGO_ENV=production switches the defaults to the
+# production profile. `manage.py check --deploy` lists what is still at a
+# development default.
+load_env(BASE_DIR)
+ENVIRONMENT = env_str('DJANGO_ENV', 'development')
+if ENVIRONMENT not in ('development', 'production'):
+    raise ImproperlyConfigured("DJANGO_ENV must be 'development' or 'production'")
+PRODUCTION = ENVIRONMENT == 'production'
+
 # SECURITY WARNING: keep the secret key used in production secret!
-SECRET_KEY = 'django-insecure-telemedicine-rural-healthcare-2024-secure-key'
+DEVELOPMENT_SECRET_KEY = 'django-insecure-telemedicine-rural-healthcare-2024-secure-key'
+# Values published in docs and examples, which are no secret
+PLACEHOLDER_SECRET_KEYS = ('change-me', 'changeme', 'secret', DEVELOPMENT_SECRET_KEY)
+SECRET_KEY = env_str('DJANGO_SECRET_KEY').strip()
+if PRODUCTION and (not SECRET_KEY or SECRET_KEY.lower() in PLACEHOLDER_SECRET_KEYS):
+    raise ImproperlyConfigured('Set DJANGO_SECRET_KEY to a new random value in production')
+SECRET_KEY = SECRET_KEY or DEVELOPMENT_SECRET_KEY
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+DEBUG = env_bool('DJANGO_DEBUG', not PRODUCTION)
 
-ALLOWED_HOSTS = ['localhost', '127.0.0.1', '.pythonanywhere.com']
+ALLOWED_HOSTS = env_list('DJANGO_ALLOWED_HOSTS', ['localhost', '127.0.0.1', '.pythonanywhere.com'])
 
 # Application definition
 INSTALLED_APPS = [
@@ -30,21 +50,43 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'django.middleware.http.ConditionalGetMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.middleware.RoleMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'core.middleware.RateLimitMiddleware',
+    'core.middleware.ProfilingMiddleware',
 ]
 
+# ConditionalGetMiddleware gives every GET response without an ETag one
+# hashed from its body and answers matching If-None-Match / If-Modified-Since
+# requests with 304 Not Modified.
+#
+# Compress HTML and JSON responses with brotli or gzip (skip if the web server
+# already does). It goes above ConditionalGetMiddleware so ETags and 304s are
+# worked out on the uncompressed body. GZIP is the variable's previous name.
+if env_bool('COMPRESSION', env_bool('GZIP', PRODUCTION)):
+    MIDDLEWARE.insert(MIDDLEWARE.index('django.middleware.http.ConditionalGetMiddleware'),
+                      'core.middleware.CompressionMiddleware')
+COMPRESSION_MIN_SIZE = env_int('COMPRESSION_MIN_SIZE', 512)
+
+# Sampling profiler (core.middleware.ProfilingMiddleware): profile one in
+# PROFILE_SAMPLE_EVERY requests to core views (0 = off), plus any request from
+# a staff user that sends "X-Profile: 1". Read the results at /staff/profile/.
+PROFILE_SAMPLE_EVERY = env_int('PROFILE_SAMPLE_EVERY', 0)
+PROFILE_HEADER = 'X-Profile'
+PROFILE_VIEW_MODULES = ('core.views',)
+
 ROOT_URLCONF = 'telemedicine.urls'
 
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [BASE_DIR / 'templates'],
-        'APP_DIRS': True,
         'OPTIONS': {
             'context_processors': [
                 'django.template.context_processors.debug',
@@ -52,20 +94,126 @@ TEMPLATES = [
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
             ],
+            # Compiled templates are kept for the life of the process;
+            # runserver's autoreloader clears them when a template changes
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ] if env_bool('TEMPLATE_CACHE', True) else [
+                'django.template.loaders.filesystem.Loader',
+                'django.template.loaders.app_directories.Loader',
+            ],
         },
     },
 ]
 
+# Compile every template when a WSGI worker starts (see warm_templates)
+TEMPLATE_WARMUP = env_bool('TEMPLATE_WARMUP', not DEBUG)
+
 WSGI_APPLICATION = 'telemedicine.wsgi.application'
 
-# Database - SQLite
+# Database - SQLite unless DB_ENGINE names another backend (e.g.
+# django.db.backends.postgresql). Connections are kept open for
+# DB_CONN_MAX_AGE seconds instead of reconnecting on every request.
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'ENGINE': env_str('DB_ENGINE', 'django.db.backends.sqlite3'),
+        'NAME': env_str('DB_NAME', str(BASE_DIR / 'db.sqlite3')),
+        'USER': env_str('DB_USER'),
+        'PASSWORD': env_str('DB_PASSWORD'),
+        'HOST': env_str('DB_HOST'),
+        'PORT': env_str('DB_PORT'),
+        'CONN_MAX_AGE': env_int('DB_CONN_MAX_AGE', 60 if PRODUCTION else 0),
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
+# Cache - CACHE_BACKEND selects where every cache below lives:
+#   locmem  per worker process (default; fine for a single worker)
+#   file    shared by the workers of one machine, under CACHE_LOCATION
+#   redis   shared by all machines; CACHE_LOCATION is the redis:// URL
+CACHE_BACKEND = env_str('CACHE_BACKEND', 'locmem')
+CACHE_BACKENDS = {
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+    'file': 'django.core.cache.backends.filebased.FileBasedCache',
+    'redis': 'django.core.cache.backends.redis.RedisCache',
+}
+if CACHE_BACKEND not in CACHE_BACKENDS:
+    raise ImproperlyConfigured(f"CACHE_BACKEND must be one of {', '.join(CACHE_BACKENDS)}")
+CACHE_LOCATION = env_str('CACHE_LOCATION', {
+    'file': str(BASE_DIR / 'cache'), 'redis': 'redis://127.0.0.1:6379/1',
+}.get(CACHE_BACKEND, ''))
+
+
+def _cache(name):
+    if CACHE_BACKEND == 'locmem':
+        return {'BACKEND': CACHE_BACKENDS['locmem'], 'LOCATION': f'telemed-{name}'}
+    if CACHE_BACKEND == 'file':
+        # Culling a file cache scans its directory, so allow more entries
+        return {
+            'BACKEND': CACHE_BACKENDS['file'], 'LOCATION': os.path.join(CACHE_LOCATION, name),
+            'OPTIONS': {'MAX_ENTRIES': 10000},
+        }
+    return {'BACKEND': CACHE_BACKENDS['redis'], 'LOCATION': CACHE_LOCATION, 'KEY_PREFIX': name}
+
+
+CACHES = {
+    'default': _cache('default'),
+    'ratelimit': _cache('ratelimit'),
+    'sessions': _cache('sessions'),
+    # Rendered {% cache %} fragments (the navbar, per role)
+    'template_fragments': _cache('fragments'),
+}
+
+# Sessions live only in the cache when it is Redis (no session query or
+# write per request), are read through the cache when it is the shared file
+# cache, and stay in the database with a per-process cache, where cached
+# sessions would go stale whenever a request reached another worker.
+SESSION_ENGINE = env_str('SESSION_ENGINE', {
+    'redis': 'django.contrib.sessions.backends.cache',
+    'file': 'django.contrib.sessions.backends.cached_db',
+}.get(CACHE_BACKEND, 'django.contrib.sessions.backends.db'))
+SESSION_CACHE_ALIAS = 'sessions'
+
+# Rate limits for public APIs: URL name -> (requests per second, burst size);
+# token buckets of `burst` tokens refilled at `rate` per second
+RATE_LIMIT_CACHE = 'ratelimit'
+RATE_LIMITS = {
+    'chatbot_response': (1, 10),
+    'get_doctors': (2, 20),
+    'search': (2, 20),
+    'map_markers': (5, 30),
+}
+# Only enable behind a reverse proxy that sets X-Forwarded-For
+RATE_LIMIT_TRUST_FORWARDED = False
+
+# Logging goes to the console (the WSGI server's error log), and also to
+# LOG_FILE if set. Login and registration timings (core.utils.timing) are
+# logged at INFO for sizing workers against peak login load.
+LOG_LEVEL = env_str('LOG_LEVEL', 'WARNING' if PRODUCTION else 'INFO').upper()
+LOG_FILE = env_str('LOG_FILE')
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'timestamped': {'format': '%(asctime)s %(levelname)s %(name)s: %(message)s'},
+    },
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler', 'formatter': 'timestamped'},
+        **({'file': {
+            'class': 'logging.handlers.WatchedFileHandler',
+            'filename': LOG_FILE,
+            'formatter': 'timestamped',
+        }} if LOG_FILE else {}),
+    },
+    'root': {'handlers': ['console', 'file'] if LOG_FILE else ['console'], 'level': LOG_LEVEL},
+    'loggers': {
+        'core.timing': {'level': env_str('TIMING_LOG_LEVEL', 'INFO').upper()},
+    },
+}
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -91,11 +239,38 @@ USE_TZ = True
 # Static files (CSS, JavaScript, Images)
 STATIC_URL = '/static/'
 STATICFILES_DIRS = [BASE_DIR / 'static']
-STATIC_ROOT = BASE_DIR / 'staticfiles'
+STATIC_ROOT = Path(env_str('STATIC_ROOT', str(BASE_DIR / 'staticfiles')))
+
+# collectstatic minifies CSS/JS, fingerprints file names and writes .gz/.br
+# variants; core.views.serve_static serves them with immutable cache headers
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': env_str('STATICFILES_BACKEND', 'core.storage.CompressedManifestStaticFilesStorage'),
+    },
+    # Record attachments and profile/hospital images: stored under their
+    # SHA-256 (identical uploads share one file) with WebP thumbnails
+    'attachments': {
+        'BACKEND': 'core.storage.ContentAddressedStorage',
+    },
+}
+SERVE_STATIC = env_bool('SERVE_STATIC', True)
 
 # Media files (Uploads)
 MEDIA_URL = '/media/'
-MEDIA_ROOT = BASE_DIR / 'media'
+MEDIA_ROOT = Path(env_str('MEDIA_ROOT', str(BASE_DIR / 'media')))
+
+# Largest accepted attachment or image upload, in bytes
+ATTACHMENT_MAX_SIZE = 50 * 1024 * 1024
+
+# How record attachments are sent after the access check: '' streams them
+# from Django (with Range support); 'x-accel-redirect' (nginx, internal
+# location at ATTACHMENT_ACCEL_PREFIX aliased to MEDIA_ROOT) or
+# 'x-sendfile' (Apache mod_xsendfile, lighttpd) let the web server send them
+ATTACHMENT_SENDFILE = env_str('ATTACHMENT_SENDFILE')
+ATTACHMENT_ACCEL_PREFIX = '/protected-media/'
 
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
@@ -105,13 +280,19 @@ LOGIN_URL = '/login/'
 LOGIN_REDIRECT_URL = '/dashboard/'
 LOGOUT_REDIRECT_URL = '/'
 
-# Email settings (configure for production)
-EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
-EMAIL_HOST = 'smtp.gmail.com'
-EMAIL_PORT = 587
-EMAIL_USE_TLS = True
-EMAIL_HOST_USER = ''  # Add your email
-EMAIL_HOST_PASSWORD = ''  # Add your password
+# Email settings (printed to the console unless EMAIL_BACKEND says otherwise)
+EMAIL_BACKEND = env_str('EMAIL_BACKEND', (
+    'django.core.mail.backends.smtp.EmailBackend' if PRODUCTION
+    else 'django.core.mail.backends.console.EmailBackend'
+))
+EMAIL_HOST = env_str('EMAIL_HOST', 'smtp.gmail.com')
+EMAIL_PORT = env_int('EMAIL_PORT', 587)
+EMAIL_USE_TLS = env_bool('EMAIL_USE_TLS', True)
+EMAIL_HOST_USER = env_str('EMAIL_HOST_USER')
+EMAIL_HOST_PASSWORD = env_str('EMAIL_HOST_PASSWORD')
+
+# Chatbot knowledge base (hot-reloaded when the file changes)
+CHATBOT_KB_PATH = BASE_DIR / 'core' / 'data' / 'chatbot_kb.json'
 
 # Google Maps API Key (add your key)
-GOOGLE_MAPS_API_KEY = ''
+GOOGLE_MAPS_API_KEY = env_str('GOOGLE_MAPS_API_KEY')
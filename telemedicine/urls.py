@@ -2,15 +2,28 @@
 URL configuration for telemedicine project.
 """
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, re_path, include
 from django.conf import settings
-from django.conf.urls.static import static
+from django.views.static import serve
+
+from core.views import serve_static
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('', include('core.urls')),
 ]
 
+# Record attachments are only reachable through core.views.record_attachment;
+# a production web server must likewise refuse MEDIA_URL + 'records/'
 if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
-    urlpatterns += static(settings.STATIC_URL, document_root=settings.STATICFILES_DIRS[0])
+    urlpatterns += [
+        re_path(r'^%s(?!records/)(?P<path>.*)$' % settings.MEDIA_URL.lstrip('/'), serve,
+                {'document_root': settings.MEDIA_ROOT}),
+    ]
+
+# Precompressed, far-future cached static files. Set SERVE_STATIC = False
+# when a front-end web server maps STATIC_URL to STATIC_ROOT itself.
+if settings.DEBUG or getattr(settings, 'SERVE_STATIC', False):
+    urlpatterns += [
+        re_path(r'^%s(?P<path>.*)$' % settings.STATIC_URL.lstrip('/'), serve_static),
+    ]